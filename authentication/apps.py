@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
-    verbose_name = 'Аутентификация'  
+    verbose_name = 'Аутентификация'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -54,3 +54,24 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return f"{self.email} ({self.user_type})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user.remember_saved_state()
+        return user
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_saved_state()
+
+    def remember_saved_state(self):
+        """
+        Запоминает роль, которая хранится в базе, чтобы сигналы post_save
+        замечали ее смену без дополнительного запроса.
+        """
+        self._saved_user_type = self.__dict__.get('user_type')
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_saved_state()
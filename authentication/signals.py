@@ -0,0 +1,13 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from shoe_service.cache import invalidate_user_cache_on_commit
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_cache_on_user_save(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированные ответы пользователя после изменения профиля.
+    """
+    invalidate_user_cache_on_commit(instance.pk)
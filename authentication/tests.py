@@ -1,3 +1,27 @@
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import User
+
+
+class UserProfileCacheTestCase(TestCase):
+    """
+    Кэш профиля сбрасывается при изменении пользователя.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('client@example.com', 'Иван', None, user_type='client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_profile_is_cached_and_invalidated(self):
+        self.assertEqual(self.api.get('/authentication/profile/').data['first_name'], 'Иван')
+        with self.assertNumQueries(0):
+            self.api.get('/authentication/profile/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.patch('/authentication/profile/', {'first_name': 'Петр'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.api.get('/authentication/profile/').data['first_name'], 'Петр')
@@ -19,6 +19,7 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
 from django.conf import settings
 from rest_framework.parsers import MultiPartParser, FormParser
+from shoe_service.cache import cache_user_response
 
 User = get_user_model()
 
@@ -27,6 +28,7 @@ class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
 
+    @cache_user_response
     def get(self, request):
         user = request.user
         serializer = UserProfileSerializer(user)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification
+from .models import BroadcastNotification, Notification, NotificationOutbox
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -8,3 +8,21 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('title', 'message', 'recipient__email')
     readonly_fields = ('created_at',)
     ordering = ('-created_at',)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('type', 'order', 'recipient', 'attempts', 'available_at', 'failed_at')
+    list_filter = ('type', 'failed_at')
+    readonly_fields = ('created_at',)
+    ordering = ('available_at',)
+
+
+@admin.register(BroadcastNotification)
+class BroadcastNotificationAdmin(admin.ModelAdmin):
+    list_display = ('title', 'type', 'audience', 'order', 'created_at')
+    list_filter = ('type', 'audience', 'created_at')
+    search_fields = ('title', 'message')
+    readonly_fields = ('created_at',)
+    ordering = ('-created_at',)
+
@@ -0,0 +1,130 @@
+"""
+Общие уведомления роли (fan-out on read).
+
+Уведомление для всех курьеров (new_order) хранится одной записью
+BroadcastNotification и уходит одним сообщением в группу роли
+(BROADCAST_GROUPS) вместо копии и сообщения каждому получателю.
+Лента пользователя объединяет личные и общие уведомления при чтении,
+а прочтение общих хранится компактно в BroadcastReadState: отметка
+времени и id прочитанных после нее. Отметка сдвигается при каждом
+прочтении (compact_read_state), поэтому список id не растет без предела.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.utils import timezone
+
+from shoe_service.bulk_load import allocate_ids, load_objects
+from .models import BroadcastNotification, BroadcastReadState, Notification
+from .utils import DeliveryError, notification_event
+
+logger = logging.getLogger(__name__)
+
+# Группы channel layer для общих уведомлений по ролям
+BROADCAST_GROUPS = {'courier': 'couriers'}
+
+# Наибольшая длина BroadcastReadState.read_ids после сжатия
+MAX_READ_IDS = 200
+
+
+def send_broadcast(order, notification_type, title, message, audience='courier', strict=False):
+    """
+    Сохраняет общее уведомление для роли audience и отправляет его
+    в группу роли. При strict ошибка отправки поднимает DeliveryError.
+
+    В группу роли попадают только разрешенные ей типы, поэтому соединения
+    получают из нее лишь то, что должны показать.
+    """
+    if notification_type not in Notification.get_allowed_types_for_role(audience):
+        logger.warning(f"Notification type {notification_type} is not allowed for role {audience}")
+        return None
+    broadcast = BroadcastNotification.objects.create(
+        id=allocate_ids(Notification, 1)[0],
+        audience=audience, order=order, type=notification_type, title=title, message=message,
+    )
+    try:
+        async_to_sync(get_channel_layer().group_send)(BROADCAST_GROUPS[audience], notification_event(broadcast))
+    except Exception as e:
+        if strict:
+            raise DeliveryError(f'Broadcast {broadcast.id} to {audience} not sent: {e}') from e
+        # Уведомление сохранено в БД, получатели увидят его при следующем запросе
+        logger.error(f"Failed to send broadcast {broadcast.id} to {audience}: {e}")
+    return broadcast
+
+
+def create_read_states(user_ids):
+    """
+    Записи прочтения для пользователей, записанных массово в обход
+    post_save (create_broadcast_read_state): как и при регистрации, им не
+    видны общие уведомления, отправленные раньше.
+    """
+    now = timezone.now()
+    load_objects(BroadcastReadState, [BroadcastReadState(user_id=user_id, visible_from=now) for user_id in user_ids])
+
+
+def get_read_state(user):
+    return BroadcastReadState.objects.filter(user=user).first() or BroadcastReadState(user=user)
+
+
+def visible_broadcasts(user, state=None):
+    """
+    Общие уведомления, видимые пользователю, с признаком is_read, или None,
+    если для его роли общих уведомлений нет.
+    """
+    if user.user_type not in BROADCAST_GROUPS:
+        return None
+    state = state or get_read_state(user)
+    queryset = BroadcastNotification.objects.filter(
+        audience=user.user_type,
+        type__in=Notification.get_allowed_types_for_user(user),
+    )
+    if state.visible_from:
+        queryset = queryset.filter(created_at__gte=state.visible_from)
+    read = Q(id__in=state.read_ids)
+    if state.read_until:
+        read |= Q(created_at__lte=state.read_until)
+    return queryset.annotate(is_read=Case(When(read, then=Value(True)), default=Value(False), output_field=BooleanField()))
+
+
+def mark_broadcast_read(user, broadcast_id, created_at):
+    with transaction.atomic():
+        state, _ = BroadcastReadState.objects.select_for_update().get_or_create(user=user)
+        if (state.read_until and created_at <= state.read_until) or broadcast_id in state.read_ids:
+            return
+        state.read_ids.append(broadcast_id)
+        compact_read_state(user, state)
+        state.save(update_fields=['read_until', 'read_ids'])
+
+
+def compact_read_state(user, state):
+    """
+    Сжимает read_ids: прочитанные до самого старого непрочитанного уведомления
+    покрываются отметкой read_until и из списка убираются. Если в списке все
+    еще больше MAX_READ_IDS id, отметка сдвигается дальше и самые старые
+    непрочитанные между ними тоже считаются прочитанными.
+    """
+    read = sorted(
+        BroadcastNotification.objects.filter(id__in=state.read_ids).values_list('created_at', 'id'),
+    )
+    first_unread = (
+        visible_broadcasts(user, state).filter(is_read=False)
+        .order_by('created_at', 'id').values_list('created_at', flat=True).first()
+    )
+    covered = [row for row in read if first_unread is None or row[0] < first_unread]
+    if len(read) - len(covered) > MAX_READ_IDS:
+        covered = read[:len(read) - MAX_READ_IDS]
+    if covered:
+        state.read_until = max(filter(None, (state.read_until, covered[-1][0])))
+    # Покрытые отметкой и удаленные уведомления из списка выпадают
+    state.read_ids = [
+        broadcast_id for created_at, broadcast_id in read
+        if state.read_until is None or created_at > state.read_until
+    ]
+
+
+def mark_all_broadcasts_read(user):
+    # Отметка времени покрывает все прочитанные по одному
+    BroadcastReadState.objects.update_or_create(user=user, defaults={'read_until': timezone.now(), 'read_ids': []})
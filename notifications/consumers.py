@@ -4,9 +4,27 @@ from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
+from .broadcasts import BROADCAST_GROUPS
+from .counters import get_unread_count
 from .models import Notification
+from .utils import PENDING_POOL_GROUP, USER_EVENTS_GROUP
 
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Уведомления пользователя (ws/notifications/). Отправители кладут в личную
+    группу и группу роли только разрешенные роли типы, поэтому лишние сообщения
+    до соединения не доходят. Роль и разрешенные типы загружаются один раз при
+    подключении и обновляются событием role_change, без запросов к базе на
+    каждое сообщение.
+
+    Число непрочитанных (unread_count) тоже загружается при подключении:
+    каждое новое уведомление увеличивает его и приходит вместе с ним, а после
+    прочтения сервер присылает новое значение сообщением unread_count.
+    """
+
+    # Загружать ли при подключении число непрочитанных уведомлений
+    count_unread = True
+
     async def connect(self):
         try:
             # Получаем токен из query параметров
@@ -14,28 +32,39 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             # Проверяем токен и получаем пользователя
             user = await self.get_user_from_token(token)
             
-            if user:
+            group_names = self.get_group_names(user) if user else []
+
+            if group_names:
                 self.user = user
-                self.room_group_name = f'notifications_{user.id}'
+                self.allowed_types = Notification.get_allowed_types_for_user(user)
+                self.group_names = [*group_names, USER_EVENTS_GROUP.format(user_id=user.id)]
+                if self.count_unread:
+                    self.unread = await database_sync_to_async(get_unread_count)(user)
                 
-                # Присоединяемся к группе пользователя
-                await self.channel_layer.group_add(
-                    self.room_group_name,
-                    self.channel_name
-                )
+                # Присоединяемся к группам пользователя
+                for group_name in self.group_names:
+                    await self.channel_layer.group_add(group_name, self.channel_name)
                 await self.accept()
             else:
                 await self.close()
         except (IndexError, TokenError):
             await self.close()
 
+    def get_group_names(self, user):
+        """
+        Группы, из которых соединение получает сообщения: личная и группа
+        общих уведомлений роли. Пустой список - подключение не разрешено.
+        Группа служебных событий (USER_EVENTS_GROUP) добавляется к ним всегда.
+        """
+        group_names = [f'notifications_{user.id}']
+        if user.user_type in BROADCAST_GROUPS:
+            group_names.append(BROADCAST_GROUPS[user.user_type])
+        return group_names
+
     async def disconnect(self, close_code):
-        # Покидаем группу при отключении
-        if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
-            )
+        # Покидаем группы при отключении
+        for group_name in getattr(self, 'group_names', []):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
 
     async def receive(self, text_data):
         # Обработка входящих сообщ��ний (если нужно)
@@ -46,14 +75,39 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         Отправляет уведомление клиенту с учетом его роли.
         """
         message = event['message']
-        
-        # Проверяем, разрешено ли уведомление для роли пользователя
-        allowed_types = await self.get_allowed_notification_types(self.user)
-        if message['type'] not in allowed_types:
-            return  # Не отправляем уведомление, если тип не разрешен для роли
 
-        # Отправляем уведомление
-        await self.send(text_data=json.dumps(message))
+        # Страховка на случай сообщения, отправленного до смены роли
+        if message['type'] not in self.allowed_types:
+            return
+
+        # Новое уведомление не прочитано
+        self.unread += 1
+        await self.send(text_data=json.dumps({**message, 'unread_count': self.unread}))
+
+    async def unread_count(self, event):
+        """
+        Число непрочитанных изменилось после прочтения уведомлений.
+        """
+        self.unread = event['unread_count']
+        await self.send(text_data=json.dumps({'type': 'unread_count', 'unread_count': self.unread}))
+
+    async def role_change(self, event):
+        """
+        Роль пользователя изменилась: обновляет разрешенные типы и группы
+        роли, а если новой роли соединение не разрешено - закрывает его.
+        """
+        self.user.user_type = event['user_type']
+        self.allowed_types = Notification.get_allowed_types_for_user(self.user)
+        group_names = self.get_group_names(self.user)
+        if group_names:
+            group_names.append(USER_EVENTS_GROUP.format(user_id=self.user.id))
+        for group_name in set(self.group_names) - set(group_names):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        for group_name in set(group_names) - set(self.group_names):
+            await self.channel_layer.group_add(group_name, self.channel_name)
+        self.group_names = group_names
+        if not group_names:
+            await self.close()
 
     @database_sync_to_async
     def get_user_from_token(self, token):
@@ -65,9 +119,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         except (TokenError, get_user_model().DoesNotExist):
             return None
 
-    @database_sync_to_async
-    def get_allowed_notification_types(self, user):
-        """
-        Возвращает разрешенные типы уведомлений для пользователя.
-        """
-        return Notification.get_allowed_types_for_user(user) 
\ No newline at end of file
+
+class PendingPoolConsumer(NotificationConsumer):
+    """
+    Поток изменений пула ожидающих заказов для курьеров (ws/orders/pool/):
+    added и updated с заказом в формате списка, taken и cancelled с его id.
+    События публикует orders/sync.py после фиксации смены статуса, поэтому
+    курьер убирает принятый заказ из ленты до следующего опроса. Курьер,
+    сменивший роль, отключается от пула по событию role_change.
+    """
+
+    count_unread = False
+
+    def get_group_names(self, user):
+        return [PENDING_POOL_GROUP] if user.user_type == 'courier' else []
+
+    async def pool_change(self, event):
+        await self.send(text_data=event['text'])
@@ -0,0 +1,101 @@
+"""
+Счетчик непрочитанных уведомлений (GET /api/notifications/unread-count/).
+
+Личные непрочитанные уведомления считает счетчик пользователя в кэше
+(UNREAD_COUNT_KEY, shoe_service/cache.py): создание уведомления увеличивает
+его, прочтение и удаление уменьшают на число действительно измененных строк.
+incr атомарен в кэше, поэтому параллельные изменения не теряются. Если
+счетчика нет (вытеснен или истек), изменения пропускаются, а при следующем
+чтении он пересчитывается по базе. Таймаут NOTIFICATION_UNREAD_COUNT_TIMEOUT
+ограничивает время жизни возможного расхождения.
+
+Общие уведомления (notifications/broadcasts.py) нельзя учесть в счетчике
+каждого курьера без рассылки по всем. Вместо этого у роли есть общий номер
+последнего уведомления (get_broadcast_sequence), а у пользователя в кэше -
+число непрочитанных вместе с номером, при котором оно посчитано: новые
+уведомления прибавляются разностью номеров без запроса к базе. По базе
+число пересчитывается, только когда пользователь прочитал уведомления
+(поколение его уведомлений) или общие уведомления роли удалены, и не дальше
+BROADCAST_UNREAD_COUNT_LIMIT: больше число не растет.
+
+Открытое WebSocket-соединение получает счетчик при подключении, само
+увеличивает его с каждым новым уведомлением, а после прочтения получает
+новое значение сообщением unread_count (send_unread_count).
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from shoe_service.cache import (
+    BROADCAST_REMOVAL_SCOPE, NOTIFICATIONS_SCOPE, UNREAD_COUNT_KEY, get_broadcast_sequence, get_generation,
+)
+from .broadcasts import BROADCAST_GROUPS, visible_broadcasts
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Число непрочитанных общих уведомлений и номер, при котором оно посчитано, в рамках поколения
+BROADCAST_UNREAD_COUNT_KEY = 'notifications:unread-broadcasts:{user_id}:{generation}'
+# Предел числа непрочитанных общих уведомлений: дальше база не считает
+BROADCAST_UNREAD_COUNT_LIMIT = 1000
+
+
+def get_unread_count(user):
+    """
+    Число непрочитанных уведомлений пользователя, личных и общих.
+    """
+    return _personal_unread_count(user) + _broadcast_unread_count(user)
+
+
+def _personal_unread_count(user):
+    key = UNREAD_COUNT_KEY.format(user_id=user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            recipient=user, is_read=False, type__in=Notification.get_allowed_types_for_user(user),
+        ).count()
+        # add не затирает счетчик, который успел создать параллельный запрос
+        cache.add(key, count, settings.NOTIFICATION_UNREAD_COUNT_TIMEOUT)
+    return max(count, 0)
+
+
+def _broadcast_unread_count(user):
+    if user.user_type not in BROADCAST_GROUPS:
+        return 0
+    generation = '{}-{}'.format(
+        get_generation(BROADCAST_REMOVAL_SCOPE.format(audience=user.user_type)),
+        get_generation(NOTIFICATIONS_SCOPE.format(user_id=user.id)),
+    )
+    key = BROADCAST_UNREAD_COUNT_KEY.format(user_id=user.id, generation=generation)
+    # Номер берется до подсчета: уведомление, зафиксированное между ними,
+    # может быть учтено дважды до истечения записи, но не пропадет
+    sequence = get_broadcast_sequence(user.user_type)
+    cached = cache.get(key)
+    if cached is not None:
+        count, counted_at = cached
+        if 0 <= sequence - counted_at <= BROADCAST_UNREAD_COUNT_LIMIT:
+            return min(count + sequence - counted_at, BROADCAST_UNREAD_COUNT_LIMIT)
+    count = visible_broadcasts(user).filter(is_read=False)[:BROADCAST_UNREAD_COUNT_LIMIT].count()
+    cache.set(key, (count, sequence), settings.NOTIFICATION_UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def send_unread_count(user):
+    """
+    Отправляет открытым соединениям пользователя текущее число непрочитанных.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f'notifications_{user.id}', {'type': 'unread_count', 'unread_count': get_unread_count(user)},
+        )
+    except Exception as e:
+        # Клиент получит число при следующем запросе или подключении
+        logger.error(f"Failed to send unread count to user {user.id}: {e}")
+
+
+def send_unread_count_on_commit(user):
+    transaction.on_commit(lambda: send_unread_count(user))
@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Доставляет уведомления из очереди (outbox): создает уведомления и отправляет их '
+        'через WebSocket. Без --interval обрабатывает очередь до конца и завершается. '
+        'Можно запускать несколько воркеров одновременно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, help='Проверять пустую очередь каждые N секунд')
+        parser.add_argument('--report', type=float, default=10, help='Печатать метрики каждые N секунд')
+
+    def handle(self, *args, **options):
+        totals = self.reset()
+        while True:
+            stats = deliver_pending(options['batch_size'])
+            for name in ('entries', 'delivered', 'retried', 'failed', 'notifications'):
+                totals[name] += stats[name]
+            totals['lag'] = max(totals['lag'], stats['lag'])
+
+            idle = not stats['entries']
+            if idle and not options['interval']:
+                self.write_report(totals)
+                return
+            if time.perf_counter() - totals['started'] >= options['report']:
+                # Пустые интервалы не печатаются
+                if totals['entries']:
+                    self.write_report(totals)
+                totals = self.reset()
+            if idle:
+                time.sleep(options['interval'])
+
+    def reset(self):
+        return {
+            'entries': 0, 'delivered': 0, 'retried': 0, 'failed': 0, 'notifications': 0, 'lag': 0.0,
+            'started': time.perf_counter(),
+        }
+
+    def write_report(self, totals):
+        elapsed = max(time.perf_counter() - totals['started'], 1e-9)
+        self.stdout.write(
+            f"Delivered {totals['delivered']} entries ({totals['notifications']} notifications) "
+            f"in {elapsed:.1f} s: {totals['delivered'] / elapsed:.0f} entries/s, "
+            f"{totals['notifications'] / elapsed:.0f} notifications/s; "
+            f"retried {totals['retried']}, failed {totals['failed']}, max lag {totals['lag']:.1f} s."
+        )
@@ -0,0 +1,127 @@
+import asyncio
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import User
+from notifications.broadcasts import send_broadcast
+from notifications.models import BroadcastNotification
+from notifications.routing import websocket_urlpatterns
+from orders.models import DeletedPendingOrder, Order
+from service.models import Service
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест WebSocket-уведомлений: открывает --sockets соединений '
+        'ws/notifications/ (курьеры и доля --clients клиентов), рассылает курьерам '
+        'серию из --messages общих уведомлений new_order и замеряет задержку от отправки '
+        'до получения каждым соединением. Клиенты не должны получить ни одного сообщения. '
+        'Данные создаются в базе и удаляются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=5000)
+        parser.add_argument('--clients', type=float, default=0.1, help='Доля соединений клиентов')
+        parser.add_argument(
+            '--messages', type=int, default=20,
+            help='Уведомлений в серии (не больше емкости канала channel layer)',
+        )
+        parser.add_argument('--timeout', type=float, default=120.0, help='Ожидание доставки, сек')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        couriers, clients, order = self.seed(options, rng)
+        try:
+            stats = async_to_sync(self.simulate)(couriers, clients, order, options)
+        finally:
+            self.cleanup(couriers, clients, order)
+
+        latencies = stats['latencies']
+        expected = len(couriers) * options['messages']
+        self.stdout.write(
+            f"{len(couriers) + len(clients)} sockets ({len(clients)} clients) connected "
+            f"in {stats['connect']:.1f} s"
+        )
+        self.stdout.write(
+            f"Delivered {len(latencies)} of {expected} messages in {stats['elapsed']:.2f} s "
+            f"({len(latencies) / max(stats['elapsed'], 1e-9):.0f} messages/s), "
+            f"{stats['leaked']} routed to clients"
+        )
+        if len(latencies) >= 2:
+            cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+            self.stdout.write(
+                f"Latency, ms: p50 {cuts[49]:.1f}, p95 {cuts[94]:.1f}, p99 {cuts[98]:.1f}, max {max(latencies):.1f}"
+            )
+
+    def seed(self, options, rng):
+        suffix = rng.random()
+        count = options['sockets']
+        client_count = round(count * options['clients'])
+        users = User.objects.bulk_create([
+            User(
+                email=f'ws-load-{suffix}-{i}@example.com', first_name='Load',
+                user_type='client' if i < client_count else 'courier',
+            )
+            for i in range(count)
+        ])
+        service = Service.objects.create(name='Load test', slug=f'ws-load-{suffix}', price=Decimal('100'))
+        order = Order.objects.create(service=service, customer=users[0], street='Тверская')
+        return users[client_count:], users[:client_count], order
+
+    def cleanup(self, couriers, clients, order):
+        service, order_id = order.service, order.id
+        BroadcastNotification.objects.filter(order=order).delete()
+        order.delete()
+        DeletedPendingOrder.objects.filter(order_id=order_id).delete()
+        User.objects.filter(pk__in=[user.pk for user in (*couriers, *clients)]).delete()
+        service.delete()
+
+    async def simulate(self, couriers, clients, order, options):
+        application = URLRouter(websocket_urlpatterns)
+        started = time.perf_counter()
+        communicators = {}
+        for user in (*couriers, *clients):
+            communicator = WebsocketCommunicator(application, f'/ws/notifications/?token={AccessToken.for_user(user)}')
+            connected, _ = await communicator.connect(timeout=options['timeout'])
+            assert connected
+            communicators[user.id] = communicator
+        connect = time.perf_counter() - started
+
+        sent_at = {}
+        latencies = []
+
+        async def receive(communicator):
+            for _ in range(options['messages']):
+                try:
+                    message = await communicator.receive_json_from(timeout=options['timeout'])
+                except asyncio.TimeoutError:
+                    return
+                latencies.append((time.perf_counter() - sent_at[message['title']]) * 1000)
+
+        receivers = [asyncio.ensure_future(receive(communicators[courier.id])) for courier in couriers]
+        send = sync_to_async(send_broadcast)
+        started = time.perf_counter()
+        for number in range(options['messages']):
+            title = f'Новый заказ {number}'
+            sent_at[title] = time.perf_counter()
+            await send(order, 'new_order', title, 'Нагрузочный тест')
+        await asyncio.gather(*receivers)
+        elapsed = time.perf_counter() - started
+
+        leaked = 0
+        for client in clients:
+            while not await communicators[client.id].receive_nothing(timeout=0.001):
+                await communicators[client.id].receive_from()
+                leaked += 1
+        for communicator in communicators.values():
+            await communicator.disconnect()
+        return {'connect': connect, 'elapsed': elapsed, 'latencies': latencies, 'leaked': leaked}
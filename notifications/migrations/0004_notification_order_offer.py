@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 08:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('new_order', 'Новый заказ'), ('order_offer', 'Предложение заказа'), ('courier_assigned', 'Курьер назначен'), ('courier_on_the_way', 'Курьер в пути'), ('at_location', 'Курьер на месте'), ('courier_on_the_way_to_master', 'Курьер везет заказ мастеру'), ('in_progress', 'Заказ в работе у мастера'), ('completed', 'Заказ выполнен'), ('cancelled', 'Заказ отменен'), ('return', 'Возврат заказа'), ('system', 'Системное уведомление')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0021_order_change_seq'),
+        ('notifications', '0004_notification_order_offer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('new_order', 'Новый заказ'), ('order_offer', 'Предложение заказа'), ('courier_assigned', 'Курьер назначен'), ('courier_on_the_way', 'Курьер в пути'), ('at_location', 'Курьер на месте'), ('courier_on_the_way_to_master', 'Курьер везет заказ мастеру'), ('in_progress', 'Заказ в работе у мастера'), ('completed', 'Заказ выполнен'), ('cancelled', 'Заказ отменен'), ('return', 'Возврат заказа'), ('system', 'Системное уведомление')], max_length=50)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('failed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='orders.order')),
+                ('recipient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Исходящее уведомление',
+                'verbose_name_plural': 'Исходящие уведомления',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(condition=models.Q(('failed_at__isnull', True)), fields=['available_at', 'id'], name='notif_outbox_queue_idx'),
+        ),
+    ]
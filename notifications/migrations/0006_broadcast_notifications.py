@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 09:11
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_order_change_seq'),
+        ('authentication', '0007_user_image'),
+        ('notifications', '0005_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastReadState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='broadcast_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('visible_from', models.DateTimeField(blank=True, null=True)),
+                ('read_until', models.DateTimeField(blank=True, null=True)),
+                ('read_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+            ],
+            options={
+                'verbose_name': 'Прочтение общих уведомлений',
+                'verbose_name_plural': 'Прочтение общих уведомлений',
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('audience', models.CharField(choices=[('client', 'Client'), ('courier', 'Courier'), ('admin', 'Admin')], max_length=10)),
+                ('type', models.CharField(choices=[('new_order', 'Новый заказ'), ('order_offer', 'Предложение заказа'), ('courier_assigned', 'Курьер назначен'), ('courier_on_the_way', 'Курьер в пути'), ('at_location', 'Курьер на месте'), ('courier_on_the_way_to_master', 'Курьер везет заказ мастеру'), ('in_progress', 'Заказ в работе у мастера'), ('completed', 'Заказ выполнен'), ('cancelled', 'Заказ отменен'), ('return', 'Возврат заказа'), ('system', 'Системное уведомление')], max_length=50)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Общее уведомление',
+                'verbose_name_plural': 'Общие уведомления',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='broadcastnotification',
+            index=models.Index(fields=['audience', 'created_at', 'id'], name='notif_broadcast_feed_idx'),
+        ),
+    ]
@@ -1,4 +1,6 @@
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from orders.models import Order
 
@@ -9,6 +11,7 @@ class Notification(models.Model):
     COURIER_NOTIFICATION_TYPES = {
         'new_order',              # Новый заказ
         'order_cancelled',        # Отмена заказа
+        'order_offer',            # Предложение заказа от распределителя
         'system'                  # Системные уведомления
     }
 
@@ -27,6 +30,7 @@ class Notification(models.Model):
 
     NOTIFICATION_TYPES = [
         ('new_order', 'Новый заказ'),
+        ('order_offer', 'Предложение заказа'),
         ('courier_assigned', 'Курьер назначен'),
         ('courier_on_the_way', 'Курьер в пути'),
         ('at_location', 'Курьер на месте'),
@@ -38,7 +42,7 @@ class Notification(models.Model):
         ('system', 'Системное уведомление')
     ]
 
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications', db_index=False)  # Покрыт составными индексами
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
     type = models.CharField(max_length=50, choices=NOTIFICATION_TYPES)
     title = models.CharField(max_length=255)
@@ -50,6 +54,12 @@ class Notification(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
+        indexes = [
+            # Список уведомлений пользователя
+            models.Index(fields=['recipient', 'created_at', 'id'], name='notif_recipient_created_idx'),
+            # Непрочитанные уведомления
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notif_recipient_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} - {self.recipient.email} - {self.created_at}"
@@ -60,6 +70,96 @@ class Notification(models.Model):
         Возвращает список разрешенных типов уведомлений для пользователя
         в зависимости от его роли.
         """
-        if user.user_type == 'courier':
+        return cls.get_allowed_types_for_role(user.user_type)
+
+    @classmethod
+    def get_allowed_types_for_role(cls, user_type):
+        if user_type == 'courier':
             return cls.COURIER_NOTIFICATION_TYPES
         return cls.CLIENT_NOTIFICATION_TYPES
+
+
+class NotificationOutbox(models.Model):
+    """
+    Уведомление о заказе, ожидающее доставки (см. notifications/outbox.py).
+    Записывается в транзакции изменения заказа; воркер deliver_notifications
+    создает по нему Notification и отправляет их через WebSocket.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    # Без получателя - по типу: new_order всем курьерам, остальное клиенту и курьеру заказа
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    type = models.CharField(max_length=50, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Следующая попытка доставки не раньше этого времени
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Попытки исчерпаны, запись больше не выбирается
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Исходящее уведомление'
+        verbose_name_plural = 'Исходящие уведомления'
+        indexes = [
+            # Очередь воркера
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(failed_at__isnull=True),
+                name='notif_outbox_queue_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} - order {self.order_id} - attempt {self.attempts}"
+
+
+class BroadcastNotification(models.Model):
+    """
+    Общее уведомление для всех пользователей роли audience (new_order всем
+    курьерам): одна запись вместо копии на каждого получателя. В ленту
+    пользователя попадает при чтении (см. notifications/broadcasts.py).
+    id берется из последовательности Notification, поэтому он уникален
+    в общей ленте и подходит для mark_as_read.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    audience = models.CharField(max_length=10, choices=User.USER_TYPE_CHOICES)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    type = models.CharField(max_length=50, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Общее уведомление'
+        verbose_name_plural = 'Общие уведомления'
+        indexes = [
+            # Лента роли
+            models.Index(fields=['audience', 'created_at', 'id'], name='notif_broadcast_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} - {self.audience} - {self.created_at}"
+
+
+class BroadcastReadState(models.Model):
+    """
+    Прочтение общих уведомлений пользователем: прочитаны все созданные
+    не позже read_until и, из более новых, перечисленные в read_ids.
+    Созданные раньше visible_from (регистрации пользователя) не показываются.
+    Пользователь без записи видит все общие уведомления непрочитанными.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='broadcast_state')
+    visible_from = models.DateTimeField(null=True, blank=True)
+    read_until = models.DateTimeField(null=True, blank=True)
+    read_ids = ArrayField(models.BigIntegerField(), default=list, blank=True)
+
+    class Meta:
+        verbose_name = 'Прочтение общих уведомлений'
+        verbose_name_plural = 'Прочтение общих уведомлений'
+
+    def __str__(self):
+        return f"{self.user_id} - read until {self.read_until}"
+
@@ -0,0 +1,147 @@
+"""
+Доставка уведомлений о заказах через outbox.
+
+Запросы не рассылают уведомления сами: enqueue_order_notification записывает
+строку NotificationOutbox в транзакции, которая меняет заказ, поэтому
+уведомление появляется ровно тогда, когда фиксируется изменение, а сбой
+channel layer не влияет на ответ. Воркер (команда deliver_notifications)
+забирает записи пачками через SELECT ... FOR UPDATE SKIP LOCKED, так что
+несколько воркеров не мешают друг другу, создает по ним Notification
+(для new_order - одно общее уведомление, см. notifications/broadcasts.py)
+и отправляет их через WebSocket.
+
+Запись удаляется в той же транзакции, что создает уведомления, и только
+после отправки: доставка выполняется хотя бы один раз. Каждая запись
+доставляется в своей точке сохранения: при ошибке откатываются только ее
+уведомления, а уже отправленные по другим записям остаются и повторно
+не приходят. Недоставленная запись откладывается с удвоением задержки;
+после NOTIFICATION_OUTBOX_MAX_ATTEMPTS попыток она помечается failed_at
+и больше не выбирается.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .broadcasts import send_broadcast
+from .models import Notification, NotificationOutbox
+from .utils import notify_couriers, send_notifications
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_order_notification(order, notification_type, title, message, recipient=None):
+    """
+    Ставит уведомление о заказе в очередь доставки. Получатели - как
+    в send_order_notification: recipient, для new_order - все активные
+    курьеры, иначе клиент и курьер заказа на момент доставки.
+    """
+    return NotificationOutbox.objects.create(
+        order=order, recipient=recipient, type=notification_type, title=title, message=message,
+    )
+
+
+def enqueue_order_notifications(items):
+    """
+    Ставит в очередь уведомления о нескольких заказах одним INSERT.
+
+    Args:
+        items: Последовательность (order, notification_type, title, message).
+    """
+    return NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(order=order, type=notification_type, title=title, message=message)
+        for order, notification_type, title, message in items
+    ])
+
+
+def retry_delay(attempts):
+    """
+    Задержка перед следующей попыткой после attempts неудачных.
+    """
+    delay = settings.NOTIFICATION_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.NOTIFICATION_OUTBOX_MAX_RETRY_DELAY))
+
+
+def deliver_pending(batch_size=None):
+    """
+    Один проход воркера: забирает до batch_size готовых записей, доставляет
+    их и возвращает метрики прохода: entries (забрано), delivered, retried,
+    failed (попытки исчерпаны), notifications (создано уведомлений) и lag -
+    наибольшее время от постановки в очередь до доставки, сек.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_OUTBOX_BATCH_SIZE
+    stats = {'entries': 0, 'delivered': 0, 'retried': 0, 'failed': 0, 'notifications': 0, 'lag': 0.0}
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('order__customer', 'order__courier', 'recipient')
+            .filter(failed_at__isnull=True, available_at__lte=timezone.now())
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        if not entries:
+            return stats
+        stats['entries'] = len(entries)
+
+        # Отправленное в channel layer не отзывается, поэтому откат пачки
+        # целиком и повтор по одной привели бы к дублям у получателей
+        delivered, rejected = [], []
+        for entry in entries:
+            try:
+                with transaction.atomic():
+                    stats['notifications'] += _deliver([entry])
+                delivered.append(entry)
+            except Exception as e:
+                logger.warning(f"Outbox entry {entry.id} ({entry.type}) not delivered: {e}")
+                rejected.append((entry, e))
+
+        now = timezone.now()
+        NotificationOutbox.objects.filter(id__in=[entry.id for entry in delivered]).delete()
+        stats['delivered'] = len(delivered)
+        if delivered:
+            stats['lag'] = max((now - entry.created_at).total_seconds() for entry in delivered)
+
+        for entry, error in rejected:
+            entry.attempts += 1
+            entry.last_error = str(error)
+            if entry.attempts >= settings.NOTIFICATION_OUTBOX_MAX_ATTEMPTS:
+                entry.failed_at = now
+                stats['failed'] += 1
+                logger.error(f"Outbox entry {entry.id} ({entry.type}) failed after {entry.attempts} attempts: {error}")
+            else:
+                entry.available_at = now + retry_delay(entry.attempts)
+                stats['retried'] += 1
+        if rejected:
+            NotificationOutbox.objects.bulk_update(
+                [entry for entry, _ in rejected], ['attempts', 'last_error', 'available_at', 'failed_at'],
+            )
+    return stats
+
+
+def _deliver(entries):
+    """
+    Создает и отправляет уведомления по записям очереди; ошибка отправки
+    поднимает исключение. Возвращает число созданных уведомлений.
+    """
+    created = 0
+    notifications = []
+    for entry in entries:
+        if entry.recipient_id is None and entry.type == 'new_order':
+            if settings.NOTIFICATION_NEW_ORDER_BROADCAST:
+                send_broadcast(entry.order, entry.type, entry.title, entry.message, strict=True)
+                created += 1
+            else:
+                created += notify_couriers(entry.order, entry.type, entry.title, entry.message, strict=True)
+            continue
+        if entry.recipient_id is not None:
+            recipients = [entry.recipient]
+        else:
+            recipients = [user for user in (entry.order.customer, entry.order.courier) if user]
+        notifications.extend(
+            Notification(recipient=user, order=entry.order, type=entry.type, title=entry.title, message=entry.message)
+            for user in recipients
+            if entry.type in Notification.get_allowed_types_for_user(user)
+        )
+    return created + len(send_notifications(notifications, strict=True))
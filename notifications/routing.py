@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
+    re_path(r'ws/orders/pool/$', consumers.PendingPoolConsumer.as_asgi()),
 ] 
\ No newline at end of file
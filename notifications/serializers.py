@@ -7,6 +7,17 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = ['id', 'type', 'title', 'message', 'order', 'created_at', 'is_read']
         read_only_fields = ['recipient']
 
+    @classmethod
+    def setup_queryset(cls, queryset):
+        """
+        Подгружает заказ и его услугу одним JOIN и ограничивает выборку полями,
+        которые читает сериализатор.
+        """
+        return queryset.select_related('order__service').only(
+            *cls.Meta.fields,
+            'order__status', 'order__created_at', 'order__service', 'order__service__name',
+        )
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
         if instance.order:
@@ -19,4 +30,52 @@ class NotificationSerializer(serializers.ModelSerializer):
                 'status': instance.order.status,
                 'created_at': instance.order.created_at
             }
-        return data 
\ No newline at end of file
+        return data
+
+
+# Поля values()-выборки для быстрой сериализации списков уведомлений. is_read последним:
+# у общих уведомлений это аннотация, и она идет после полей в SELECT (для UNION)
+NOTIFICATION_ROW_FIELDS = (
+    'id', 'type', 'title', 'message', 'created_at',
+    'order_id', 'order__service_id', 'order__service__name', 'order__status', 'order__created_at',
+    'is_read',
+)
+
+_datetime_field = serializers.DateTimeField()
+
+
+def notification_rows(queryset):
+    """
+    Превращает queryset уведомлений в values()-выборку для serialize_notification_rows.
+    """
+    return queryset.values(*NOTIFICATION_ROW_FIELDS)
+
+
+def serialize_notification_rows(rows):
+    """
+    Быстрый путь сериализации списка уведомлений напрямую из строк values().
+    Результат совпадает с NotificationSerializer(many=True).data.
+    """
+    data = []
+    for row in rows:
+        order = None
+        if row['order_id'] is not None:
+            order = {
+                'id': row['order_id'],
+                'service': {
+                    'id': row['order__service_id'],
+                    'name': row['order__service__name']
+                },
+                'status': row['order__status'],
+                'created_at': row['order__created_at']
+            }
+        data.append({
+            'id': row['id'],
+            'type': row['type'],
+            'title': row['title'],
+            'message': row['message'],
+            'order': order,
+            'created_at': _datetime_field.to_representation(row['created_at']),
+            'is_read': row['is_read'],
+        })
+    return data
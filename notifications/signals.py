@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from shoe_service.cache import (
+    BROADCAST_REMOVAL_SCOPE, BROADCAST_SCOPE, NOTIFICATIONS_SCOPE, bump_generation_on_commit,
+    change_unread_counts_on_commit, count_broadcast_on_commit, reset_unread_count,
+)
+from .counters import send_unread_count
+from .models import BroadcastNotification, BroadcastReadState, Notification
+from .utils import send_role_change
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notifications_version(sender, instance, **kwargs):
+    """
+    Новое, прочитанное или удаленное уведомление меняет версию списка получателя.
+    """
+    bump_generation_on_commit(NOTIFICATIONS_SCOPE.format(user_id=instance.recipient_id))
+
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        change_unread_counts_on_commit({instance.recipient_id: 1})
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        change_unread_counts_on_commit({instance.recipient_id: -1})
+
+
+@receiver(post_save, sender=BroadcastNotification)
+@receiver(post_delete, sender=BroadcastNotification)
+def bump_broadcast_version(sender, instance, **kwargs):
+    """
+    Общее уведомление меняет версию списков всех пользователей роли.
+    """
+    bump_generation_on_commit(BROADCAST_SCOPE.format(audience=instance.audience))
+
+
+@receiver(post_save, sender=BroadcastNotification)
+def count_broadcast_notification(sender, instance, created, **kwargs):
+    if created:
+        count_broadcast_on_commit(instance.audience)
+
+
+@receiver(post_delete, sender=BroadcastNotification)
+def uncount_broadcast_notification(sender, instance, **kwargs):
+    """
+    Удаленное общее уведомление нельзя вычесть из счетчика каждого
+    пользователя, поэтому число непрочитанных пересчитывается по базе.
+    """
+    bump_generation_on_commit(BROADCAST_REMOVAL_SCOPE.format(audience=instance.audience))
+
+
+@receiver(post_save, sender=BroadcastReadState)
+def bump_broadcast_read_version(sender, instance, **kwargs):
+    bump_generation_on_commit(NOTIFICATIONS_SCOPE.format(user_id=instance.user_id))
+
+
+@receiver(post_save, sender=get_user_model())
+def create_broadcast_read_state(sender, instance, created, **kwargs):
+    """
+    Новый пользователь не видит общих уведомлений, отправленных до регистрации.
+    """
+    if created:
+        BroadcastReadState.objects.create(user=instance, visible_from=timezone.now())
+
+
+@receiver(post_save, sender=get_user_model())
+def notify_role_change(sender, instance, created, **kwargs):
+    """
+    Смена роли после фиксации передается открытым WebSocket-соединениям пользователя.
+    Счетчик непрочитанных пересчитывается: у новой роли другие типы уведомлений.
+    """
+    saved_user_type = getattr(instance, '_saved_user_type', None)
+    if not created and saved_user_type is not None and instance.user_type != saved_user_type:
+        def notify():
+            reset_unread_count(instance.id)
+            send_role_change(instance)
+            send_unread_count(instance)
+        transaction.on_commit(notify)
+
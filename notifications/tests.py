@@ -1,3 +1,798 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from decimal import Decimal
+from unittest import mock
+
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import User
+from orders import transitions
+from orders.models import Order
+from service.models import Service
+from shoe_service.bulk_load import allocate_ids
+from shoe_service.testing import QueryPlanMixin, postgresql_only
+from .broadcasts import send_broadcast, visible_broadcasts
+from .counters import get_unread_count
+from .models import BroadcastNotification, BroadcastReadState, Notification, NotificationOutbox
+from .outbox import deliver_pending, enqueue_order_notification
+from .routing import websocket_urlpatterns
+from .serializers import NotificationSerializer, notification_rows, serialize_notification_rows
+from .utils import notify_couriers, send_notifications
+
+
+class NotificationPaginationTestCase(TestCase):
+    """
+    Тесты курсорной пагинации списка уведомлений.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user, type='system', title=f'#{i}', message='Текст')
+            for i in range(25)
+        ])
+        # Половина уведомлений с одинаковым временем, чтобы проверить разрешение совпадений по id
+        same_time = timezone.now()
+        ids = list(Notification.objects.order_by('id').values_list('id', flat=True))
+        Notification.objects.filter(id__in=ids[5:18]).update(created_at=same_time)
+        self.expected = list(Notification.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_walk_forward_and_back(self):
+        url = '/api/notifications/?page_size=7'
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.api.get(url)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+            self.assertNotIn('count', response.data)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data['next']
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+
+        previous = self.api.get(response.data['previous']).data
+        self.assertEqual([item['id'] for item in previous['results']], pages[-2])
+        self.assertIsNotNone(previous['next'])
+
+    def test_page_number_mode(self):
+        response = self.api.get('/api/notifications/', {'page': 2})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual([item['id'] for item in response.data['results']], self.expected[10:20])
+
+        response = self.api.get('/api/notifications/', {'pagination': 'page'})
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.api.get('/api/notifications/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class NotificationListQueriesTestCase(TestCase):
+    """
+    Список уведомлений выполняется за постоянное число запросов
+    и совпадает с выводом NotificationSerializer.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        orders = [Order.objects.create(service=service, customer=self.user, street='Тверская') for _ in range(3)]
+        Notification.objects.bulk_create([
+            Notification(
+                recipient=self.user, type='completed', title='Заказ', message='Текст',
+                order=orders[i % 3] if i % 4 else None, is_read=bool(i % 2),
+            )
+            for i in range(60)
+        ])
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_constant_query_count(self):
+        for page_size in (5, 50):
+            with self.subTest(page_size=page_size), self.assertNumQueries(1):
+                self.api.get(f'/api/notifications/?page_size={page_size}')
+        with self.assertNumQueries(1):
+            self.api.get('/api/notifications/unread/')
+
+    def test_rows_match_serializer(self):
+        queryset = NotificationSerializer.setup_queryset(Notification.objects.order_by('id'))
+        expected = NotificationSerializer(queryset, many=True).data
+        self.assertEqual(serialize_notification_rows(notification_rows(queryset)), expected)
+
+
+@postgresql_only
+class NotificationQueryPlanTestCase(QueryPlanMixin, TestCase):
+    """
+    Горячие запросы к уведомлениям не должны деградировать до последовательного сканирования.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(f'user{i}@example.com', 'User', None, user_type='client')
+            for i in range(10)
+        ]
+        Notification.objects.bulk_create([
+            Notification(recipient=cls.users[i % 10], type='completed', title='Заказ', message='Текст',
+                         is_read=bool(i % 3))
+            for i in range(3000)
+        ])
+        cls.analyze('notifications_notification')
+
+    def test_list(self):
+        user = self.users[0]
+        notifications = Notification.objects.filter(
+            recipient=user, type__in=Notification.get_allowed_types_for_user(user),
+        )
+        plan = self.assertUsesIndex(notifications.order_by('-created_at', '-id')[:11], 'notifications_notification')
+        self.assertIn('notif_recipient_created_idx', plan)
+
+    def test_unread(self):
+        unread = Notification.objects.filter(recipient=self.users[0], is_read=False)
+        self.assertUsesIndex(unread.order_by('-created_at'), 'notifications_notification')
+        plan = self.assertUsesIndex(unread.values('id'), 'notifications_notification')
+        self.assertIn('notif_recipient_unread_idx', plan)
+
+    def test_broadcast_feed(self):
+        courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        BroadcastNotification.objects.bulk_create([
+            BroadcastNotification(id=pk, audience='courier', type='new_order', title='Заказ', message='Текст')
+            for pk in allocate_ids(Notification, 3000)
+        ])
+        self.analyze('notifications_broadcastnotification')
+        broadcasts = visible_broadcasts(courier)
+        plan = self.assertUsesIndex(broadcasts.order_by('-created_at', '-id')[:11], 'notifications_broadcastnotification')
+        self.assertIn('notif_broadcast_feed_idx', plan)
+
+
+class NotificationConditionalGetTestCase(TestCase):
+    """
+    ETag списка уведомлений меняется при новых уведомлениях и прочтении.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.notification = self.create_notification()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def create_notification(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(recipient=self.user, type='system', title='#1', message='Текст')
+
+    def test_not_modified_until_read(self):
+        for url in ('/api/notifications/', '/api/notifications/unread/'):
+            etag = self.api.get(url)['ETag']
+            with self.assertNumQueries(0):
+                self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        etag = self.api.get('/api/notifications/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post(f'/api/notifications/{self.notification.id}/mark_as_read/')
+        self.assertEqual(self.api.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.api.get('/api/notifications/')['ETag']
+        self.create_notification()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post('/api/notifications/mark_all_as_read/')
+        response = self.api.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class NewOrderFanOutTestCase(TestCase):
+    """
+    Уведомление о новом заказе получают все активные курьеры: пачками,
+    с постоянным числом запросов на пачку.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.couriers = [
+            User.objects.create_user(f'courier{i}@example.com', 'Courier', None, user_type='courier')
+            for i in range(5)
+        ]
+        User.objects.create_user('inactive@example.com', 'Courier', None, user_type='courier', is_active=False)
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+
+    @override_settings(NOTIFICATION_NEW_ORDER_BROADCAST=False)
+    def test_create_order(self):
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'notifications_{self.couriers[-1].id}', channel)
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        with mock.patch('notifications.utils.COURIER_CHUNK_SIZE', 2):
+            response = api.post('/api/orders/client/orders/', {'service': self.service.id, 'street': 'Тверская'})
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(Notification.objects.exists())
+            deliver_pending()
+
+        recipients = Notification.objects.filter(order_id=response.data['id'], type='new_order')
+        self.assertEqual(
+            sorted(recipients.values_list('recipient_id', flat=True)), [courier.id for courier in self.couriers],
+        )
+        message = async_to_sync(layer.receive)(channel)['message']
+        self.assertEqual((message['type'], message['order_id']), ('new_order', response.data['id']))
+
+    def test_queries_per_chunk(self):
+        order = Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+        # На пачку - выборка курьеров и INSERT, плюс пустая выборка в конце
+        with mock.patch('notifications.utils.COURIER_CHUNK_SIZE', 2), self.assertNumQueries(7):
+            self.assertEqual(notify_couriers(order, 'new_order', 'Новый заказ', 'Текст'), 5)
+        with mock.patch('notifications.utils.COURIER_CHUNK_SIZE', 10), self.assertNumQueries(3):
+            notify_couriers(order, 'new_order', 'Новый заказ', 'Текст')
+
+
+class BroadcastNotificationTestCase(TestCase):
+    """
+    Общие уведомления: одна запись на всех курьеров, лента объединяет
+    их с личными при чтении, прочтение хранится у каждого курьера.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.other = User.objects.create_user('other@example.com', 'Other', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.order = Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+        self.api = APIClient()
+        self.api.force_authenticate(self.courier)
+
+    def broadcast(self, title='Новый заказ'):
+        return send_broadcast(self.order, 'new_order', title, 'Текст')
+
+    def feed(self, user, url='/api/notifications/'):
+        self.api.force_authenticate(user)
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'] if isinstance(response.data, dict) else response.data
+
+    def test_new_order_is_stored_once(self):
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        response = api.post('/api/orders/client/orders/', {'service': self.service.id, 'street': 'Тверская'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(deliver_pending()['notifications'], 1)
+
+        broadcast = BroadcastNotification.objects.get()
+        self.assertEqual((broadcast.audience, broadcast.order_id), ('courier', response.data['id']))
+        self.assertFalse(Notification.objects.exists())
+        for courier in (self.courier, self.other):
+            self.assertEqual([(item['id'], item['is_read']) for item in self.feed(courier)], [(broadcast.id, False)])
+        self.assertEqual(self.feed(self.client_user), [])
+
+    def test_merged_feed(self):
+        first = self.broadcast('Первый')
+        personal = Notification.objects.create(recipient=self.courier, order=self.order, type='order_offer',
+                                               title='Предложение', message='Текст')
+        second = self.broadcast('Второй')
+        # Курьер, зарегистрированный позже, старых общих уведомлений не видит
+        newcomer = User.objects.create_user('new@example.com', 'New', None, user_type='courier')
+        third = self.broadcast('Третий')
+
+        # id общих и личных уведомлений из одной последовательности
+        self.assertEqual(len({first.id, personal.id, second.id, third.id}), 4)
+        with self.assertNumQueries(3):
+            items = self.feed(self.courier)
+        self.assertEqual([item['id'] for item in items], [third.id, second.id, personal.id, first.id])
+        self.assertEqual(items[0]['order']['service']['name'], 'Чистка')
+        self.assertEqual([item['id'] for item in self.feed(self.other)], [third.id, second.id, first.id])
+        self.assertEqual([item['id'] for item in self.feed(newcomer)], [third.id])
+
+        # Обход страниц по курсору и постраничный режим дают ту же ленту
+        expected = [third.id, second.id, personal.id, first.id]
+        self.api.force_authenticate(self.courier)
+        url, walked = '/api/notifications/?page_size=1', []
+        while url:
+            response = self.api.get(url)
+            walked += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(walked, expected)
+        paged = self.api.get('/api/notifications/?page=1&page_size=3').data
+        self.assertEqual([item['id'] for item in paged['results']], expected[:3])
+
+        self.assertEqual(self.api.get(f'/api/notifications/{second.id}/').data['title'], 'Второй')
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(f'/api/notifications/{second.id}/').status_code, 404)
+
+    def test_read_state(self):
+        first, second = self.broadcast(), self.broadcast()
+        self.api.force_authenticate(self.courier)
+        self.assertEqual(self.api.post(f'/api/notifications/{first.id}/mark_as_read/').status_code, 200)
+        self.api.post(f'/api/notifications/{first.id}/mark_as_read/')
+        # Прочитано самое старое: его покрывает отметка времени, а не список id
+        state = BroadcastReadState.objects.get(user=self.courier)
+        self.assertEqual((state.read_until, state.read_ids), (first.created_at, []))
+
+        self.assertEqual([item['id'] for item in self.feed(self.courier, '/api/notifications/unread/')], [second.id])
+        self.assertEqual(
+            [item['id'] for item in self.feed(self.other, '/api/notifications/unread/')], [second.id, first.id],
+        )
+
+        self.api.force_authenticate(self.courier)
+        self.api.post('/api/notifications/mark_all_as_read/')
+        state = BroadcastReadState.objects.get(user=self.courier)
+        self.assertEqual(state.read_ids, [])
+        self.assertIsNotNone(state.read_until)
+        third = self.broadcast()
+        self.assertEqual(
+            [(item['id'], item['is_read']) for item in self.feed(self.courier)],
+            [(third.id, False), (second.id, True), (first.id, True)],
+        )
+
+    def test_read_state_is_compacted(self):
+        broadcasts = [self.broadcast(f'Заказ {number}') for number in range(6)]
+        # Прочтение через одно: id копятся, пока есть более старое непрочитанное
+        for broadcast in broadcasts[1::2]:
+            self.api.post(f'/api/notifications/{broadcast.id}/mark_as_read/')
+        state = BroadcastReadState.objects.get(user=self.courier)
+        self.assertEqual(state.read_ids, [broadcasts[1].id, broadcasts[3].id, broadcasts[5].id])
+
+        self.api.post(f'/api/notifications/{broadcasts[0].id}/mark_as_read/')
+        state.refresh_from_db()
+        self.assertEqual((state.read_until, state.read_ids), (broadcasts[1].created_at, [broadcasts[3].id, broadcasts[5].id]))
+        self.assertEqual(
+            [item['id'] for item in self.feed(self.courier, '/api/notifications/unread/')],
+            [broadcasts[4].id, broadcasts[2].id],
+        )
+
+        # Сверх MAX_READ_IDS самые старые непрочитанные считаются прочитанными
+        with mock.patch('notifications.broadcasts.MAX_READ_IDS', 1):
+            self.api.force_authenticate(self.courier)
+            self.api.post(f'/api/notifications/{broadcasts[4].id}/mark_as_read/')
+        state.refresh_from_db()
+        self.assertEqual((state.read_until, state.read_ids), (broadcasts[4].created_at, [broadcasts[5].id]))
+        self.assertEqual(self.feed(self.courier, '/api/notifications/unread/'), [])
+
+    def test_conditional_get(self):
+        etag = self.api.get('/api/notifications/')['ETag']
+        self.assertEqual(self.api.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast = self.broadcast()
+        response = self.api.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post(f'/api/notifications/{broadcast.id}/mark_as_read/')
+        self.assertEqual(self.api.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class UnreadCountTestCase(TestCase):
+    """
+    Счетчик непрочитанных в кэше меняется вместе с уведомлениями
+    и пересчитывается по базе, если его нет.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.order = Order.objects.create(service=service, customer=self.client_user, street='Тверская')
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def unread_count(self):
+        response = self.api.get('/api/notifications/unread-count/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count']
+
+    def notify(self, user, notification_type='completed'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(recipient=user, order=self.order, type=notification_type,
+                                               title='Заголовок', message='Текст')
+
+    def test_counter(self):
+        first = self.notify(self.client_user)
+        self.assertEqual(self.unread_count(), 1)
+        # Счетчик уже в кэше: новые уведомления и прочтение меняют его без пересчета
+        second = self.notify(self.client_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            send_notifications([
+                Notification(recipient=self.client_user, order=self.order, type='in_progress', title='Т', message='Т'),
+            ])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread_count(), 3)
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.api.post(f'/api/notifications/{first.id}/mark_as_read/')
+        self.assertEqual(self.unread_count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.unread_count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(self.unread_count(), 0)
+
+        # Без счетчика в кэше число пересчитывается по базе
+        Notification.objects.filter(recipient=self.client_user).update(is_read=False)
+        cache.clear()
+        self.assertEqual(self.unread_count(), 2)
+
+    def test_broadcasts(self):
+        self.api.force_authenticate(self.courier)
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast = send_broadcast(self.order, 'new_order', 'Новый заказ', 'Текст')
+        self.notify(self.courier, 'order_offer')
+        self.assertEqual(self.unread_count(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post(f'/api/notifications/{broadcast.id}/mark_as_read/')
+        self.assertEqual(self.unread_count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            send_broadcast(self.order, 'new_order', 'Новый заказ', 'Текст')
+        self.assertEqual(self.unread_count(), 2)
+
+    def test_broadcasts_are_counted_without_queries(self):
+        self.assertEqual(get_unread_count(self.courier), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcasts = [send_broadcast(self.order, 'new_order', f'Новый заказ {i}', 'Текст') for i in range(3)]
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.courier), 3)
+
+        # Удаление общего уведомления пересчитывает число по базе
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcasts[0].delete()
+        self.assertEqual(get_unread_count(self.courier), 2)
+
+    def test_broadcast_count_limit(self):
+        with mock.patch('notifications.counters.BROADCAST_UNREAD_COUNT_LIMIT', 2):
+            with self.captureOnCommitCallbacks(execute=True):
+                for number in range(3):
+                    send_broadcast(self.order, 'new_order', f'Новый заказ {number}', 'Текст')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(get_unread_count(self.courier), 2)
+            self.assertIn('LIMIT 2', queries[-1]['sql'])
+            with self.captureOnCommitCallbacks(execute=True):
+                send_broadcast(self.order, 'new_order', 'Новый заказ', 'Текст')
+            self.assertEqual(get_unread_count(self.courier), 2)
+
+
+class FlakyChannelLayer:
+    """
+    Channel layer, который не доставляет сообщения в группы из failing.
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.sent = []
+
+    async def group_send(self, group, message):
+        if group in self.failing:
+            raise ConnectionError('channel layer is unavailable')
+        self.sent.append(group)
+
+
+class NotificationOutboxTestCase(TestCase):
+    """
+    Уведомления о заказах ставятся в очередь в транзакции перехода
+    и доставляются воркером с повторами.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.other_client = User.objects.create_user('other@example.com', 'Other', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.order = Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+        self.api = APIClient()
+        self.api.force_authenticate(self.courier)
+
+    def deliver(self, layer):
+        with mock.patch('notifications.utils.get_channel_layer', return_value=layer):
+            return deliver_pending()
+
+    def test_enqueued_with_transition(self):
+        url = f'/api/orders/courier/orders/{self.order.id}/'
+        self.assertEqual(self.api.patch(url + 'assign/').status_code, 200)
+        self.assertEqual(self.api.patch(url + 'update_status/', {'status': 'courier_on_the_way'}).status_code, 200)
+        # Неудачный переход откатывает и запись очереди
+        self.assertEqual(self.api.patch(url + 'update_status/', {'status': 'completed'}).status_code, 400)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+        layer = FlakyChannelLayer()
+        stats = self.deliver(layer)
+        self.assertEqual(
+            {name: stats[name] for name in ('entries', 'delivered', 'retried', 'failed', 'notifications')},
+            {'entries': 2, 'delivered': 2, 'retried': 0, 'failed': 0, 'notifications': 2},
+        )
+        self.assertEqual(
+            list(Notification.objects.order_by('id').values_list('recipient_id', 'type')),
+            [(self.client_user.id, 'courier_assigned'), (self.client_user.id, 'courier_on_the_way')],
+        )
+        self.assertEqual(layer.sent, [f'notifications_{self.client_user.id}'] * 2)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(deliver_pending()['entries'], 0)
+
+    @override_settings(NOTIFICATION_OUTBOX_MAX_ATTEMPTS=2, NOTIFICATION_OUTBOX_RETRY_DELAY=10)
+    def test_retry_with_backoff(self):
+        other_order = Order.objects.create(service=self.service, customer=self.other_client, street='Арбат')
+        failing = enqueue_order_notification(self.order, 'completed', 'Заказ', 'Текст')
+        enqueue_order_notification(other_order, 'completed', 'Заказ', 'Текст')
+        layer = FlakyChannelLayer(failing=[f'notifications_{self.client_user.id}'])
+
+        # Недоставленная запись откладывается, остальные доставляются
+        started = timezone.now()
+        with self.assertLogs('notifications.outbox', 'WARNING'):
+            stats = self.deliver(layer)
+        self.assertEqual((stats['delivered'], stats['retried'], stats['failed']), (1, 1, 0))
+        self.assertEqual(list(Notification.objects.values_list('recipient_id', flat=True)), [self.other_client.id])
+        failing.refresh_from_db()
+        self.assertEqual(failing.attempts, 1)
+        self.assertIn('channel layer is unavailable', failing.last_error)
+        self.assertGreaterEqual(failing.available_at, started + timedelta(seconds=10))
+        self.assertEqual(self.deliver(layer)['entries'], 0)
+
+        NotificationOutbox.objects.update(available_at=timezone.now())
+        with self.assertLogs('notifications.outbox', 'ERROR'):
+            stats = self.deliver(layer)
+        self.assertEqual((stats['delivered'], stats['retried'], stats['failed']), (0, 0, 1))
+        failing.refresh_from_db()
+        self.assertEqual(failing.attempts, 2)
+        self.assertIsNotNone(failing.failed_at)
+        self.assertEqual(self.deliver(FlakyChannelLayer())['entries'], 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failed_entry_does_not_resend_batch(self):
+        other_order = Order.objects.create(service=self.service, customer=self.other_client, street='Арбат')
+        enqueue_order_notification(other_order, 'completed', 'Заказ', 'Текст')
+        enqueue_order_notification(self.order, 'completed', 'Заказ', 'Текст')
+        layer = FlakyChannelLayer(failing=[f'notifications_{self.client_user.id}'])
+
+        with self.assertLogs('notifications.outbox', 'WARNING'):
+            stats = self.deliver(layer)
+        self.assertEqual((stats['delivered'], stats['retried']), (1, 1))
+        # Первая запись отправлена один раз, и ее уведомление сохранено
+        self.assertEqual(layer.sent, [f'notifications_{self.other_client.id}'])
+        self.assertEqual(list(Notification.objects.values_list('recipient_id', flat=True)), [self.other_client.id])
+
+    def test_command(self):
+        enqueue_order_notification(self.order, 'completed', 'Заказ', 'Текст')
+        output = StringIO()
+        call_command('deliver_notifications', batch_size=1, stdout=output)
+        self.assertIn('Delivered 1 entries (1 notifications)', output.getvalue())
+        self.assertTrue(Notification.objects.filter(recipient=self.client_user).exists())
+
+
+@postgresql_only
+class OutboxSkipLockedTestCase(TransactionTestCase):
+    """
+    Запись, которую обрабатывает другой воркер, не выбирается повторно.
+    """
+
+    def test_locked_entries_are_skipped(self):
+        client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        order = Order.objects.create(service=service, customer=client_user, street='Тверская')
+        locked = enqueue_order_notification(order, 'completed', 'Заказ', 'Первый')
+        enqueue_order_notification(order, 'completed', 'Заказ', 'Второй')
+
+        claimed, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    NotificationOutbox.objects.select_for_update().get(pk=locked.pk)
+                    claimed.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=hold_lock)
+        worker.start()
+        try:
+            self.assertTrue(claimed.wait(10))
+            stats = deliver_pending()
+        finally:
+            release.set()
+            worker.join()
+        self.assertEqual((stats['entries'], stats['delivered']), (1, 1))
+        self.assertEqual(list(Notification.objects.values_list('message', flat=True)), ['Второй'])
+        self.assertEqual(list(NotificationOutbox.objects.values_list('pk', flat=True)), [locked.pk])
+
+
+class PendingPoolStreamTestCase(TransactionTestCase):
+    """
+    Поток ws/orders/pool/: курьеры получают изменения пула после фиксации
+    транзакции, клиенты подключиться не могут.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.other = User.objects.create_user('other@example.com', 'Other', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+
+    def connect(self, user):
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/orders/pool/?token={AccessToken.for_user(user)}')
+
+    async def test_pool_events(self):
+        communicator = self.connect(self.courier)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        order = await sync_to_async(Order.objects.create)(service=self.service, customer=self.client_user, street='Тверская')
+        message = await communicator.receive_json_from()
+        self.assertEqual((message['event'], message['order_id']), ('added', order.id))
+        self.assertEqual(message['order']['street'], 'Тверская')
+        self.assertEqual(message['order']['service_details']['name'], 'Чистка')
+
+        await sync_to_async(transitions.assign)(order, self.other)
+        self.assertEqual(await communicator.receive_json_from(), {'event': 'taken', 'order_id': order.id})
+
+        # Смены статуса вне пула в поток не попадают
+        await sync_to_async(transitions.change_status)(order, self.other, 'courier_on_the_way')
+        self.assertTrue(await communicator.receive_nothing())
+
+        second = await sync_to_async(Order.objects.create)(service=self.service, customer=self.client_user, street='Арбат')
+        self.assertEqual((await communicator.receive_json_from())['event'], 'added')
+        second_id = second.id
+        await sync_to_async(second.delete)()
+        self.assertEqual(await communicator.receive_json_from(), {'event': 'cancelled', 'order_id': second_id})
+        await communicator.disconnect()
+
+    async def test_clients_are_rejected(self):
+        connected, _ = await self.connect(self.client_user).connect()
+        self.assertFalse(connected)
+
+    @override_settings(PUBLIC_BASE_URL='http://testserver')
+    async def test_order_matches_list(self):
+        communicator = self.connect(self.courier)
+        self.assertTrue((await communicator.connect())[0])
+        order = await sync_to_async(Order.objects.create)(
+            service=self.service, customer=self.client_user, street='Тверская', image='orders/shoes.jpg',
+        )
+        message = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        api = APIClient()
+        api.force_authenticate(self.courier)
+        response = await sync_to_async(api.get)('/api/orders/courier/orders/')
+        listed = next(item for item in response.json()['results'] if item['id'] == order.id)
+        self.assertEqual(message['order']['image'], 'http://testserver/media/orders/shoes.jpg')
+        self.assertEqual(message['order'], listed)
+
+    async def test_role_change_closes_pool(self):
+        communicator = self.connect(self.courier)
+        self.assertTrue((await communicator.connect())[0])
+
+        # Личные уведомления до соединения пула не доходят: в личной группе его нет
+        self.assertFalse(get_channel_layer().groups.get(f'notifications_{self.courier.id}'))
+        await sync_to_async(Order.objects.create)(service=self.service, customer=self.client_user, street='Тверская')
+        self.assertEqual((await communicator.receive_json_from())['event'], 'added')
+
+        self.courier.user_type = 'client'
+        await sync_to_async(self.courier.save)()
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+        await sync_to_async(Order.objects.create)(service=self.service, customer=self.client_user, street='Арбат')
+        self.assertTrue(await communicator.receive_nothing())
+
+
+class BroadcastStreamTestCase(TransactionTestCase):
+    """
+    Общее уведомление приходит всем подключенным курьерам одним сообщением в группу.
+    """
+
+    async def test_couriers_receive_broadcast(self):
+        client_user = await sync_to_async(User.objects.create_user)('client@example.com', 'Client', None)
+        couriers = [
+            await sync_to_async(User.objects.create_user)(f'courier{i}@example.com', 'Courier', None, user_type='courier')
+            for i in range(2)
+        ]
+        service = await sync_to_async(Service.objects.create)(name='Чистка', price=Decimal('500.00'))
+        order = await sync_to_async(Order.objects.create)(service=service, customer=client_user, street='Тверская')
+
+        communicators = [
+            WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/notifications/?token={AccessToken.for_user(user)}')
+            for user in (*couriers, client_user)
+        ]
+        for communicator in communicators:
+            self.assertTrue((await communicator.connect())[0])
+
+        broadcast = await sync_to_async(send_broadcast)(order, 'new_order', 'Новый заказ', 'Текст')
+        for communicator in communicators[:2]:
+            message = await communicator.receive_json_from()
+            self.assertEqual((message['id'], message['order_id']), (broadcast.id, order.id))
+        self.assertTrue(await communicators[2].receive_nothing())
+        for communicator in communicators:
+            await communicator.disconnect()
+
+
+class NotificationConsumerRoleTestCase(TransactionTestCase):
+    """
+    Соединение загружает роль один раз при подключении и обновляет ее
+    только по событию role_change.
+    """
+
+    def setUp(self):
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        client_user = User.objects.create_user('client@example.com', 'Client', None)
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.order = Order.objects.create(service=service, customer=client_user, street='Тверская')
+
+    def connect(self):
+        return WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/notifications/?token={AccessToken.for_user(self.courier)}',
+        )
+
+    async def test_role_is_not_loaded_per_message(self):
+        communicator = self.connect()
+        self.assertTrue((await communicator.connect())[0])
+        with mock.patch.object(Notification, 'get_allowed_types_for_user') as allowed_types:
+            for number in range(3):
+                await sync_to_async(send_broadcast)(self.order, 'new_order', f'Новый заказ {number}', 'Текст')
+                self.assertEqual((await communicator.receive_json_from())['title'], f'Новый заказ {number}')
+        allowed_types.assert_not_called()
+        await communicator.disconnect()
+
+    async def test_role_change(self):
+        communicator = self.connect()
+        self.assertTrue((await communicator.connect())[0])
+
+        self.courier.user_type = 'client'
+        await sync_to_async(self.courier.save)()
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'unread_count', 'unread_count': 0})
+        # Общие уведомления курьеров больше не приходят, клиентские - приходят
+        await sync_to_async(send_broadcast)(self.order, 'new_order', 'Новый заказ', 'Текст')
+        self.assertTrue(await communicator.receive_nothing())
+        await sync_to_async(send_notifications)([
+            Notification(recipient=self.courier, order=self.order, type='completed', title='Готово', message='Текст'),
+        ])
+        self.assertEqual((await communicator.receive_json_from())['type'], 'completed')
+        await communicator.disconnect()
+
+    def test_load_command(self):
+        output = StringIO()
+        call_command('loadtest_notification_stream', sockets=20, messages=3, stdout=output)
+        self.assertIn('Delivered 54 of 54 messages', output.getvalue())
+        self.assertIn('0 routed to clients', output.getvalue())
+        self.assertFalse(User.objects.filter(email__startswith='ws-load-').exists())
+
+
+class UnreadCountStreamTestCase(TransactionTestCase):
+    """
+    Число непрочитанных приходит по WebSocket с новыми уведомлениями и после прочтения.
+    """
+
+    async def test_unread_count_is_pushed(self):
+        user = await sync_to_async(User.objects.create_user)('client@example.com', 'Client', None)
+        service = await sync_to_async(Service.objects.create)(name='Чистка', price=Decimal('500.00'))
+        order = await sync_to_async(Order.objects.create)(service=service, customer=user, street='Тверская')
+        await sync_to_async(Notification.objects.create)(recipient=user, order=order, type='completed',
+                                                         title='Готово', message='Текст')
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/notifications/?token={AccessToken.for_user(user)}',
+        )
+        self.assertTrue((await communicator.connect())[0])
+
+        notifications = await sync_to_async(send_notifications)([
+            Notification(recipient=user, order=order, type='in_progress', title='В работе', message='Текст'),
+        ])
+        message = await communicator.receive_json_from()
+        self.assertEqual((message['id'], message['unread_count']), (notifications[0].id, 2))
+
+        api = APIClient()
+        api.force_authenticate(user)
+        await sync_to_async(api.post)(f'/api/notifications/{notifications[0].id}/mark_as_read/')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'unread_count', 'unread_count': 1})
+        await sync_to_async(api.post)('/api/notifications/mark_all_as_read/')
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'unread_count', 'unread_count': 0})
+        await communicator.disconnect()
@@ -1,13 +1,32 @@
+import asyncio
 import json
 import logging
-from asgiref.sync import async_to_sync
+from collections import Counter
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
 from django.contrib.auth import get_user_model
+from rest_framework.utils.encoders import JSONEncoder
+from shoe_service.cache import NOTIFICATIONS_SCOPE, bump_generation_on_commit, change_unread_counts_on_commit
 from .models import Notification
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+# Группа курьеров, подписанных на изменения пула ожидающих заказов
+PENDING_POOL_GROUP = 'pending_pool'
+
+# Служебные события пользователя (role_change) для всех его соединений
+USER_EVENTS_GROUP = 'user_events_{user_id}'
+
+# Сколько курьеров читается и получает уведомления о новом заказе за раз
+COURIER_CHUNK_SIZE = 1000
+
+
+class DeliveryError(Exception):
+    """
+    Часть уведомлений не отправлена через WebSocket.
+    """
+
 def get_status_message(status):
     """
     Возвращает понятное сообщение для каждого статуса заказа.
@@ -50,7 +69,8 @@ def send_order_notification(order, notification_type, title, message, recipient=
             recipients = [recipient]
         elif notification_type == 'new_order':
             # Для новых заказов отправляем всем активным курьерам
-            recipients = User.objects.filter(user_type='courier', is_active=True)
+            notify_couriers(order, notification_type, title, message)
+            return
         else:
             # Для обновлений отправляем клиенту и назначенному курьеру
             recipients = []
@@ -98,6 +118,155 @@ def send_order_notification(order, notification_type, title, message, recipient=
         logger.error(f"Error in send_order_notification: {str(e)}")
         raise
 
+def send_order_offers(offers):
+    """
+    Предлагает заказы конкретным курьерам (уведомления типа order_offer).
+
+    Args:
+        offers: Последовательность (order, courier, title, message).
+    """
+    return send_notifications([
+        Notification(recipient=courier, order=order, type='order_offer', title=title, message=message)
+        for order, courier, title, message in offers
+    ])
+
+
+def notify_couriers(order, notification_type, title, message, strict=False):
+    """
+    Рассылает уведомление о заказе всем активным курьерам.
+
+    Курьеры читаются пачками по COURIER_CHUNK_SIZE, уведомления каждой
+    пачки сохраняются одним INSERT. Отправка через WebSocket идет в одном
+    цикле событий и пересекается с записью следующей пачки.
+
+    Args:
+        strict: Если True, ошибка отправки через WebSocket поднимает
+            DeliveryError, иначе только пишется в лог.
+
+    Returns:
+        int: Число созданных уведомлений.
+    """
+    return async_to_sync(_notify_couriers)(get_channel_layer(), order, notification_type, title, message, strict)
+
+
+async def _notify_couriers(channel_layer, order, notification_type, title, message, strict):
+    # thread_sensitive: запросы идут в потоке вызывающего кода и в его транзакции
+    save_chunk = sync_to_async(_save_courier_chunk)
+    sends, created, after = [], 0, 0
+    while notifications := await save_chunk(order, notification_type, title, message, after):
+        sends.append(asyncio.ensure_future(_fan_out(channel_layer, notifications, strict)))
+        created += len(notifications)
+        after = notifications[-1].recipient_id
+    # Дожидаемся всех отправок, даже если одна из пачек не ушла
+    for result in await asyncio.gather(*sends, return_exceptions=True):
+        if isinstance(result, Exception):
+            raise result
+    return created
+
+
+def _save_courier_chunk(order, notification_type, title, message, after):
+    """
+    Уведомления для следующей пачки активных курьеров с id больше after.
+    """
+    courier_ids = (
+        User.objects.filter(user_type='courier', is_active=True, id__gt=after)
+        .order_by('id').values_list('id', flat=True)[:COURIER_CHUNK_SIZE]
+    )
+    return _save_bulk([
+        Notification(recipient_id=courier_id, order=order, type=notification_type, title=title, message=message)
+        for courier_id in courier_ids
+    ])
+
+
+def _save_bulk(notifications):
+    if not notifications:
+        return []
+
+    notifications = Notification.objects.bulk_create(notifications)
+    # bulk_create не вызывает сигналов модели, поэтому версии списков меняем явно
+    bump_generation_on_commit(*{
+        NOTIFICATIONS_SCOPE.format(user_id=notification.recipient_id) for notification in notifications
+    })
+    change_unread_counts_on_commit(Counter(
+        notification.recipient_id for notification in notifications if not notification.is_read
+    ))
+    return notifications
+
+
+def send_notifications(notifications, strict=False):
+    """
+    Сохраняет несохраненные уведомления одним INSERT и отправляет их через
+    WebSocket. При strict ошибка отправки поднимает DeliveryError.
+    """
+    notifications = _save_bulk(notifications)
+    if notifications:
+        async_to_sync(_fan_out)(get_channel_layer(), notifications, strict)
+    return notifications
+
+
+def notification_event(notification):
+    """
+    Сообщение channel layer с уведомлением о заказе (личным или общим).
+    """
+    return {
+        'type': 'notification_message',
+        'message': {
+            'id': notification.id,
+            'type': notification.type,
+            'title': notification.title,
+            'message': notification.message,
+            'order_id': notification.order.id,
+            'order_status': notification.order.status,
+            'created_at': notification.created_at.isoformat(),
+        }
+    }
+
+
+async def _fan_out(channel_layer, notifications, strict=False):
+    results = await asyncio.gather(
+        *(
+            channel_layer.group_send(f'notifications_{notification.recipient_id}', notification_event(notification))
+            for notification in notifications
+        ),
+        return_exceptions=True,
+    )
+    failed = [(notification, result) for notification, result in zip(notifications, results) if isinstance(result, Exception)]
+    if failed and strict:
+        raise DeliveryError(f'{len(failed)} of {len(notifications)} WebSocket sends failed: {failed[0][1]}')
+    for notification, error in failed:
+        # Уведомление сохранено в БД, пользователь увидит его при следующем запросе
+        logger.error(f"Failed to send WebSocket notification to user {notification.recipient_id}: {error}")
+
+def send_pool_change(message):
+    """
+    Рассылает изменение пула ожидающих заказов курьерам, подписанным
+    на ws/orders/pool/. Сообщение кодируется в JSON один раз на всех,
+    тем же кодировщиком, что и ответы API, чтобы заказ в нем совпадал
+    с заказом в списке.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            PENDING_POOL_GROUP,
+            {'type': 'pool_change', 'text': json.dumps(message, cls=JSONEncoder, ensure_ascii=False)},
+        )
+    except Exception as e:
+        # Курьер увидит изменение при следующей синхронизации пула
+        logger.error(f"Failed to send pending pool change {message.get('event')} for order {message.get('order_id')}: {e}")
+
+def send_role_change(user):
+    """
+    Сообщает открытым соединениям пользователя (уведомлений и пула) о смене
+    роли: они обновляют разрешенные типы уведомлений и группы роли без
+    запроса к базе.
+    """
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            USER_EVENTS_GROUP.format(user_id=user.id), {'type': 'role_change', 'user_type': user.user_type},
+        )
+    except Exception as e:
+        # Соединение получит новую роль при переподключении
+        logger.error(f"Failed to send role change to user {user.id}: {e}")
+
 def send_status_update_notification(order):
     """
     Отправляет уведомление об изменении статуса заказа.
@@ -1,13 +1,35 @@
+from django.http import Http404
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from .broadcasts import BROADCAST_GROUPS, mark_all_broadcasts_read, mark_broadcast_read, visible_broadcasts
+from .counters import get_unread_count, send_unread_count_on_commit
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import NotificationSerializer, notification_rows, serialize_notification_rows
+from shoe_service.cache import (
+    BROADCAST_SCOPE, NOTIFICATIONS_SCOPE, bump_generation_on_commit, change_unread_counts_on_commit, get_generation,
+)
+from shoe_service.conditional import conditional_get, generation_timestamp
+from shoe_service.pagination import KeysetPagination
+
+
+def notifications_version(view, request, *args, **kwargs):
+    """
+    Версия ленты: поколение уведомлений пользователя и, если у его роли
+    есть общие уведомления, их поколение.
+    """
+    generations = (get_generation(NOTIFICATIONS_SCOPE.format(user_id=request.user.id)),)
+    if request.user.user_type in BROADCAST_GROUPS:
+        generations += (get_generation(BROADCAST_SCOPE.format(audience=request.user.user_type)),)
+    return generations, generation_timestamp(max(generations))
+
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """
@@ -15,17 +37,62 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         """
         user = self.request.user
         allowed_types = Notification.get_allowed_types_for_user(user)
-        return Notification.objects.filter(
+        queryset = Notification.objects.filter(
             recipient=user,
             type__in=allowed_types
         )
+        return NotificationSerializer.setup_queryset(queryset)
+
+    def get_broadcast_queryset(self):
+        """
+        Общие уведомления роли, которые дополняют личные (см. notifications/broadcasts.py), или None.
+        """
+        return visible_broadcasts(self.request.user)
+
+    def get_broadcast_row(self):
+        """
+        Общее уведомление из URL в виде строки values() для запросов к одному уведомлению.
+        """
+        broadcasts = self.get_broadcast_queryset()
+        try:
+            row = notification_rows(broadcasts.filter(pk=self.kwargs['pk'])).first() if broadcasts is not None else None
+        except ValueError:
+            row = None
+        if row is None:
+            raise Http404
+        return row
+
+    @conditional_get(notifications_version)
+    def list(self, request, *args, **kwargs):
+        broadcasts = self.get_broadcast_queryset()
+        if broadcasts is None:
+            page = self.paginate_queryset(notification_rows(self.get_queryset()))
+        else:
+            # Общие уведомления могут быть на любой странице, поэтому читаются всегда
+            page = self.paginator.paginate_querysets(
+                [notification_rows(self.get_queryset()), notification_rows(broadcasts)],
+                request, self, horizon=timezone.now(),
+            )
+        return self.get_paginated_response(serialize_notification_rows(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            return Response(serialize_notification_rows([self.get_broadcast_row()])[0])
 
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """
         Отмечает все уведомления пользователя как прочитанные.
         """
-        self.get_queryset().update(is_read=True)
+        updated = self.get_queryset().filter(is_read=False).update(is_read=True)
+        # UPDATE не вызывает сигналов модели, поэтому версию и счетчик меняем явно
+        bump_generation_on_commit(NOTIFICATIONS_SCOPE.format(user_id=request.user.id))
+        change_unread_counts_on_commit({request.user.id: -updated})
+        if request.user.user_type in BROADCAST_GROUPS:
+            mark_all_broadcasts_read(request.user)
+        send_unread_count_on_commit(request.user)
         return Response(status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
@@ -33,16 +100,36 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Отмечает конкретное уведомление как прочитанное.
         """
-        notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        try:
+            notification = self.get_object()
+        except Http404:
+            row = self.get_broadcast_row()
+            mark_broadcast_read(request.user, row['id'], row['created_at'])
+            send_unread_count_on_commit(request.user)
+            return Response(status=status.HTTP_200_OK)
+        # Условный UPDATE: повторное или параллельное прочтение не уменьшит счетчик дважды
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            bump_generation_on_commit(NOTIFICATIONS_SCOPE.format(user_id=request.user.id))
+            change_unread_counts_on_commit({request.user.id: -1})
+            send_unread_count_on_commit(request.user)
         return Response(status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
+    @conditional_get(notifications_version)
     def unread(self, request):
         """
         Возвращает непрочитанные уведомления пользователя.
         """
-        queryset = self.get_queryset().filter(is_read=False)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        rows = list(notification_rows(self.get_queryset().filter(is_read=False)))
+        broadcasts = self.get_broadcast_queryset()
+        if broadcasts is not None:
+            rows += notification_rows(broadcasts.filter(is_read=False))
+            rows.sort(key=lambda row: (row['created_at'], row['id']), reverse=True)
+        return Response(serialize_notification_rows(rows))
+
+    @action(detail=False, methods=['get'], url_path='unread-count')
+    def unread_count(self, request):
+        """
+        Возвращает число непрочитанных уведомлений из счетчика (notifications/counters.py).
+        """
+        return Response({'unread_count': get_unread_count(request.user)})
@@ -0,0 +1,181 @@
+import re
+from functools import lru_cache
+
+
+# Обозначения типа улицы. Отбрасываются только как отдельные слова
+# (с точкой или без), поэтому "Пречистенка" и "Краснопролетарская" не страдают.
+STREET_TYPES = (
+    'ул', 'улица',
+    'пр', 'пр-т', 'пр-кт', 'просп', 'проспект',
+    'пл', 'площадь',
+    'бул', 'б-р', 'бульв', 'бульвар',
+    'пер', 'переулок',
+    'ш', 'шоссе',
+    'наб', 'набережная',
+    'пр-д', 'проезд',
+    'туп', 'тупик',
+    'аллея',
+    'мкр', 'микрорайон',
+)
+
+# Обозначения города перед его названием
+CITY_PREFIXES = ('г', 'гор', 'город')
+
+# Длина столбца Order.street_search. Очистка добавляет пробел после каждой
+# запятой, поэтому текст для поиска бывает длиннее исходного адреса и обрезается
+STREET_SEARCH_MAX_LENGTH = 255
+
+# Адресов в одном тексте пачки: на текстах в десятки мегабайт проходы
+# выражений медленнее из-за промахов кэша процессора
+CLEAN_CHUNK_SIZE = 5000
+
+# Пробельные символы кроме пробела и перевода строки (им разделяются адреса
+# пачки). Перечислены явно: класс с отрицанием [^\S\n ] проверяется медленнее
+_OTHER_SPACES = re.compile('[\t\x0b\x0c\r\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]')
+# Точки и точки с запятой после пробела остаются от удаленных сокращений
+_STRAY_MARKS = re.compile(r' [ .;]+')
+# Знаки после запятой и в начале адреса. Выражения начинаются с литерала,
+# поэтому движок быстро пропускает остальные позиции длинного текста пачки;
+# знаки перед запятой и в конце адреса убираются теми же выражениями
+# в перевернутом тексте
+_AFTER_COMMA = re.compile(r',[ .;,]+')
+_AFTER_NEWLINE = re.compile(r'\n[ .;,]+')
+
+# Граница слова слева, проверяется после первой буквы. Дефис считается
+# частью слова ("Садовая-Кудринская")
+_WORD_START = r'(?<![\w-].)'
+
+
+def _variants(word):
+    # Как записано, в нижнем регистре, с заглавной буквы и заглавными
+    return {word, word.lower(), word.capitalize(), word.upper()}
+
+
+def _trie_pattern(words):
+    """
+    Выражение для набора слов в виде префиксного дерева: ветки начинаются
+    с разных литералов, и на каждой позиции проверяется не больше одной
+    ветки на букву.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        # Группы жадные, поэтому "пр-т" не разбирается как "пр"
+        return f'(?:{"|".join(branches)}){"?" if "" in node else ""}'
+
+    return '|'.join(
+        re.escape(char) + _WORD_START + build(child) for char, child in sorted(trie.items())
+    )
+
+
+class StreetNormalizer:
+    """
+    Очистка названий улиц одного города: убирает город, обозначения типа
+    улицы и лишние знаки. Выражения компилируются один раз на город.
+
+    Пачка адресов склеивается через перевод строки и обрабатывается
+    несколькими проходами регулярных выражений по всему тексту, без
+    цикла по адресам в Python: это в 2-3 раза быстрее, чем те же правила
+    для каждого адреса отдельно. Основной выигрыш на реальных данных дает
+    то, что повторяющиеся улицы обрабатываются один раз.
+    """
+
+    def __init__(self, city):
+        words = {variant for street_type in STREET_TYPES for variant in _variants(street_type)}
+        if city:
+            cities = _variants(city)
+            prefixes = {variant for prefix in CITY_PREFIXES for variant in _variants(prefix)}
+            words |= cities
+            words |= {
+                f'{prefix}{separator}{name}'
+                for prefix in prefixes for separator in (' ', '.', '. ') for name in cities
+            }
+        self._tokens = re.compile(rf'(?:{_trie_pattern(words)})(?![\w-])')
+
+    def _clean_text(self, streets):
+        text = '\n'.join(streets)
+        if text.count('\n') != len(streets) - 1:
+            text = '\n'.join(street.replace('\n', ' ') for street in streets)
+        text = _OTHER_SPACES.sub(' ', f'\n{text}\n')
+        text = self._tokens.sub(' ', text)
+        text = _STRAY_MARKS.sub(' ', text)
+        for _ in range(2):
+            text = _AFTER_COMMA.sub(',', text)
+            text = _AFTER_NEWLINE.sub('\n', text)[::-1]
+        return text[1:-1].replace(',', ', ')
+
+    def _many(self, streets, search=False):
+        if not streets:
+            return []
+        unique = list(dict.fromkeys(streets))
+        cleaned = []
+        for start in range(0, len(unique), CLEAN_CHUNK_SIZE):
+            text = self._clean_text(unique[start:start + CLEAN_CHUNK_SIZE])
+            if search:
+                text = text.lower().replace('ё', 'е')
+            cleaned.extend(text.split('\n'))
+        if len(unique) == len(streets):
+            return cleaned
+        cleaned = dict(zip(unique, cleaned))
+        return [cleaned[street] for street in streets]
+
+    def clean(self, street):
+        return self._clean_text([street])
+
+    def clean_many(self, streets):
+        return self._many(streets)
+
+    def search_many(self, streets):
+        """
+        Очищенные адреса в виде для поиска (см. search_text).
+        """
+        return self._many(streets, search=True)
+
+
+@lru_cache(maxsize=64)
+def get_street_normalizer(city):
+    return StreetNormalizer(city)
+
+
+def clean_street_name(street: str, city: str) -> str:
+    """
+    Удаляет название города, обозначения типа улицы и лишние символы из названия улицы.
+    """
+    return get_street_normalizer(city).clean(street)
+
+
+def clean_street_names(streets, city):
+    """
+    То же для списка улиц одного города.
+    """
+    return get_street_normalizer(city).clean_many(streets)
+
+
+def search_text(value: str) -> str:
+    """
+    Приводит строку к виду для поиска: нижний регистр, "ё" как "е",
+    одиночные пробелы.
+    """
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+def street_search_text(street: str, city: str) -> str:
+    """
+    Нормализованный адрес для поиска. Тем же преобразованием
+    обрабатывается и поисковый запрос.
+    """
+    return search_text(clean_street_name(street, city))[:STREET_SEARCH_MAX_LENGTH]
+
+
+def street_search_texts(streets, city):
+    return [text[:STREET_SEARCH_MAX_LENGTH] for text in get_street_normalizer(city).search_many(streets)]
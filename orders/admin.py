@@ -1,4 +1,31 @@
 from django.contrib import admin
-from .models import Order
+from .models import ArchivedOrder, Order, OrderStatusEvent
 
-admin.site.register(Order)
+
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    fields = ('created_at', 'previous_status', 'status', 'courier', 'dwell')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    inlines = [OrderStatusEventInline]
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'customer', 'courier', 'status', 'created_at', 'archived_at')
+    list_filter = ('status',)
+
+    # Архив только для чтения: записи переносит команда archive_orders
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
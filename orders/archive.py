@@ -0,0 +1,119 @@
+"""
+Перенос старых заказов в архив (ArchivedOrder).
+
+Оперативная таблица Order обслуживает пул ожидающих заказов и текущие
+списки курьеров, поэтому завершенные, отмененные и возвращенные заказы
+старше ORDER_ARCHIVE_AFTER_DAYS переносятся в архив пачками. Каждая пачка
+переносится в своей транзакции, а выбор пачки зависит только от состояния
+таблиц, поэтому прерванный перенос продолжается повторным запуском.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from notifications.models import BroadcastNotification, Notification, NotificationOutbox
+from shoe_service.cache import BROADCAST_SCOPE, NOTIFICATIONS_SCOPE, bump_generation_on_commit
+from .models import ArchivedOrder, Order
+
+
+# Статусы, после которых заказ больше не меняется
+ARCHIVE_STATUSES = ('completed', 'cancelled', 'return')
+# Ключ кэша с датой создания самого нового заказа в архиве
+ARCHIVE_HORIZON_KEY = 'orders:archive-horizon'
+
+
+def archive_cutoff(now=None):
+    """
+    Заказы, последний раз сменившие статус раньше этого момента, переносятся в архив.
+    """
+    return (now or timezone.now()) - timedelta(days=settings.ORDER_ARCHIVE_AFTER_DAYS)
+
+
+def archive_horizon():
+    """
+    Дата создания самого нового заказа в архиве или None, если архив пуст.
+    Все архивные заказы созданы не позже этой даты, поэтому страницы
+    с более новыми заказами читаются только из оперативной таблицы.
+    """
+    cached = cache.get(ARCHIVE_HORIZON_KEY)
+    if cached is None:
+        cached = (ArchivedOrder.objects.aggregate(horizon=Max('created_at'))['horizon'],)
+        cache.set(ARCHIVE_HORIZON_KEY, cached, timeout=None)
+    return cached[0]
+
+
+def _archived_columns():
+    # Столбцы архива, которые копируются из заказа как есть
+    return [
+        field.column for field in ArchivedOrder._meta.concrete_fields
+        if field.name != 'archived_at'
+    ]
+
+
+def archive_batch(cutoff, batch_size=1000):
+    """
+    Переносит в архив одну пачку заказов и возвращает количество перенесенных.
+    Заказы копируются и удаляются одним INSERT ... SELECT и одним DELETE;
+    журнал статусов остается на месте, личные и общие уведомления
+    отвязываются от заказа, а недоставленные записи outbox (в том числе
+    с исчерпанными попытками) удаляются: заказ уже завершен. Сырой DELETE не выполняет CASCADE из Django,
+    поэтому все ссылки на заказы пачки убираются до него.
+    """
+    with transaction.atomic():
+        ids = list(
+            Order.objects
+            .filter(status__in=ARCHIVE_STATUSES, status_changed_at__lt=cutoff)
+            .order_by('id')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(column) for column in _archived_columns())
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {qn(ArchivedOrder._meta.db_table)} ({columns}, {qn("archived_at")}) '
+                f'SELECT {columns}, %s FROM {qn(Order._meta.db_table)} WHERE {qn("id")} IN ({placeholders})',
+                [timezone.now(), *ids],
+            )
+
+        notifications = Notification.objects.filter(order_id__in=ids)
+        recipients = set(notifications.values_list('recipient_id', flat=True).distinct())
+        notifications.update(order=None)
+        broadcasts = BroadcastNotification.objects.filter(order_id__in=ids)
+        audiences = set(broadcasts.values_list('audience', flat=True).distinct())
+        broadcasts.update(order=None)
+        NotificationOutbox.objects.filter(order_id__in=ids).delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {qn(Order._meta.db_table)} WHERE {qn("id")} IN ({placeholders})',
+                ids,
+            )
+
+        bump_generation_on_commit(
+            *(NOTIFICATIONS_SCOPE.format(user_id=user_id) for user_id in recipients),
+            *(BROADCAST_SCOPE.format(audience=audience) for audience in audiences),
+        )
+        transaction.on_commit(lambda: cache.delete(ARCHIVE_HORIZON_KEY))
+    return len(ids)
+
+
+def archive_orders(cutoff=None, batch_size=1000):
+    """
+    Переносит в архив все подходящие заказы пачками по batch_size.
+    Возвращает итератор по количеству заказов в каждой перенесенной пачке.
+    """
+    cutoff = cutoff or archive_cutoff()
+    while True:
+        moved = archive_batch(cutoff, batch_size)
+        if not moved:
+            return
+        yield moved
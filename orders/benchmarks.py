@@ -0,0 +1,241 @@
+"""
+Замеры эндпоинтов API с базовой линией (команда benchmark_endpoints).
+
+Запросы идут через APIClient по настоящим маршрутам shoe_service/urls.py
+к базе с синтетическими данными (orders/synthetic.py), которые создаются
+в транзакции и откатываются после замера. Для каждого эндпоинта считаются
+p50/p95/p99 времени ответа и наибольшее число SQL-запросов. Перед каждым
+запросом кэш очищается: замеряется путь до базы, а не попадание в кэш.
+
+Результаты сравниваются с базовой линией из BASELINE_PATH, записанной
+на том же наборе данных. Регрессия - рост p50 или p95 больше допуска
+или любое увеличение числа запросов.
+"""
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from notifications.models import BroadcastNotification, Notification
+from notifications.outbox import deliver_pending
+from .models import Order
+from .synthetic import DatasetGenerator
+from . import transitions
+
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+
+# Допуск роста времени ответа относительно базовой линии
+LATENCY_TOLERANCE = 0.25
+# Рост меньше этого не считается регрессией: у быстрых эндпоинтов это шум
+# (p95 из 50 замеров сдвигает один медленный запрос)
+LATENCY_SLACK_MS = 5.0
+
+# Набор данных по умолчанию (параметры DatasetGenerator)
+DEFAULT_DATASET = {'seed': 1, 'users': 2000, 'orders': 20_000, 'days': 90}
+
+FEED_PARAMS = '?latitude=55.75&longitude=37.62&distance=5'
+
+# Числа курьеров для замера создания заказа (рассылка new_order всем курьерам)
+FAN_OUT_COURIERS = (0, 100, 500, 2000)
+
+# Замеряемые эндпоинты: (название, роль, метод, функция context -> (URL, данные))
+ENDPOINTS = (
+    ('client orders', 'client', 'get', lambda context: ('/api/orders/client/orders/', None)),
+    ('client order', 'client', 'get', lambda context: (f"/api/orders/client/orders/{context['client_order']}/", None)),
+    ('courier feed', 'courier', 'get', lambda context: (f'/api/orders/courier/orders/{FEED_PARAMS}', None)),
+    ('assigned orders', 'courier', 'get', lambda context: ('/api/orders/courier/orders/assigned_orders/', None)),
+    ('assign', 'courier', 'patch', lambda context: (
+        f"/api/orders/courier/orders/{context['pending'].pop()}/assign/", None,
+    )),
+    ('update status', 'courier', 'patch', lambda context: (
+        f"/api/orders/courier/orders/{context['assigned'].pop()}/update_status/", {'status': 'courier_on_the_way'},
+    )),
+    ('notifications', 'client', 'get', lambda context: ('/api/notifications/', None)),
+    ('unread notifications', 'client', 'get', lambda context: ('/api/notifications/unread/', None)),
+    ('service catalog', 'client', 'get', lambda context: ('/api/services/services/', None)),
+    ('token obtain', None, 'post', lambda context: ('/authentication/api/token/', {
+        'email': context['client'].email, 'password': context['password'],
+    })),
+)
+
+
+def percentile(cuts, value):
+    return round(cuts[value - 1], 2)
+
+
+def summarize(times_ms, queries):
+    cuts = statistics.quantiles(times_ms, n=100, method='inclusive')
+    return {
+        'p50_ms': percentile(cuts, 50),
+        'p95_ms': percentile(cuts, 95),
+        'p99_ms': percentile(cuts, 99),
+        'queries': max(queries),
+    }
+
+
+def seed(dataset, requests):
+    """
+    Создает набор данных и возвращает контекст замеров: пользователей,
+    заказ клиента и по requests заказов для назначения и смены статуса.
+    """
+    generator = DatasetGenerator(prefix='benchmark', **dataset)
+    generator.generate()
+    client = User.objects.get(pk=generator.clients[0])
+    courier = User.objects.get(pk=generator.couriers[0])
+    service_id = generator.catalog[0][0]
+
+    pending = [
+        Order.objects.create(
+            service_id=service_id, customer=client, street='ул. Тверская', latitude='55.7558', longitude='37.6173',
+        )
+        for _ in range(2 * requests)
+    ]
+    for order in pending[requests:]:
+        transitions.assign(order, courier)
+    return {
+        'client': client,
+        'courier': courier,
+        'password': generator.password,
+        'client_order': Order.objects.filter(customer=client).latest('id').id,
+        'pending': [order.id for order in pending[:requests]],
+        'assigned': [order.id for order in pending[requests:]],
+    }
+
+
+def measure(api, method, prepare, context, warmup, repeat, format='json'):
+    """
+    Время ответа (мс) и число запросов к базе для repeat вызовов
+    после warmup прогревочных. Данные передаются в формате format.
+    """
+    times_ms, queries = [], []
+    for number in range(warmup + repeat):
+        url, data = prepare(context)
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = getattr(api, method)(url, data, format=format) if data else getattr(api, method)(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method.upper()} {url}: {response.status_code} {response.content[:200]!r}')
+        if number >= warmup:
+            times_ms.append(elapsed * 1000)
+            queries.append(len(captured))
+    return summarize(times_ms, queries)
+
+
+def run_benchmarks(dataset=None, warmup=5, repeat=50, only=None):
+    """
+    Замеряет эндпоинты ENDPOINTS (или только названные в only)
+    и возвращает {название: {p50_ms, p95_ms, p99_ms, queries}}.
+    """
+    dataset = {**DEFAULT_DATASET, **(dataset or {})}
+    results = {}
+    with transaction.atomic():
+        context = seed(dataset, warmup + repeat)
+        for name, role, method, prepare in ENDPOINTS:
+            if only and name not in only:
+                continue
+            api = APIClient(SERVER_NAME='localhost')
+            if role:
+                api.force_authenticate(context[role])
+            results[name] = measure(api, method, prepare, context, warmup, repeat)
+        transaction.set_rollback(True)
+    return results
+
+
+def notification_storage():
+    """
+    Число строк и размер на диске (байт) таблиц уведомлений.
+    """
+    tables = [Notification._meta.db_table, BroadcastNotification._meta.db_table]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT sum(pg_total_relation_size(name::regclass)) FROM unnest(%s) AS name', [tables])
+        size = cursor.fetchone()[0]
+    return Notification.objects.count() + BroadcastNotification.objects.count(), int(size)
+
+
+def order_creation_latency(courier_counts=FAN_OUT_COURIERS, warmup=2, repeat=20, broadcast=True):
+    """
+    Замеряет создание заказа клиентом (POST /api/orders/client/orders/)
+    при разном числе активных курьеров: каждый получает уведомление
+    new_order. Запрос только ставит уведомление в очередь, рассылку
+    выполняет воркер; delivery_ms - время его доставки на один заказ,
+    rows и bytes - прирост строк и размера таблиц уведомлений на заказ.
+    broadcast=False - копия уведомления каждому курьеру вместо общего.
+    Возвращает {число курьеров: {p50_ms, p95_ms, p99_ms, queries, delivery_ms, rows, bytes}}.
+    """
+    results = {}
+    with transaction.atomic(), override_settings(NOTIFICATION_NEW_ORDER_BROADCAST=broadcast):
+        generator = DatasetGenerator(prefix='fan-out', users=1, courier_ratio=0, services=1, orders=0)
+        generator.generate()
+        api = APIClient(SERVER_NAME='localhost')
+        api.force_authenticate(User.objects.get(pk=generator.clients[0]))
+        data = {
+            'service': generator.catalog[0][0], 'city': 'Москва', 'street': 'ул. Тверская', 'building_num': '1',
+            'latitude': '55.7558', 'longitude': '37.6173',
+        }
+        couriers = 0
+        for count in sorted(courier_counts):
+            User.objects.bulk_create([
+                User(email=f'fan-out-courier-{number}@example.com', first_name='Курьер', user_type='courier')
+                for number in range(couriers, count)
+            ])
+            couriers = max(couriers, count)
+            results[count] = measure(
+                api, 'post', lambda context: ('/api/orders/client/orders/', data), {}, warmup, repeat,
+                format='multipart',
+            )
+            rows, size = notification_storage()
+            started = time.perf_counter()
+            while deliver_pending()['entries']:
+                pass
+            elapsed = time.perf_counter() - started
+            new_rows, new_size = notification_storage()
+            orders = warmup + repeat
+            results[count].update(
+                delivery_ms=round(elapsed * 1000 / orders, 2),
+                rows=round((new_rows - rows) / orders, 1),
+                bytes=round((new_size - size) / orders),
+            )
+        transaction.set_rollback(True)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def save_baseline(results, dataset, path=BASELINE_PATH):
+    baseline = {'dataset': {**DEFAULT_DATASET, **dataset}, 'endpoints': results}
+    Path(path).write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + '\n', encoding='utf-8')
+
+
+def find_regressions(results, baseline, tolerance=LATENCY_TOLERANCE):
+    """
+    Описания регрессий results относительно базовой линии (пустой
+    список, если их нет). Эндпоинты без базовой линии не проверяются.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline['endpoints'].get(name)
+        if base is None:
+            continue
+        if current['queries'] > base['queries']:
+            regressions.append(f"{name}: {current['queries']} queries, baseline {base['queries']}")
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = max(base[metric] * (1 + tolerance), base[metric] + LATENCY_SLACK_MS)
+            if current[metric] > limit:
+                regressions.append(
+                    f'{name}: {metric} {current[metric]:.2f}, baseline {base[metric]:.2f} (limit {limit:.2f})'
+                )
+    return regressions
@@ -0,0 +1,171 @@
+"""
+Распределение ожидающих заказов между свободными курьерами.
+
+Вместо гонки курьеров за заказами из пула распределитель одним проходом
+подбирает пары курьер-заказ для всего пула и отправляет курьерам
+предложения (уведомления order_offer). Курьер принимает предложение
+обычным назначением (assign), поэтому одновременные назначения по-прежнему
+разрешает условный переход статуса (orders/transitions.py).
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.utils import timezone
+
+from authentication.models import User
+from notifications.models import Notification
+from notifications.utils import send_order_offers
+from .geo import EARTH_RADIUS_KM
+from .models import CourierLocation, Order
+from .transitions import STATUS_FLOW
+
+
+def candidate_pairs(orders, couriers, max_distance_km):
+    """
+    Пары курьер-заказ ближе max_distance_km.
+
+    Заказы раскладываются по сетке с шагом не меньше max_distance_km, и для
+    курьера проверяются только 9 соседних ячеек, поэтому работа растет
+    с плотностью точек, а не с произведением числа курьеров и заказов.
+
+    orders, couriers: последовательности (id, latitude, longitude).
+    Возвращает список (haversine, courier_id, order_id), где haversine -
+    монотонная функция расстояния (см. haversine_to_km).
+    """
+    if not orders or not couriers:
+        return []
+
+    lat_step = math.degrees(max_distance_km / EARTH_RADIUS_KM)
+    # Шаг по долготе считается для точки, самой далекой от экватора:
+    # там градус долготы короче всего, и ячейка все равно не меньше радиуса
+    max_lat = max(abs(float(latitude)) for _, latitude, _ in chain(orders, couriers))
+    lon_step = lat_step / math.cos(math.radians(min(max_lat + lat_step, 89.0)))
+
+    grid = defaultdict(list)
+    for order_id, latitude, longitude in orders:
+        latitude, longitude = float(latitude), float(longitude)
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        grid[int(latitude // lat_step), int(longitude // lon_step)].append((order_id, lat, lon, math.cos(lat)))
+
+    # Сравниваем подкоренное выражение формулы гаверсинусов, без asin на каждую пару
+    limit = math.sin(max_distance_km / (2 * EARTH_RADIUS_KM)) ** 2
+    sin = math.sin
+    pairs = []
+    for courier_id, latitude, longitude in couriers:
+        latitude, longitude = float(latitude), float(longitude)
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        cos_lat = math.cos(lat)
+        row, column = int(latitude // lat_step), int(longitude // lon_step)
+        for cell_row in (row - 1, row, row + 1):
+            for cell_column in (column - 1, column, column + 1):
+                for order_id, order_lat, order_lon, order_cos in grid.get((cell_row, cell_column), ()):
+                    haversine = (
+                        sin((order_lat - lat) / 2) ** 2
+                        + cos_lat * order_cos * sin((order_lon - lon) / 2) ** 2
+                    )
+                    if haversine <= limit:
+                        pairs.append((haversine, courier_id, order_id))
+    return pairs
+
+
+def haversine_to_km(haversine):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(haversine)))
+
+
+def plan_assignments(orders, couriers, max_distance_km, first_radius_km=None):
+    """
+    Жадное глобальное сопоставление: пары курьер-заказ перебираются
+    по возрастанию расстояния, и пара берется, если курьер и заказ еще
+    свободны. Каждый курьер получает не больше одного заказа.
+
+    Пары ищутся полосами: сначала в малом радиусе, затем радиус удваивается
+    только для оставшихся курьеров и заказов. Результат тот же, что при
+    одной сортировке всех пар: после полосы среди свободных курьеров и
+    заказов не остается пар ближе ее радиуса. Зато большинство курьеров
+    находит заказ в первой полосе, где кандидатов мало.
+
+    Возвращает список (courier_id, order_id, distance_km) по возрастанию расстояния.
+    """
+    radius = min(first_radius_km or max_distance_km / 8, max_distance_km)
+    plan = []
+    while orders and couriers:
+        pairs = candidate_pairs(orders, couriers, radius)
+        pairs.sort()
+
+        busy_couriers = set()
+        taken_orders = set()
+        limit = min(len(orders), len(couriers))
+        for haversine, courier_id, order_id in pairs:
+            if courier_id in busy_couriers or order_id in taken_orders:
+                continue
+            busy_couriers.add(courier_id)
+            taken_orders.add(order_id)
+            plan.append((courier_id, order_id, haversine_to_km(haversine)))
+            if len(busy_couriers) == limit:
+                break
+
+        if radius >= max_distance_km:
+            break
+        radius = min(radius * 2, max_distance_km)
+        orders = [order for order in orders if order[0] not in taken_orders]
+        couriers = [courier for courier in couriers if courier[0] not in busy_couriers]
+    return plan
+
+
+def dispatch_pending_orders(now=None):
+    """
+    Один проход распределителя: ожидающие заказы с координатами делятся
+    между свободными курьерами со свежим местоположением, и курьерам
+    отправляются предложения. Пока предложение не истекло (DISPATCH_OFFER_TTL),
+    ни заказ, ни курьер в распределении не участвуют.
+
+    Возвращает список предложенных пар (courier_id, order_id, distance_km).
+    """
+    now = now or timezone.now()
+    outstanding = Notification.objects.filter(
+        type='order_offer',
+        order__isnull=False,
+        created_at__gte=now - timedelta(seconds=settings.DISPATCH_OFFER_TTL),
+    )
+
+    orders = list(
+        Order.objects
+        .filter(status='pending', courier__isnull=True, latitude__isnull=False, longitude__isnull=False)
+        .exclude(id__in=outstanding.values('order_id'))
+        .values_list('id', 'latitude', 'longitude')
+    )
+    if not orders:
+        return []
+
+    busy = Order.objects.filter(status__in=STATUS_FLOW, courier__isnull=False).values('courier_id')
+    couriers = list(
+        CourierLocation.objects
+        .filter(
+            updated_at__gte=now - timedelta(seconds=settings.DISPATCH_LOCATION_TTL),
+            courier__user_type='courier',
+            courier__is_active=True,
+        )
+        .exclude(courier_id__in=busy)
+        .exclude(courier_id__in=outstanding.values('recipient_id'))
+        .values_list('courier_id', 'latitude', 'longitude')
+    )
+
+    plan = plan_assignments(orders, couriers, settings.DISPATCH_MAX_DISTANCE_KM)
+    if not plan:
+        return []
+
+    order_map = Order.objects.select_related('service').in_bulk([order_id for _, order_id, _ in plan])
+    courier_map = User.objects.in_bulk([courier_id for courier_id, _, _ in plan])
+    send_order_offers([
+        (
+            order_map[order_id],
+            courier_map[courier_id],
+            'Заказ рядом с вами',
+            f'{order_map[order_id].service.name}: {distance:.1f} км от вас',
+        )
+        for courier_id, order_id, distance in plan
+    ])
+    return plan
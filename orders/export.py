@@ -0,0 +1,169 @@
+"""
+Потоковая выгрузка заказов для бухгалтерии в CSV и NDJSON.
+
+Строки читаются серверным курсором PostgreSQL (QuerySet.iterator) пачками
+по EXPORT_CHUNK_SIZE и сразу отдаются в поток, поэтому память не зависит
+от числа заказов. Под ASGI поток отдается асинхронным итератором
+(async_chunks): синхронный итератор ASGIHandler Django сначала собирает
+в список целиком. Оперативные и архивные заказы читаются в одной транзакции
+REPEATABLE READ: перенос в архив во время выгрузки не дублирует и не теряет заказы.
+"""
+import csv
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import CharField, Func
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order
+
+
+# Столбцы выгрузки: (заголовок, поле values_list)
+EXPORT_COLUMNS = (
+    ('id', 'id'),
+    ('created_at', 'created_at'),
+    ('status', 'status'),
+    ('status_changed_at', 'status_changed_at'),
+    ('service', 'service__name'),
+    ('price', 'price'),
+    ('customer_id', 'customer_id'),
+    ('customer_email', 'customer__email'),
+    ('courier_id', 'courier_id'),
+    ('courier_email', 'courier__email'),
+    ('city', 'city'),
+    ('street', 'street'),
+    ('building_num', 'building_num'),
+    ('building', 'building'),
+    ('floor', 'floor'),
+    ('apartment', 'apartment'),
+    ('comment', 'comment'),
+)
+
+# Поля дат выгружаются строками ISO 8601 в UTC
+EXPORT_DATE_FIELDS = {'created_at', 'status_changed_at'}
+
+# Строк в одной выборке серверного курсора и в одном куске ответа
+EXPORT_CHUNK_SIZE = 2000
+
+
+class IsoTimestamp(Func):
+    """
+    Дата в ISO 8601 (UTC), отформатированная PostgreSQL: так дешевле,
+    чем разбирать дату в datetime и форматировать обратно в Python.
+    """
+    template = "to_char(%(expressions)s AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"Z\"')"
+    output_field = CharField()
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def export_filters(date_from=None, date_to=None, statuses=(), courier=None, city=None):
+    """
+    Проверяет параметры выгрузки (строки из запроса или командной строки)
+    и возвращает условия filter() для Order и ArchivedOrder. Даты относятся
+    к созданию заказа и включаются в период. Ошибки - ValueError с описанием.
+    """
+    try:
+        date_from = date.fromisoformat(date_from) if date_from else None
+        date_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format.")
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("date_from must not be later than date_to.")
+
+    filters = {}
+    if date_from:
+        filters['created_at__gte'] = _day_start(date_from)
+    if date_to:
+        filters['created_at__lt'] = _day_start(date_to + timedelta(days=1))
+
+    unknown = sorted(set(statuses) - dict(Order.STATUS_CHOICES).keys())
+    if unknown:
+        raise ValueError(f"Unknown status: {', '.join(unknown)}.")
+    if statuses:
+        filters['status__in'] = list(statuses)
+
+    if courier:
+        try:
+            filters['courier_id'] = int(courier)
+        except ValueError:
+            raise ValueError("courier must be a user id.")
+    if city:
+        filters['city'] = city
+    return filters
+
+
+def export_rows(filters, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Кортежи значений EXPORT_COLUMNS по возрастанию id: сначала оперативные
+    заказы, затем архивные.
+    """
+    fields = [IsoTimestamp(field) if field in EXPORT_DATE_FIELDS else field for _, field in EXPORT_COLUMNS]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        for model in (Order, ArchivedOrder):
+            queryset = model.objects.filter(**filters).order_by('id').values_list(*fields)
+            yield from queryset.iterator(chunk_size=chunk_size)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+class _Echo:
+    # csv.writer пишет строку сюда и возвращает ее без промежуточного буфера
+    def write(self, value):
+        return value
+
+
+def export_csv(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    CSV с заголовком, кусками по chunk_size строк.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(map(writer.writerow, chunk))
+
+
+def export_ndjson(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    По JSON-объекту на строку, кусками по chunk_size строк.
+    """
+    names = [name for name, _ in EXPORT_COLUMNS]
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in _chunks(rows, chunk_size):
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in chunk)
+
+
+async def async_chunks(chunks):
+    """
+    Асинхронный итератор по кускам синхронного потока для ответа под ASGI.
+    Каждый кусок запрашивается отдельно в потоке запроса (thread_sensitive),
+    поэтому курсор и транзакция export_rows остаются в одном потоке.
+    """
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # При обрыве соединения закрывает курсор и транзакцию
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+# Форматы выгрузки: (функция, Content-Type, расширение файла)
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv; charset=utf-8', 'csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson; charset=utf-8', 'ndjson'),
+}
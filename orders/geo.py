@@ -0,0 +1,164 @@
+import math
+
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Точность geohash, с которой он хранится в Order.geohash (~5 x 5 м)
+GEOHASH_PRECISION = 9
+
+# Максимальное число ячеек, которыми покрывается область поиска
+MAX_COVER_CELLS = 16
+
+_GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Кодирует координаты в строку geohash заданной точности.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude = float(latitude)
+    longitude = float(longitude)
+
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Чётные биты кодируют долготу, нечётные - широту
+    while len(chars) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            value_range[0] = mid
+        else:
+            value_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """
+    Возвращает размер ячейки geohash в градусах: (широта, долгота).
+    """
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lon_bits = total_bits - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Возвращает прямоугольник (min_lat, max_lat, min_lon, max_lon),
+    описанный вокруг круга радиусом radius_km.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6:
+        lon_delta = 180.0
+    else:
+        lon_delta = min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return (
+        max(-90.0, latitude - lat_delta),
+        min(90.0, latitude + lat_delta),
+        max(-180.0, longitude - lon_delta),
+        min(180.0, longitude + lon_delta),
+    )
+
+
+def geohash_cover(min_lat, max_lat, min_lon, max_lon, max_cells=MAX_COVER_CELLS):
+    """
+    Подбирает наибольшую точность, при которой прямоугольник покрывается
+    не более чем max_cells ячейками, и возвращает префиксы этих ячеек.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        lat_first = math.floor((min_lat + 90.0) / lat_step)
+        lat_last = math.floor((max_lat + 90.0) / lat_step)
+        lon_first = math.floor((min_lon + 180.0) / lon_step)
+        lon_last = math.floor((max_lon + 180.0) / lon_step)
+        if (lat_last - lat_first + 1) * (lon_last - lon_first + 1) > max_cells:
+            continue
+
+        cells = set()
+        for lat_index in range(lat_first, lat_last + 1):
+            for lon_index in range(lon_first, lon_last + 1):
+                # Кодируем центр ячейки, чтобы не попасть на её границу
+                cells.add(encode_geohash(
+                    -90.0 + (lat_index + 0.5) * lat_step,
+                    -180.0 + (lon_index + 0.5) * lon_step,
+                    precision,
+                ))
+        return cells
+    return {''}
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Расстояние по поверхности Земли между двумя точками в километрах.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, map(float, (lat1, lon1, lat2, lon2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_expression(latitude, longitude):
+    """
+    SQL-выражение расстояния (км) от заданной точки до координат заказа.
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    order_lat = Cast('latitude', FloatField())
+    order_lon = Cast('longitude', FloatField())
+    a = (
+        Power(Sin(Radians(order_lat - latitude) / 2), 2)
+        + Value(math.cos(math.radians(latitude)), output_field=FloatField())
+        * Cos(Radians(order_lat))
+        * Power(Sin(Radians(order_lon - longitude) / 2), 2)
+    )
+    distance = 2 * EARTH_RADIUS_KM * ASin(Sqrt(Least(a, Value(1.0, output_field=FloatField()))))
+    # LEAST в PostgreSQL игнорирует NULL, поэтому заказы без координат обрабатываем явно
+    return Case(
+        When(latitude__isnull=False, longitude__isnull=False, then=distance),
+        default=None,
+        output_field=FloatField(),
+    )
+
+
+def nearby_orders(queryset, latitude, longitude, radius_km=None):
+    """
+    Добавляет к заказам аннотацию distance.
+
+    Если задан радиус, кандидаты сначала отбираются в SQL по ячейкам geohash
+    и ограничивающему прямоугольнику, и точное расстояние считается только
+    для них.
+    """
+    if radius_km is not None:
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_km)
+        cells_filter = Q()
+        for cell in geohash_cover(min_lat, max_lat, min_lon, max_lon):
+            cells_filter |= Q(geohash__startswith=cell)
+        queryset = queryset.filter(
+            cells_filter,
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lon, max_lon),
+        )
+
+    queryset = queryset.annotate(distance=distance_expression(latitude, longitude))
+    if radius_km is not None:
+        queryset = queryset.filter(distance__lte=radius_km)
+    return queryset
@@ -0,0 +1,63 @@
+"""
+Запросы к журналу статусов заказов (OrderStatusEvent).
+"""
+from django.db.models import Aggregate, Count, DurationField
+
+from .models import OrderStatusEvent
+
+
+# Перцентили времени в статусе, которые отдает API
+DWELL_PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class PercentileCont(Aggregate):
+    """
+    PERCENTILE_CONT(fraction) WITHIN GROUP (ORDER BY expression) в PostgreSQL.
+    """
+    function = 'PERCENTILE_CONT'
+    name = 'PercentileCont'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), output_field=DurationField(), **extra)
+
+
+def order_timeline(order_id):
+    """
+    История статусов заказа в хронологическом порядке.
+    """
+    return OrderStatusEvent.objects.filter(order_id=order_id).order_by('created_at', 'id')
+
+
+def dwell_time_percentiles(start, end, statuses=None):
+    """
+    Перцентили времени, проведенного заказами в каждом статусе, по событиям
+    выхода из статуса в интервале [start, end). Читает только журнал:
+    длительность хранится в самом событии.
+    """
+    events = OrderStatusEvent.objects.filter(
+        created_at__gte=start,
+        created_at__lt=end,
+        previous_status__isnull=False,
+    )
+    if statuses:
+        events = events.filter(previous_status__in=statuses)
+
+    percentiles = {
+        f'p{round(fraction * 100)}': PercentileCont('dwell', fraction)
+        for fraction in DWELL_PERCENTILES
+    }
+    rows = (
+        events
+        .values('previous_status')
+        .annotate(count=Count('id'), **percentiles)
+        .order_by('previous_status')
+    )
+    return [
+        {
+            'status': row['previous_status'],
+            'count': row['count'],
+            **{name: row[name].total_seconds() for name in percentiles},
+        }
+        for row in rows
+    ]
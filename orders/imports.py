@@ -0,0 +1,358 @@
+"""
+Массовый импорт пользователей, заказов и уведомлений из CSV или NDJSON
+(команда bulk_import).
+
+Файл читается и проверяется за один потоковый проход пачками по
+IMPORT_CHUNK_SIZE строк: поля проверяются валидаторами полей модели,
+ссылки и уникальность email - одним запросом на пачку. Проверенная пачка
+сразу записывается через shoe_service.bulk_load (COPY в PostgreSQL).
+Импорт идет в одной транзакции: если в файле есть ошибки, ничего не
+записывается, а проход продолжается только для проверки остальных строк.
+С skip_invalid ошибочные строки пропускаются. Пока транзакция импорта
+открыта, маркер синхронизации пула не сдвигается (см. orders/sync.py).
+
+Запись обходит save() и сигналы, поэтому импорт сам вычисляет поля
+заказа, пишет начальные записи журнала статусов, записи прочтения общих
+уведомлений новых пользователей, обновляет сводку курьеров и сбрасывает
+кэш после фиксации. Курьеры, подключенные к потоку пула,
+узнают об импортированных заказах при следующей синхронизации (changes).
+"""
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from authentication.models import User
+from notifications.broadcasts import create_read_states
+from notifications.models import Notification
+from service.models import Service
+from shoe_service.bulk_load import allocate_ids, chunked, load_objects
+from shoe_service.cache import (
+    NOTIFICATIONS_SCOPE, PENDING_ORDERS_SCOPE, bump_generation_on_commit, change_unread_counts_on_commit,
+    invalidate_user_cache_on_commit,
+)
+from .addresses import street_search_texts
+from .geo import encode_geohash
+from .models import Order, OrderStatusEvent
+from .stats import record_order_changes
+from .sync import current_transaction_id
+from .transitions import STATUS_FLOW
+
+
+# Строк в одной пачке проверки и записи
+IMPORT_CHUNK_SIZE = 5000
+# Сколько ошибок сохраняется для отчета; остальные только считаются
+IMPORT_REPORTED_ERRORS = 100
+
+# Статусы, в которых у заказа должен быть курьер
+COURIER_STATUSES = set(STATUS_FLOW) | set(STATUS_FLOW.values())
+
+
+class InvalidRows(ValueError):
+    """
+    В файле есть ошибочные строки, импорт отменен.
+    """
+
+    def __init__(self, invalid, errors):
+        super().__init__(f'{invalid} invalid rows.')
+        self.invalid = invalid
+        self.errors = errors
+
+
+class Importer:
+    """
+    Импорт строк одной модели. Подклассы задают model и columns
+    (attname полей, которые можно передать в файле) и при необходимости
+    проверки пачки (validate_chunk), запись (write) и завершение (finish).
+    """
+    model = None
+    columns = ()
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE, skip_invalid=False):
+        self.chunk_size = chunk_size
+        self.skip_invalid = skip_invalid
+        self.created = 0
+        self.invalid = 0
+        self.errors = []
+
+    def run(self, records):
+        """
+        Импортирует записи (номер строки, словарь) из read_records.
+        Возвращает число созданных строк; ошибки остаются в errors.
+        """
+        with transaction.atomic():
+            for chunk in chunked(records, self.chunk_size):
+                rows = [(line, values) for line, record in chunk if (values := self.clean_record(line, record))]
+                rows = self.validate_chunk(rows)
+                if self.invalid and not self.skip_invalid:
+                    # Транзакция все равно откатится, дальше только проверка
+                    continue
+                if rows:
+                    self.write([values for _, values in rows])
+                    self.created += len(rows)
+            if self.invalid and not self.skip_invalid:
+                raise InvalidRows(self.invalid, self.errors)
+            self.finish()
+        return self.created
+
+    def reject(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < IMPORT_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def clean_record(self, line, record):
+        """
+        Значения столбцов записи, приведенные и проверенные полями модели,
+        или None, если запись отклонена.
+        """
+        if record is None:
+            self.reject(line, 'Not a JSON object.')
+            return None
+        errors = [f'{name}: unknown column.' for name in sorted(set(record) - set(self.columns), key=str)]
+        values = {}
+        for name in self.columns:
+            try:
+                values[name] = self.clean_value(self.model._meta.get_field(name), record.get(name))
+            except ValidationError as e:
+                errors.append(f"{name}: {' '.join(e.messages)}")
+        if errors:
+            self.reject(line, '; '.join(errors))
+            return None
+        return values
+
+    def clean_value(self, field, raw):
+        if isinstance(raw, str):
+            raw = raw.strip()
+        elif isinstance(raw, float):
+            # Числа из JSON: DecimalField должен видеть 37.6, а не двоичное приближение
+            raw = repr(raw)
+        if raw is None or raw == '':
+            if field.has_default() or field.null or field.blank:
+                return field.get_default()
+            raise ValidationError('This field is required.')
+        if field.is_relation:
+            # Существование связанных строк проверяется на всю пачку в validate_chunk
+            return field.target_field.to_python(raw)
+        return field.clean(raw, None)
+
+    def validate_chunk(self, rows):
+        """
+        Проверки, которым нужна база. Возвращает строки, прошедшие проверку.
+        """
+        return rows
+
+    def check_rows(self, rows, check):
+        """
+        Применяет check(values) к строкам пачки: check возвращает список
+        ошибок строки, строки с ошибками отклоняются.
+        """
+        valid = []
+        for line, values in rows:
+            errors = check(values)
+            if errors:
+                self.reject(line, '; '.join(errors))
+            else:
+                valid.append((line, values))
+        return valid
+
+    def write(self, rows):
+        load_objects(self.model, [self.model(**values) for values in rows])
+
+    def finish(self):
+        pass
+
+
+def _setup_worker():
+    # Процессы, запущенные через spawn, сами загружают настройки Django
+    django.setup()
+
+
+class UserImporter(Importer):
+    """
+    Пользователи. Пароль передается в столбце password открытым текстом
+    и хэшируется в пуле из workers процессов (0 - в текущем процессе);
+    без пароля пользователь не может войти, пока не задаст пароль.
+    """
+    model = User
+    columns = ('email', 'first_name', 'last_name', 'phone', 'user_type', 'is_active', 'is_staff')
+
+    def __init__(self, workers=None, **kwargs):
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.executor = None
+        self.seen_emails = set()
+
+    def run(self, records):
+        if self.workers == 0:
+            return super().run(records)
+        with ProcessPoolExecutor(self.workers, initializer=_setup_worker) as self.executor:
+            return super().run(records)
+
+    def clean_record(self, line, record):
+        password = record.pop('password', None) if record is not None else None
+        values = super().clean_record(line, record)
+        if values is not None:
+            values['email'] = User.objects.normalize_email(values['email'])
+            values['password'] = str(password) if password not in (None, '') else None
+        return values
+
+    def validate_chunk(self, rows):
+        emails = [values['email'] for _, values in rows]
+        taken = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        def check(values):
+            email = values['email']
+            if email in taken or email in self.seen_emails:
+                return [f'email: {email} is already registered.']
+            self.seen_emails.add(email)
+            return []
+
+        return self.check_rows(rows, check)
+
+    def hash_passwords(self, passwords):
+        if self.executor is None:
+            return [make_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (4 * (self.workers or os.cpu_count() or 1)))
+        return list(self.executor.map(make_password, passwords, chunksize=chunksize))
+
+    def write(self, rows):
+        passwords = self.hash_passwords([values.pop('password') for values in rows])
+        users = [User(password=password, **values) for values, password in zip(rows, passwords)]
+        # Ключи нужны заранее: COPY их не возвращает
+        for user, pk in zip(users, allocate_ids(User, len(users)) or ()):
+            user.pk = pk
+        load_objects(User, users)
+        create_read_states([user.pk for user in users])
+
+
+class OrderImporter(Importer):
+    """
+    Заказы. Цена берется из файла как есть, статус по умолчанию - pending;
+    для статусов с курьером нужен courier_id курьера.
+    """
+    model = Order
+    columns = (
+        'service_id', 'customer_id', 'courier_id', 'city', 'street', 'building_num', 'building',
+        'floor', 'apartment', 'latitude', 'longitude', 'status', 'comment', 'price',
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.user_ids = set()
+        self.has_pending = False
+        self.change_seq = None
+
+    def validate_chunk(self, rows):
+        services = set(
+            Service.objects.filter(pk__in={values['service_id'] for _, values in rows}).values_list('pk', flat=True)
+        )
+        user_ids = {values[name] for _, values in rows for name in ('customer_id', 'courier_id')}
+        user_types = dict(User.objects.filter(pk__in=user_ids - {None}).values_list('pk', 'user_type'))
+
+        def check(values):
+            errors = []
+            if values['service_id'] not in services:
+                errors.append(f"service_id: service {values['service_id']} does not exist.")
+            if values['customer_id'] not in user_types:
+                errors.append(f"customer_id: user {values['customer_id']} does not exist.")
+            courier_id = values['courier_id']
+            if courier_id is not None and user_types.get(courier_id) != 'courier':
+                errors.append(f'courier_id: courier {courier_id} does not exist.')
+            if courier_id is None and values['status'] in COURIER_STATUSES:
+                errors.append(f"courier_id: required for status {values['status']}.")
+            if (values['latitude'] is None) != (values['longitude'] is None):
+                errors.append('latitude, longitude: both or neither must be set.')
+            return errors
+
+        return self.check_rows(rows, check)
+
+    def transaction_id(self):
+        # Значение TransactionId для всех заказов импорта (см. orders/sync.py)
+        if self.change_seq is None:
+            self.change_seq = current_transaction_id() if connection.vendor == 'postgresql' else 0
+        return self.change_seq
+
+    def write(self, rows):
+        now = timezone.now()
+        orders = [Order(status_changed_at=now, **values) for values in rows]
+        by_city = defaultdict(list)
+        for order in orders:
+            if order.latitude is not None:
+                order.geohash = encode_geohash(order.latitude, order.longitude)
+            if order.status == 'pending':
+                order.change_seq = self.transaction_id()
+                self.has_pending = True
+            by_city[order.city].append(order)
+            self.user_ids.update((order.customer_id, order.courier_id))
+        for city, city_orders in by_city.items():
+            texts = street_search_texts([order.street for order in city_orders], city)
+            for order, text in zip(city_orders, texts):
+                order.street_search = text
+
+        ids = allocate_ids(Order, len(orders))
+        if ids:
+            for order, pk in zip(orders, ids):
+                order.pk = pk
+        load_objects(Order, orders)
+        load_objects(OrderStatusEvent, [OrderStatusEvent.for_change(order, None, None) for order in orders])
+        record_order_changes([(order, None, None) for order in orders if order.courier_id])
+
+    def finish(self):
+        invalidate_user_cache_on_commit(*self.user_ids)
+        if self.has_pending:
+            bump_generation_on_commit(PENDING_ORDERS_SCOPE)
+
+
+class NotificationImporter(Importer):
+    """
+    Уведомления. Тип должен подходить роли получателя
+    (Notification.get_allowed_types_for_user). Непрочитанные увеличивают
+    счетчики получателей после фиксации, как при send_notifications.
+    """
+    model = Notification
+    columns = ('recipient_id', 'order_id', 'type', 'title', 'message', 'is_read')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.recipient_ids = set()
+        self.unread = Counter()
+
+    def validate_chunk(self, rows):
+        recipients = User.objects.only('user_type').in_bulk({values['recipient_id'] for _, values in rows})
+        order_ids = {values['order_id'] for _, values in rows} - {None}
+        orders = set(Order.objects.filter(pk__in=order_ids).values_list('pk', flat=True))
+
+        def check(values):
+            recipient = recipients.get(values['recipient_id'])
+            if recipient is None:
+                return [f"recipient_id: user {values['recipient_id']} does not exist."]
+            errors = []
+            if values['order_id'] is not None and values['order_id'] not in orders:
+                errors.append(f"order_id: order {values['order_id']} does not exist.")
+            if values['type'] not in Notification.get_allowed_types_for_user(recipient):
+                errors.append(f"type: {values['type']} is not allowed for {recipient.user_type}.")
+            return errors
+
+        return self.check_rows(rows, check)
+
+    def write(self, rows):
+        super().write(rows)
+        self.recipient_ids.update(values['recipient_id'] for values in rows)
+        self.unread.update(values['recipient_id'] for values in rows if not values['is_read'])
+
+    def finish(self):
+        bump_generation_on_commit(*(NOTIFICATIONS_SCOPE.format(user_id=user_id) for user_id in self.recipient_ids))
+        change_unread_counts_on_commit(self.unread)
+
+
+# Импортеры команды bulk_import
+IMPORTERS = {
+    'users': UserImporter,
+    'orders': OrderImporter,
+    'notifications': NotificationImporter,
+}
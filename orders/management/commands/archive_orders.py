@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from orders.archive import archive_orders
+from orders.sync import prune_deleted_pending_orders
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит завершенные, отмененные и возвращенные заказы старше заданного срока '
+        'в архив. Каждая пачка переносится в отдельной транзакции, поэтому прерванный '
+        'запуск можно просто повторить; команду удобно запускать по расписанию. '
+        'Заодно удаляет отметки удаленных заказов синхронизации пула старше ORDER_SYNC_RETENTION_DAYS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help='Возраст последней смены статуса в днях (по умолчанию ORDER_ARCHIVE_AFTER_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        archived = 0
+        for moved in archive_orders(cutoff, options['batch_size']):
+            archived += moved
+            self.stdout.write(f'Archived {archived}')
+        self.stdout.write(f'Done, archived {archived} order(s).')
+        pruned = prune_deleted_pending_orders()
+        self.stdout.write(f'Pruned {pruned} deleted pending order mark(s).')
@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from orders.addresses import street_search_texts
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет нормализованный адрес для поиска (street_search) у существующих заказов. '
+        'Заказы читаются потоком через серверный курсор, нормализуются пачками '
+        'и записываются обратно через bulk_update.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать и уже заполненные адреса (после изменения правил нормализации)',
+        )
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if not options['all']:
+            orders = orders.filter(street_search='')
+        orders = orders.order_by().only('id', 'street', 'city', 'street_search')
+
+        batch_size = options['batch_size']
+        processed = updated = 0
+        batch = []
+        for order in orders.iterator(chunk_size=batch_size):
+            batch.append(order)
+            if len(batch) == batch_size:
+                updated += self.update_batch(batch)
+                processed += len(batch)
+                batch = []
+                self.stdout.write(f'Processed {processed}, updated {updated}')
+        updated += self.update_batch(batch)
+        processed += len(batch)
+        self.stdout.write(f'Done, processed {processed}, updated {updated} order(s).')
+
+    def update_batch(self, batch):
+        # Правила нормализации зависят от города, поэтому пачка делится по городам
+        by_city = defaultdict(list)
+        for order in batch:
+            by_city[order.city].append(order)
+
+        changed = []
+        for city, orders in by_city.items():
+            values = street_search_texts([order.street for order in orders], city)
+            for order, value in zip(orders, values):
+                if value != order.street_search:
+                    order.street_search = value
+                    changed.append(order)
+        Order.objects.bulk_update(changed, ['street_search'])
+        return len(changed)
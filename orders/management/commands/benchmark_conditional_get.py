@@ -0,0 +1,101 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from notifications.models import Notification
+from orders.geo import encode_geohash
+from orders.models import Order
+from service.models import Service
+
+
+# Опрашиваемые адреса: (название, пользователь, URL)
+ENDPOINTS = (
+    ('client orders', 'client', '/api/orders/client/orders/'),
+    ('pending pool', 'courier', '/api/orders/courier/orders/?latitude=55.75&longitude=37.62&distance=5'),
+    ('assigned orders', 'courier', '/api/orders/courier/orders/assigned_orders/'),
+    ('notifications', 'client', '/api/notifications/'),
+    ('services', 'client', '/api/services/services/'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает трафик и процессорное время при периодическом опросе списков '
+        'без ETag и с If-None-Match. Данные создаются внутри транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500, help='Размер пула ожидающих заказов')
+        parser.add_argument('--polls', type=int, default=200, help='Число опросов каждого адреса')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            users = self.seed(options['orders'], rng)
+            results = [
+                (name, *self.measure(users[role], url, options['polls']))
+                for name, role, url in ENDPOINTS
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{'endpoint':<18} {'200, bytes':>11} {'304, bytes':>11} {'200, ms':>9} {'304, ms':>9}"
+        )
+        for name, full_bytes, cached_bytes, full_ms, cached_ms in results:
+            self.stdout.write(
+                f'{name:<18} {full_bytes:>11.0f} {cached_bytes:>11.0f} {full_ms:>9.2f} {cached_ms:>9.2f}'
+            )
+
+    def seed(self, size, rng):
+        suffix = rng.random()
+        client = User.objects.create_user(f'bench-client-{suffix}@example.com', 'Bench', None, user_type='client')
+        courier = User.objects.create_user(f'bench-courier-{suffix}@example.com', 'Bench', None, user_type='courier')
+        service = Service.objects.create(name='Benchmark', slug=f'benchmark-{suffix}', price=Decimal('100'))
+
+        orders = []
+        for _ in range(size):
+            latitude = round(rng.uniform(55.70, 55.80), 6)
+            longitude = round(rng.uniform(37.55, 37.70), 6)
+            orders.append(Order(
+                service=service,
+                customer=client,
+                street='Тверская',
+                latitude=latitude,
+                longitude=longitude,
+                geohash=encode_geohash(latitude, longitude),
+            ))
+        orders = Order.objects.bulk_create(orders)
+        Order.objects.filter(pk__in=[order.pk for order in orders[:20]]).update(
+            courier=courier, status='courier_assigned',
+        )
+        Notification.objects.bulk_create([
+            Notification(recipient=client, type='system', title=f'#{i}', message='Текст')
+            for i in range(50)
+        ])
+        return {'client': client, 'courier': courier}
+
+    def measure(self, user, url, polls):
+        """
+        Возвращает средний размер тела и процессорное время одного опроса
+        без условного заголовка и с ним.
+        """
+        api = APIClient(SERVER_NAME='localhost')
+        api.force_authenticate(user)
+        etag = api.get(url)['ETag']
+
+        full_bytes, full_ms = self.poll(api, url, polls)
+        cached_bytes, cached_ms = self.poll(api, url, polls, HTTP_IF_NONE_MATCH=etag)
+        return full_bytes, cached_bytes, full_ms, cached_ms
+
+    def poll(self, api, url, polls, **headers):
+        body = 0
+        started = time.process_time()
+        for _ in range(polls):
+            body += len(api.get(url, **headers).content)
+        return body / polls, (time.process_time() - started) * 1000 / polls
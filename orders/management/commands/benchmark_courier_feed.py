@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from authentication.models import User
+from orders.geo import encode_geohash, haversine_km, nearby_orders
+from orders.models import Order
+from service.models import Service
+
+
+# Границы Москвы внутри МКАД (примерно)
+MOSCOW_BOUNDS = (55.57, 55.91, 37.37, 37.84)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время выдачи ленты доступных заказов курьеру с фильтром по расстоянию. '
+        'Данные создаются внутри транзакции и откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--distance', type=float, default=3.0, help='Радиус поиска, км')
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"{'orders':>10} {'python, ms':>12} {'indexed, ms':>12} {'matches':>11}")
+        for size in options['sizes']:
+            with transaction.atomic():
+                self.seed_orders(size, rng)
+                python_ms, indexed_ms, candidates = self.measure(rng, options)
+                transaction.set_rollback(True)
+            self.stdout.write(f'{size:>10} {python_ms:>12.1f} {indexed_ms:>12.1f} {candidates:>11}')
+
+    def seed_orders(self, size, rng):
+        customer = User.objects.create_user(f'bench-{rng.random()}@example.com', 'Bench', None)
+        service = Service.objects.create(name='Benchmark', slug=f'benchmark-{rng.random()}', price=Decimal('100'))
+        min_lat, max_lat, min_lon, max_lon = MOSCOW_BOUNDS
+        batch = []
+        for _ in range(size):
+            latitude = round(rng.uniform(min_lat, max_lat), 6)
+            longitude = round(rng.uniform(min_lon, max_lon), 6)
+            batch.append(Order(
+                service=service,
+                customer=customer,
+                street='Тверская',
+                latitude=latitude,
+                longitude=longitude,
+                geohash=encode_geohash(latitude, longitude),
+            ))
+            if len(batch) == 10_000:
+                Order.objects.bulk_create(batch)
+                batch = []
+        Order.objects.bulk_create(batch)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE orders_order')
+
+    def measure(self, rng, options):
+        min_lat, max_lat, min_lon, max_lon = MOSCOW_BOUNDS
+        pending = Order.objects.filter(status='pending', courier__isnull=True)
+        python_times = []
+        indexed_times = []
+        candidates = 0
+        for _ in range(options['repeat']):
+            latitude = rng.uniform(min_lat, max_lat)
+            longitude = rng.uniform(min_lon, max_lon)
+
+            # Прежний подход: выгрузка всего пула и расчёт расстояния в Python
+            started = time.perf_counter()
+            rows = [
+                (haversine_km(latitude, longitude, lat, lon), pk)
+                for pk, lat, lon in pending.values_list('id', 'latitude', 'longitude')
+            ]
+            sorted(row for row in rows if row[0] <= options['distance'])[:options['page_size']]
+            python_times.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            queryset = nearby_orders(pending, latitude, longitude, options['distance'])
+            list(queryset.order_by('distance', 'id')[:options['page_size']])
+            candidates = queryset.count()
+            indexed_times.append((time.perf_counter() - started) * 1000)
+        return statistics.median(python_times), statistics.median(indexed_times), candidates
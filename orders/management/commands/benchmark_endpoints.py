@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from orders.benchmarks import (
+    BASELINE_PATH, DEFAULT_DATASET, ENDPOINTS, LATENCY_TOLERANCE, find_regressions, load_baseline,
+    run_benchmarks, save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95/p99 времени ответа и число SQL-запросов основных эндпоинтов API '
+        'на синтетических данных в отдельной тестовой базе (кэш очищается перед каждым '
+        'запросом) и сравнивает с базовой линией. При регрессии завершается с ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help='Замеряемых запросов на эндпоинт')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--orders', type=int, default=DEFAULT_DATASET['orders'])
+        parser.add_argument('--users', type=int, default=DEFAULT_DATASET['users'])
+        parser.add_argument('--seed', type=int, default=DEFAULT_DATASET['seed'])
+        parser.add_argument(
+            '--endpoint', action='append', dest='only', choices=[name for name, *_ in ENDPOINTS],
+            help='Замерить только этот эндпоинт; можно повторять',
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после замера')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH))
+        parser.add_argument('--tolerance', type=float, default=LATENCY_TOLERANCE, help='Допуск роста p50 и p95, доля')
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Записать результаты как базовую линию вместо сравнения',
+        )
+
+    def handle(self, *args, **options):
+        if options['update_baseline'] and options['only']:
+            raise CommandError('Record the baseline for all endpoints, without --endpoint.')
+        dataset = {'seed': options['seed'], 'users': options['users'], 'orders': options['orders']}
+        baseline = None if options['update_baseline'] else load_baseline(options['baseline'])
+        if baseline and baseline['dataset'] != {**DEFAULT_DATASET, **dataset}:
+            raise CommandError(
+                f"Baseline was recorded on dataset {baseline['dataset']}; "
+                f'run with the same options or record a new baseline with --update-baseline.'
+            )
+
+        # Замер идет в чистой тестовой базе, как у тестов: данные рабочей базы не влияют на результат
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = run_benchmarks(dataset, options['warmup'], options['repeat'], options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+        self.stdout.write(f"{'endpoint':<22} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'queries':>8} {'baseline p95':>13}")
+        for name, result in results.items():
+            base = baseline['endpoints'].get(name, {}) if baseline else {}
+            base_p95 = f"{base['p95_ms']:>13.2f}" if base else f"{'-':>13}"
+            self.stdout.write(
+                f"{name:<22} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                f"{result['queries']:>8} {base_p95}"
+            )
+
+        if options['update_baseline']:
+            save_baseline(results, dataset, options['baseline'])
+            self.stdout.write(f"Baseline written to {options['baseline']}.")
+            return
+        if baseline is None:
+            self.stdout.write(f"No baseline at {options['baseline']}, nothing to compare.")
+            return
+
+        regressions = find_regressions(results, baseline, options['tolerance'])
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f'{len(regressions)} performance regressions.')
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
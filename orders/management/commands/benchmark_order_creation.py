@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from orders.benchmarks import FAN_OUT_COURIERS, order_creation_latency
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время создания заказа клиентом в зависимости от числа активных курьеров, '
+        'которым рассылается уведомление о новом заказе, и время его доставки воркером. '
+        'Замер идет в отдельной тестовой базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, nargs='+', default=list(FAN_OUT_COURIERS))
+        parser.add_argument('--repeat', type=int, default=20, help='Замеряемых запросов на каждое число курьеров')
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--keepdb', action='store_true', help='Не удалять тестовую базу после замера')
+        parser.add_argument(
+            '--copies', action='store_true', help='Копия уведомления каждому курьеру вместо общего уведомления',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = order_creation_latency(
+                options['couriers'], options['warmup'], options['repeat'], broadcast=not options['copies'],
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+        self.stdout.write(
+            f"{'couriers':>8} {'p50, ms':>9} {'p95, ms':>9} {'p99, ms':>9} {'queries':>8} "
+            f"{'delivery, ms':>13} {'rows':>7} {'bytes':>9}"
+        )
+        for couriers, result in results.items():
+            self.stdout.write(
+                f"{couriers:>8} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                f"{result['queries']:>8} {result['delivery_ms']:>13.2f} {result['rows']:>7} {result['bytes']:>9}"
+            )
@@ -0,0 +1,127 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import User
+from orders.export import EXPORT_COLUMNS, export_csv, export_rows
+from orders.models import Order
+from service.models import Service
+from shoe_service.testing import asgi_get
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и пиковую память выгрузки заказов в CSV: потоковой (export_orders), '
+        'через эндпоинт /api/orders/export/ под ASGIHandler, как под daphne, и через список '
+        'всех строк. Данные создаются внутри транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100_000, 1_000_000, 5_000_000])
+        parser.add_argument(
+            '--naive-max', type=int, default=1_000_000,
+            help='Наибольший размер, для которого замеряется выгрузка через список',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'orders':>10} {'stream, s':>10} {'stream, MB':>11} {'asgi, s':>8} {'asgi, MB':>9} "
+            f"{'list, s':>9} {'list, MB':>9} {'output, MB':>11}"
+        )
+        with transaction.atomic():
+            seeded = 0
+            customer, courier, service = self.seed_users()
+            self.token = str(AccessToken.for_user(
+                User.objects.create_superuser('bench-export-admin@example.com', None),
+            ))
+            for size in sorted(options['sizes']):
+                self.seed_orders(customer, courier, service, seeded, size)
+                seeded = size
+
+                filters = {'courier_id': courier.id}
+                stream_seconds, output_bytes = self.measure_time(self.stream, filters)
+                stream_peak = self.measure_peak(self.stream, filters)
+                asgi_seconds, _ = self.measure_time(self.asgi, filters)
+                asgi_peak = self.measure_peak(self.asgi, filters)
+                if size <= options['naive_max']:
+                    list_seconds, _ = self.measure_time(self.naive, filters)
+                    list_peak = f'{self.measure_peak(self.naive, filters) / 2 ** 20:>9.1f}'
+                    list_seconds = f'{list_seconds:>9.1f}'
+                else:
+                    list_seconds = list_peak = f"{'-':>9}"
+                self.stdout.write(
+                    f'{size:>10} {stream_seconds:>10.1f} {stream_peak / 2 ** 20:>11.1f} '
+                    f'{asgi_seconds:>8.1f} {asgi_peak / 2 ** 20:>9.1f} '
+                    f'{list_seconds} {list_peak} {output_bytes / 2 ** 20:>11.1f}'
+                )
+            transaction.set_rollback(True)
+
+    def seed_users(self):
+        customer = User.objects.create_user('bench-export-client@example.com', 'Bench', None, user_type='client')
+        courier = User.objects.create_user('bench-export-courier@example.com', 'Bench', None, user_type='courier')
+        service = Service.objects.create(name='Benchmark', slug='benchmark-export', price=Decimal('100'))
+        return customer, courier, service
+
+    def seed_orders(self, customer, courier, service, start, stop):
+        """
+        Заказы с номерами start+1..stop одним INSERT ... SELECT generate_series.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO orders_order (
+                    service_id, customer_id, courier_id, city, street, street_search, building_num,
+                    apartment, status, status_changed_at, created_at, comment, price, change_seq
+                )
+                SELECT
+                    %s, %s, CASE WHEN g %% 4 > 0 THEN %s END, 'Москва', 'Тверская', 'тверская',
+                    (g %% 200)::text, (g %% 90)::text,
+                    (ARRAY['pending', 'courier_assigned', 'completed', 'cancelled'])[g %% 4 + 1],
+                    now() - g * interval '1 second', now() - g * interval '1 second',
+                    CASE WHEN g %% 10 = 0 THEN 'Позвонить, "код" домофона 12' END,
+                    100 + g %% 900, 0
+                FROM generate_series(%s, %s) AS g
+                """,
+                [service.id, customer.id, courier.id, start + 1, stop],
+            )
+            cursor.execute('ANALYZE orders_order')
+
+    def stream(self, filters):
+        output = 0
+        for chunk in export_csv(export_rows(filters)):
+            output += len(chunk.encode())
+        return output
+
+    def asgi(self, filters):
+        output = []
+        status, _ = asgi_get(
+            f"/api/orders/export/?courier={filters['courier_id']}",
+            [('authorization', f'Bearer {self.token}')],
+            lambda body: output.append(len(body)),
+        )
+        assert status == 200, status
+        return sum(output)
+
+    def naive(self, filters):
+        # Как при выгрузке через список или сериализацию всех строк сразу
+        rows = list(
+            Order.objects.filter(**filters).order_by('id').values_list(*(field for _, field in EXPORT_COLUMNS))
+        )
+        return len(''.join(export_csv(rows)).encode())
+
+    def measure_time(self, export, filters):
+        started = time.perf_counter()
+        output = export(filters)
+        return time.perf_counter() - started, output
+
+    def measure_peak(self, export, filters):
+        tracemalloc.start()
+        try:
+            export(filters)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
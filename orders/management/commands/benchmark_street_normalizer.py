@@ -0,0 +1,89 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.addresses import clean_street_name, clean_street_names, street_search_texts
+
+
+# Названия улиц и типичные варианты их записи в заказах. Номер дома у заказа
+# хранится отдельно, поэтому в поле улицы он встречается редко
+STREET_NAMES = (
+    'Тверская', 'Ленинский', 'Мира', 'Пречистенка', 'Краснопролетарская', 'Чистопрудный',
+    'Красная', '2-й Колобовский', 'Варшавское', 'Кутузовский', 'Садовая-Кудринская',
+    'Фрунзенская', 'Новый Арбат', '3-й Марьиной Рощи', 'Покровка', 'Большая Ордынка',
+)
+STREET_FORMATS = (
+    '{name}', 'ул. {name}', 'ул.{name}', '{name} ул.', 'г Москва, ул {name}', 'Москва, {name} улица',
+    '{name} пр-т', 'проспект {name}', '{name} пер.', '{name} ш.', '{name} наб.',
+    '{name}, {house}', 'г. Москва, {name}, д. {house}, кв. {flat}',
+)
+
+
+def legacy_clean_street_name(street, city):
+    """
+    Прежняя реализация clean_street_name: замена подстрок в цикле.
+    """
+    patterns_to_remove = [f"г {city}", "ул", "пр", "пл", "бул"]
+    clean_name = street
+
+    for pattern in patterns_to_remove:
+        clean_name = clean_name.replace(f"{pattern},", "").replace(pattern, "").strip()
+
+    clean_name = clean_name.lstrip(",").strip()
+
+    return clean_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает скорость нормализации названий улиц: прежней замены подстрок (legacy, '
+        'правила проще и ошибочны), новых правил для каждого адреса отдельно (per address) '
+        'и пакетной обработки (batch), которая к тому же обрабатывает повторы один раз.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--distinct', action='store_true',
+            help='Все адреса разные (худший случай для пакетной обработки)',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        streets = [
+            rng.choice(STREET_FORMATS).format(
+                name=rng.choice(STREET_NAMES), house=rng.randint(1, 150), flat=rng.randint(1, 300),
+            )
+            for _ in range(options['count'])
+        ]
+        if options['distinct']:
+            streets = [f'{street}, стр. {index}' for index, street in enumerate(streets)]
+        city = 'Москва'
+
+        started = time.perf_counter()
+        for street in streets:
+            legacy_clean_street_name(street, city)
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for street in streets:
+            clean_street_name(street, city)
+        per_address = time.perf_counter() - started
+
+        started = time.perf_counter()
+        clean_street_names(streets, city)
+        batch = time.perf_counter() - started
+
+        started = time.perf_counter()
+        street_search_texts(streets, city)
+        search = time.perf_counter() - started
+
+        count = len(streets)
+        self.stdout.write(f'{len(set(streets))} distinct of {count} address(es)')
+        self.stdout.write(f'{"implementation":<16} {"seconds":>9} {"addresses/s":>13}')
+        for name, seconds in (
+            ('legacy', legacy), ('per address', per_address), ('batch', batch), ('batch search', search),
+        ):
+            self.stdout.write(f'{name:<16} {seconds:>9.2f} {count / seconds:>13.0f}')
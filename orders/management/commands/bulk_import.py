@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.imports import IMPORT_CHUNK_SIZE, IMPORTERS, InvalidRows, UserImporter
+from shoe_service.bulk_load import read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует пользователей, заказы или уведомления из CSV (с заголовком) или NDJSON. '
+        'Строки проверяются потоково и записываются пачками через COPY (в PostgreSQL) '
+        'в одной транзакции; при ошибках в файле ничего не записывается. Пока импорт идет, '
+        'синхронизация пула курьеров (changes) не продвигается дальше его начала.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='Файл .csv, .ndjson или .jsonl')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--skip-invalid', action='store_true', help='Пропускать ошибочные строки')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Процессов для хэширования паролей (по умолчанию по числу ядер, 0 - без пула)',
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {'chunk_size': options['chunk_size'], 'skip_invalid': options['skip_invalid']}
+        if options['kind'] == 'users':
+            importer = UserImporter(workers=options['workers'], **kwargs)
+        else:
+            importer = IMPORTERS[options['kind']](**kwargs)
+
+        try:
+            created = importer.run(read_records(options['path']))
+        except OSError as e:
+            raise CommandError(str(e))
+        except InvalidRows as e:
+            self.write_errors(e.errors, e.invalid)
+            raise CommandError(f'{e.invalid} invalid rows, nothing imported.')
+
+        if importer.invalid:
+            self.write_errors(importer.errors, importer.invalid)
+        self.stdout.write(f"Imported {created} {options['kind']}, skipped {importer.invalid} invalid rows.")
+
+    def write_errors(self, errors, invalid):
+        for line, message in errors:
+            self.stderr.write(f'line {line}: {message}')
+        if invalid > len(errors):
+            self.stderr.write(f'... and {invalid - len(errors)} more')
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.dispatch import dispatch_pending_orders
+
+
+class Command(BaseCommand):
+    help = (
+        'Распределяет ожидающие заказы между свободными курьерами рядом и отправляет '
+        'им предложения. Без --interval выполняет один проход.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Повторять проход каждые N секунд')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            plan = dispatch_pending_orders()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'Offered {len(plan)} order(s) in {elapsed * 1000:.0f} ms.')
+            if not options['interval']:
+                return
+            time.sleep(max(0.0, options['interval'] - elapsed))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.export import EXPORT_FORMATS, export_filters, export_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает заказы, включая архивные, в CSV или NDJSON. Строки читаются серверным '
+        'курсором и пишутся кусками, поэтому память не зависит от числа заказов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument('--date-from', help='Дата создания заказа от, YYYY-MM-DD')
+        parser.add_argument('--date-to', help='Дата создания заказа до (включительно), YYYY-MM-DD')
+        parser.add_argument('--status', action='append', default=[], help='Статус; можно повторять')
+        parser.add_argument('--courier', help='id курьера')
+        parser.add_argument('--city')
+
+    def handle(self, *args, **options):
+        try:
+            filters = export_filters(
+                options['date_from'], options['date_to'], options['status'],
+                options['courier'], options['city'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = EXPORT_FORMATS[options['format']][0](export_rows(filters))
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for chunk in chunks:
+                output.write(chunk)
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from authentication.models import User
+from orders.synthetic import DATASET_CHUNK_SIZE, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает синтетический набор данных для замеров: пользователей, услуги с атрибутами '
+        'и опциями, заказы за последние --days дней с типичным распределением статусов '
+        'и координатами по Москве, журнал статусов и уведомления. При одном --seed данные '
+        'совпадают от запуска к запуску. Все пишется одной транзакцией: пока она открыта, '
+        'синхронизация пула курьеров (changes) не продвигается дальше ее начала. Только PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--courier-ratio', type=float, default=0.1, help='Доля курьеров среди пользователей')
+        parser.add_argument('--services', type=int, default=12)
+        parser.add_argument('--orders', type=int, default=100_000)
+        parser.add_argument('--days', type=int, default=365, help='За сколько дней создаются заказы')
+        parser.add_argument('--notifications-per-order', type=float, default=1.0)
+        parser.add_argument('--history', action='store_true', help='Писать всю цепочку смен статуса заказа')
+        parser.add_argument('--prefix', default='synthetic', help='Префикс email пользователей и slug услуг')
+        parser.add_argument('--password', default='synthetic-password', help='Пароль всех пользователей')
+        parser.add_argument('--chunk-size', type=int, default=DATASET_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('generate_dataset requires PostgreSQL.')
+        if not 0 <= options['courier_ratio'] < 1 or options['users'] < 1:
+            raise CommandError('At least one client is required: check --users and --courier-ratio.')
+        if options['services'] < 1:
+            raise CommandError('--services must be positive.')
+        if User.objects.filter(email__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Dataset with prefix {options['prefix']!r} already exists, use another --prefix.")
+
+        generator = DatasetGenerator(
+            seed=options['seed'], users=options['users'], courier_ratio=options['courier_ratio'],
+            services=options['services'], orders=options['orders'], days=options['days'],
+            notifications_per_order=options['notifications_per_order'], history=options['history'],
+            prefix=options['prefix'], password=options['password'], chunk_size=options['chunk_size'],
+        )
+        started = time.perf_counter()
+
+        def progress(count):
+            self.stdout.write(f"orders: {count}/{options['orders']} ({time.perf_counter() - started:.0f} s)")
+
+        counts = generator.generate(progress)
+        with connection.cursor() as cursor:
+            # Планировщику нужна статистика по новым данным
+            cursor.execute('ANALYZE')
+        self.stdout.write(', '.join(f'{name}: {count}' for name, count in counts.items()))
+        self.stdout.write(f'Done in {time.perf_counter() - started:.0f} s.')
@@ -0,0 +1,155 @@
+import logging
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import User
+from notifications.routing import websocket_urlpatterns
+from orders.models import DeletedPendingOrder, Order
+from service.models import Service
+
+
+POOL_URL = '/api/orders/courier/orders/?page_size=100'
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест принятия заказов: курьеры выбирают заказ из своей копии пула '
+        'и принимают его через API. Копия обновляется опросом списка раз в --poll-interval '
+        'секунд (poll) или событиями потока ws/orders/pool/ (stream). Время модельное: '
+        'попытки и новые заказы приходят пуассоновскими потоками. События потока рассылаются '
+        'после фиксации транзакции, поэтому данные создаются в базе и удаляются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, default=40)
+        parser.add_argument('--orders', type=int, default=150, help='Начальный размер пула')
+        parser.add_argument('--attempts', type=int, default=1500, help='Число попыток принять заказ')
+        parser.add_argument('--attempt-rate', type=float, default=5.0, help='Попыток в секунду на всех курьеров')
+        parser.add_argument('--order-rate', type=float, default=4.0, help='Новых заказов в секунду')
+        parser.add_argument('--poll-interval', type=float, default=30.0, help='Период опроса списка, сек')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # Отказы "уже назначен" ожидаемы и считаются в сводке, без записи в журнал
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        self.stdout.write(
+            f"{'mode':<8} {'accepted':>9} {'failed':>7} {'failed/acc':>11} {'requests':>9} "
+            f"{'req/acc':>8} {'seconds':>8}"
+        )
+        for mode in ('poll', 'stream'):
+            rng = random.Random(options['seed'])
+            client, couriers, service = self.seed(options, rng)
+            try:
+                started = time.perf_counter()
+                stats = async_to_sync(self.simulate)(mode, client, couriers, service, options, rng)
+                elapsed = time.perf_counter() - started
+            finally:
+                self.cleanup(client, couriers, service)
+            accepted = stats['accepted']
+            self.stdout.write(
+                f"{mode:<8} {accepted:>9} {stats['failed']:>7} {stats['failed'] / max(accepted, 1):>11.2f} "
+                f"{stats['requests']:>9} {stats['requests'] / max(accepted, 1):>8.2f} {elapsed:>8.1f}"
+            )
+
+    def seed(self, options, rng):
+        suffix = rng.random()
+        client = User.objects.create_user(f'load-client-{suffix}@example.com', 'Load', None, user_type='client')
+        couriers = User.objects.bulk_create([
+            User(email=f'load-courier-{suffix}-{i}@example.com', first_name='Load', user_type='courier')
+            for i in range(options['couriers'])
+        ])
+        service = Service.objects.create(name='Load test', slug=f'load-test-{suffix}', price=Decimal('100'))
+        Order.objects.bulk_create([
+            Order(service=service, customer=client, street='Тверская') for _ in range(options['orders'])
+        ])
+        return client, couriers, service
+
+    def cleanup(self, client, couriers, service):
+        ids = list(Order.objects.filter(customer=client).values_list('id', flat=True))
+        Order.objects.filter(pk__in=ids).delete()
+        DeletedPendingOrder.objects.filter(order_id__in=ids).delete()
+        User.objects.filter(pk__in=[client.pk, *(courier.pk for courier in couriers)]).delete()
+        service.delete()
+
+    async def simulate(self, mode, client, couriers, service, options, rng):
+        stats = Counter()
+        apis = {}
+        for courier in couriers:
+            apis[courier.id] = APIClient(SERVER_NAME='localhost')
+            apis[courier.id].force_authenticate(courier)
+
+        communicators = {}
+        if mode == 'stream':
+            application = URLRouter(websocket_urlpatterns)
+            for courier in couriers:
+                communicator = WebsocketCommunicator(
+                    application, f'/ws/orders/pool/?token={AccessToken.for_user(courier)}',
+                )
+                connected, _ = await communicator.connect()
+                assert connected
+                communicators[courier.id] = communicator
+
+        views = {}
+        for courier in couriers:
+            views[courier.id] = await self.fetch_pool(apis[courier.id], stats)
+        last_poll = dict.fromkeys(views, 0.0)
+
+        create_order = sync_to_async(Order.objects.create)
+        clock = 0.0
+        next_order_at = rng.expovariate(options['order_rate'])
+        for _ in range(options['attempts']):
+            clock += rng.expovariate(options['attempt_rate'])
+            while next_order_at <= clock:
+                await create_order(service=service, customer=client, street='Тверская')
+                next_order_at += rng.expovariate(options['order_rate'])
+
+            courier = rng.choice(couriers)
+            view = views[courier.id]
+            if mode == 'stream':
+                await self.apply_events(communicators[courier.id], view)
+            elif clock - last_poll[courier.id] >= options['poll_interval']:
+                view = views[courier.id] = await self.fetch_pool(apis[courier.id], stats)
+                last_poll[courier.id] = clock
+
+            if not view:
+                stats['idle'] += 1
+                continue
+            order_id = rng.choice(sorted(view))
+            response = await sync_to_async(apis[courier.id].patch)(f'/api/orders/courier/orders/{order_id}/assign/')
+            stats['requests'] += 1
+            stats['accepted' if response.status_code == 200 else 'failed'] += 1
+            view.discard(order_id)
+
+        for communicator in communicators.values():
+            await communicator.disconnect()
+        return stats
+
+    async def fetch_pool(self, api, stats):
+        """
+        Весь пул доступных заказов постранично, как при обновлении ленты.
+        """
+        ids = set()
+        url = POOL_URL
+        while url:
+            data = (await sync_to_async(api.get)(url)).data
+            stats['requests'] += 1
+            ids.update(order['id'] for order in data['results'])
+            url = data['next']
+        return ids
+
+    async def apply_events(self, communicator, view):
+        while not await communicator.receive_nothing(timeout=0.005, interval=0.001):
+            message = await communicator.receive_json_from()
+            if message['event'] in ('added', 'updated'):
+                view.add(message['order_id'])
+            else:
+                view.discard(message['order_id'])
@@ -0,0 +1,140 @@
+from datetime import date, datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import OrderStatusEvent
+
+
+TABLE = OrderStatusEvent._meta.db_table
+
+
+def month_start(day, offset=0):
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Секционирует журнал статусов заказов по месяцам (только PostgreSQL) '
+        'и создает секции на несколько месяцев вперед. Повторный запуск только '
+        'добавляет недостающие секции, поэтому команду удобно запускать по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning is supported on PostgreSQL only.')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            converting = not self.is_partitioned(cursor)
+            if converting:
+                first_month = self.convert(cursor)
+            else:
+                first_month = month_start(timezone.localdate())
+            last_month = month_start(timezone.localdate(), options['months_ahead'])
+
+            created = 0
+            month = first_month
+            while month <= last_month:
+                created += self.create_partition(cursor, month)
+                month = month_start(month, 1)
+            if converting:
+                self.copy_legacy(cursor)
+        self.stdout.write(f'Created {created} partition(s) of {TABLE}.')
+
+    def is_partitioned(self, cursor):
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+        return cursor.fetchone() is not None
+
+    def convert(self, cursor):
+        """
+        Пересоздает таблицу секционированной по created_at с теми же
+        индексами и внешними ключами. Прежняя таблица остается под именем
+        *_legacy до переноса записей. Возвращает первый месяц, для которого
+        нужна секция.
+        """
+        qn = connection.ops.quote_name
+        legacy = f'{TABLE}_legacy'
+
+        # Определения индексов и ключей читаем до переименования таблицы
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+
+        # Отложенные проверки внешних ключей не дают менять таблицу в той же транзакции
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} RENAME TO {qn(legacy)}')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {qn(name)}')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(name)}')
+        cursor.execute(f'ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(TABLE + "_pkey")}')
+
+        cursor.execute(
+            f'CREATE TABLE {qn(TABLE)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        # Ключ секционирования должен входить в первичный ключ
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(TABLE + "_pkey")} PRIMARY KEY (id, created_at)')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(name)} {definition}')
+        for _, definition in indexes:
+            cursor.execute(definition)
+        # Секция по умолчанию принимает записи вне созданных месяцев
+        cursor.execute(f'CREATE TABLE {qn(TABLE + "_default")} PARTITION OF {qn(TABLE)} DEFAULT')
+
+        cursor.execute(f'SELECT MIN(created_at) FROM {qn(legacy)}')
+        first_event = cursor.fetchone()[0]
+        return month_start(timezone.localdate(first_event) if first_event else timezone.localdate())
+
+    def copy_legacy(self, cursor):
+        qn = connection.ops.quote_name
+        legacy = f'{TABLE}_legacy'
+        cursor.execute(f'INSERT INTO {qn(TABLE)} SELECT * FROM {qn(legacy)}')
+        cursor.execute(f'SELECT MAX(id) FROM {qn(legacy)}')
+        last_id = cursor.fetchone()[0]
+        cursor.execute(f'DROP TABLE {qn(legacy)}')
+        # Новый столбец идентификации начинается с 1, продолжаем прежнюю нумерацию
+        if last_id is not None:
+            cursor.execute(f'ALTER TABLE {qn(TABLE)} ALTER COLUMN id RESTART WITH {int(last_id) + 1}')
+
+    def create_partition(self, cursor, month):
+        """
+        Создает секцию месяца, если ее еще нет. Записи этого месяца,
+        успевшие попасть в секцию по умолчанию, переносятся в новую секцию.
+        """
+        qn = connection.ops.quote_name
+        name = f'{TABLE}_y{month.year}m{month.month:02d}'
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return 0
+
+        start = timezone.make_aware(datetime.combine(month, datetime.min.time()))
+        end = timezone.make_aware(datetime.combine(month_start(month, 1), datetime.min.time()))
+        default = qn(TABLE + '_default')
+
+        cursor.execute(f'CREATE TEMPORARY TABLE moved_events (LIKE {qn(TABLE)}) ON COMMIT DROP')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO moved_events SELECT * FROM moved',
+            [start, end],
+        )
+        cursor.execute(
+            f'CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        cursor.execute(f'INSERT INTO {qn(TABLE)} SELECT * FROM moved_events')
+        cursor.execute('DROP TABLE moved_events')
+        return 1
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from orders.stats import rebuild_courier_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает суточную статистику курьеров по текущему состоянию заказов. '
+        'Нужна после первичного развертывания и после правок заказов в обход '
+        'курьерских эндпоинтов (админка, удаление заказа клиентом).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courier', type=int, action='append', dest='couriers',
+                            help='ID курьера; можно указать несколько раз')
+
+    def handle(self, *args, **options):
+        created = rebuild_courier_stats(options['couriers'])
+        self.stdout.write(self.style.SUCCESS(f'Создано строк статистики: {created}'))
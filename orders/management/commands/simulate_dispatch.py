@@ -0,0 +1,87 @@
+import random
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.dispatch import candidate_pairs, haversine_to_km, plan_assignments
+
+
+# Область Москвы в пределах МКАД: (min_lat, max_lat, min_lon, max_lon)
+AREA = (55.57, 55.91, 37.37, 37.84)
+
+
+def random_points(rng, count, hotspots=0):
+    """
+    Случайные точки в AREA. Если заданы hotspots, большая часть точек
+    скапливается вокруг стольких центров, как заказы в жилых районах.
+    """
+    min_lat, max_lat, min_lon, max_lon = AREA
+    centers = [(rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)) for _ in range(hotspots)]
+    points = []
+    for index in range(count):
+        if centers and rng.random() < 0.7:
+            center_lat, center_lon = rng.choice(centers)
+            latitude = min(max(rng.gauss(center_lat, 0.02), min_lat), max_lat)
+            longitude = min(max(rng.gauss(center_lon, 0.035), min_lon), max_lon)
+        else:
+            latitude, longitude = rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+        points.append((index, latitude, longitude))
+    return points
+
+
+def race_assignments(orders, couriers, max_distance_km, rng):
+    """
+    Текущее поведение: курьеры в случайном порядке забирают ближайший
+    свободный заказ из ленты, отсортированной по расстоянию.
+    """
+    nearest = defaultdict(list)
+    for haversine, courier_id, order_id in candidate_pairs(orders, couriers, max_distance_km):
+        nearest[courier_id].append((haversine, order_id))
+
+    arrival = [courier_id for courier_id, _, _ in couriers]
+    rng.shuffle(arrival)
+    taken_orders = set()
+    plan = []
+    for courier_id in arrival:
+        for haversine, order_id in sorted(nearest[courier_id]):
+            if order_id not in taken_orders:
+                taken_orders.add(order_id)
+                plan.append((courier_id, order_id, haversine_to_km(haversine)))
+                break
+    return plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Моделирует распределение заказов на случайных точках в Москве: сравнивает '
+        'пакетный распределитель с гонкой курьеров и замеряет время расчета.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--couriers', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10_000)
+        parser.add_argument('--hotspots', type=int, default=20)
+        parser.add_argument('--radius', type=float, default=settings.DISPATCH_MAX_DISTANCE_KM)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        orders = random_points(rng, options['orders'], options['hotspots'])
+        couriers = random_points(rng, options['couriers'])
+        radius = options['radius']
+
+        self.stdout.write(f'{len(couriers)} couriers, {len(orders)} orders, radius {radius} km')
+        self.stdout.write(f'{"strategy":<10} {"seconds":>8} {"matched":>8} {"mean km":>8} {"p90 km":>8}')
+        for name, solve in (
+            ('race', lambda: race_assignments(orders, couriers, radius, rng)),
+            ('batch', lambda: plan_assignments(orders, couriers, radius)),
+        ):
+            started = time.perf_counter()
+            plan = solve()
+            elapsed = time.perf_counter() - started
+            distances = sorted(distance for _, _, distance in plan)
+            mean = sum(distances) / len(distances) if distances else 0.0
+            p90 = distances[int(len(distances) * 0.9)] if distances else 0.0
+            self.stdout.write(f'{name:<10} {elapsed:>8.2f} {len(plan):>8} {mean:>8.2f} {p90:>8.2f}')
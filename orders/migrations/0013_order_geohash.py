@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+from orders.geo import encode_geohash
+
+
+def fill_geohash(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    orders = Order.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    batch = []
+    for order in orders.iterator(chunk_size=2000):
+        order.geohash = encode_geohash(order.latitude, order.longitude)
+        batch.append(order)
+        if len(batch) >= 2000:
+            Order.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Order.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0012_order_status_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 07:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0013_order_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_orders', models.IntegerField(default=0)),
+                ('completed_orders', models.IntegerField(default=0)),
+                ('cancelled_orders', models.IntegerField(default=0)),
+                ('earnings', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('courier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Статистика курьера за день',
+                'verbose_name_plural': 'Статистика курьеров по дням',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='courierdailystats',
+            constraint=models.UniqueConstraint(fields=('courier', 'date'), name='unique_courier_daily_stats'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 07:16
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0014_courierdailystats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
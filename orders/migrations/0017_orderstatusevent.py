@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 07:33
+
+from django.conf import settings
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0016_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('courier_assigned', 'Курьер назначен'), ('courier_on_the_way', 'Курьер в пути'), ('at_location', 'На месте выполнения'), ('courier_on_the_way_to_master', 'Курьер в пути к мастеру'), ('in_progress', 'В работе'), ('completed', 'Завершен'), ('cancelled', 'Отменен'), ('return', 'Возврат')], max_length=50)),
+                ('previous_status', models.CharField(blank=True, choices=[('pending', 'Ожидает'), ('courier_assigned', 'Курьер назначен'), ('courier_on_the_way', 'Курьер в пути'), ('at_location', 'На месте выполнения'), ('courier_on_the_way_to_master', 'Курьер в пути к мастеру'), ('in_progress', 'В работе'), ('completed', 'Завершен'), ('cancelled', 'Отменен'), ('return', 'Возврат')], max_length=50, null=True)),
+                ('dwell', models.DurationField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('courier', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Смена статуса заказа',
+                'verbose_name_plural': 'История статусов заказов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orderstatusevent',
+            index=models.Index(fields=['order', 'created_at', 'id'], name='order_event_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatusevent',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='order_event_created_brin'),
+        ),
+    ]
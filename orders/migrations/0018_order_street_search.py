@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 07:37
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0017_orderstatusevent'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='order',
+            name='street_search',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['street_search'], name='order_street_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
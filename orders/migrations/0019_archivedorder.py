@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-18 07:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('service', '0002_alter_attribute_options_alter_option_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0018_order_street_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderstatusevent',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='orders.order'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('city', models.CharField(max_length=100)),
+                ('street', models.CharField(max_length=255)),
+                ('building_num', models.CharField(blank=True, max_length=50, null=True)),
+                ('building', models.CharField(blank=True, max_length=50, null=True)),
+                ('floor', models.CharField(blank=True, max_length=50, null=True)),
+                ('apartment', models.CharField(blank=True, max_length=50, null=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('courier_assigned', 'Курьер назначен'), ('courier_on_the_way', 'Курьер в пути'), ('at_location', 'На месте выполнения'), ('courier_on_the_way_to_master', 'Курьер в пути к мастеру'), ('in_progress', 'В работе'), ('completed', 'Завершен'), ('cancelled', 'Отменен'), ('return', 'Возврат')], max_length=50)),
+                ('status_changed_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField()),
+                ('comment', models.TextField(blank=True, null=True)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='orders/images/%Y/%m/%d/')),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('courier', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders_as_courier', to=settings.AUTH_USER_MODEL)),
+                ('customer', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders_as_customer', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='service.service')),
+            ],
+            options={
+                'verbose_name': 'Архивный заказ',
+                'verbose_name_plural': 'Архив заказов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='archived_order_customer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['courier', 'status', 'created_at'], name='archived_order_courier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['created_at'], name='archived_order_created_idx'),
+        ),
+    ]
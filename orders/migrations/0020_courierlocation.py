@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 08:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_user_image'),
+        ('orders', '0019_archivedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourierLocation',
+            fields=[
+                ('courier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='location', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('latitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('longitude', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('updated_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Местоположение курьера',
+                'verbose_name_plural': 'Местоположения курьеров',
+            },
+        ),
+    ]
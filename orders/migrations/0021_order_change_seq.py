@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 08:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0020_courierlocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedPendingOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.BigIntegerField()),
+                ('change_seq', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Удаленный ожидающий заказ',
+                'verbose_name_plural': 'Удаленные ожидающие заказы',
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['change_seq'], name='order_change_seq_idx'),
+        ),
+    ]
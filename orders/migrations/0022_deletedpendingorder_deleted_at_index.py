@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 10:03
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_order_change_seq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deletedpendingorder',
+            name='deleted_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,37 +1,35 @@
-from django.db import models
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.db import models, transaction
 from django.utils import timezone
 from service.models import Service
 from authentication.models import User
+from .addresses import STREET_SEARCH_MAX_LENGTH, street_search_text
+from .geo import encode_geohash
 
 
-
-def clean_street_name(street: str, city: str) -> str:
+class TransactionId(models.Func):
     """
-    Удаляет название города, префиксы и лишние символы из названия улицы.
+    Номер текущей транзакции PostgreSQL. Номера растут монотонно и не
+    повторяются, по ним строится синхронизация пула (см. orders/sync.py).
     """
-    patterns_to_remove = [f"г {city}", "ул", "пр", "пл", "бул"]
-    clean_name = street
-
-    for pattern in patterns_to_remove:
-        clean_name = clean_name.replace(f"{pattern},", "").replace(pattern, "").strip()
+    template = 'pg_current_xact_id()::text::bigint'
+    output_field = models.BigIntegerField()
 
-    # Удаляем пробелы, если они остались после запятой
-    clean_name = clean_name.lstrip(",").strip()
-
-    return clean_name
 
 class Order(models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='orders')
-    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders_as_customer')
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders_as_customer', db_index=False)  # Покрыт индексом order_customer_created_idx
     city = models.CharField(max_length=100, default="Москва")
     street = models.CharField(max_length=255)  
+    street_search = models.CharField(max_length=STREET_SEARCH_MAX_LENGTH, blank=True, default='', editable=False)  # Нормализованная улица для поиска, см. street_search_text
     building_num = models.CharField(max_length=50, blank=True, null=True)  # Номер дома
     building = models.CharField(max_length=50, blank=True, null=True)  # Корпус
     floor = models.CharField(max_length=50, blank=True, null=True)  # Этаж
     apartment = models.CharField(max_length=50, blank=True, null=True)  # Квартира
     latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)  # Широта
     longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)  # Долгота
-    courier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders_as_courier')
+    geohash = models.CharField(max_length=12, blank=True, null=True, db_index=True, editable=False)  # Geohash координат для геопоиска
+    courier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders_as_courier', db_index=False)  # Покрыт индексом order_courier_status_idx
     STATUS_CHOICES = [
         ('pending', 'Ожидает'),
         ('courier_assigned', 'Курьер назначен'),
@@ -44,26 +42,228 @@ class Order(models.Model):
         ('return', 'Возврат'),  
     ]
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='pending')
-    status_changed_at = models.DateTimeField(auto_now=True)
+    status_changed_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     comment = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='orders/images/%Y/%m/%d/', blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    change_seq = models.BigIntegerField(default=0, editable=False)  # Транзакция последнего изменения в пуле, см. orders/sync.py
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            # Пул доступных заказов
+            models.Index(fields=['status', 'courier'], name='order_status_courier_idx'),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='pending', courier__isnull=True),
+                name='order_pending_pool_idx',
+            ),
+            # Назначенные и завершенные заказы курьера
+            models.Index(fields=['courier', 'status', 'created_at'], name='order_courier_status_idx'),
+            # Заказы клиента
+            models.Index(fields=['customer', 'created_at', 'id'], name='order_customer_created_idx'),
+            # Поиск по подстроке адреса (LIKE '%...%') через триграммы pg_trgm
+            GinIndex(fields=['street_search'], opclasses=['gin_trgm_ops'], name='order_street_search_trgm'),
+            # Изменения пула с маркера синхронизации
+            models.Index(fields=['change_seq'], name='order_change_seq_idx'),
+        ]
 
     
     def __str__(self):
         return f'Услуга: {self.service.name} - Клиент: {self.customer.first_name} - Дата: {self.created_at.strftime("%Y-%m-%d %H:%M:%S")}'
     
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        order.remember_saved_state()
+        return order
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_saved_state()
+
+    def remember_saved_state(self):
+        """
+        Запоминает статус и курьера, которые хранятся в базе, чтобы save()
+        замечал их смену без дополнительного запроса.
+        """
+        self._saved_status = self.__dict__.get('status')
+        self._saved_courier_id = self.__dict__.get('courier_id')
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            old_order = Order.objects.get(pk=self.pk)
-            if old_order.status != self.status:
-                self.status_changed_at = timezone.now()
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
         else:
+            self.geohash = None
+        self.street_search = street_search_text(self.street, self.city)
+
+        previous_status = getattr(self, '_saved_status', None)
+        previous_changed_at = self.status_changed_at
+        # Заказ входит в пул, выходит из него или меняется в нем
+        pool_change = 'pending' in (self.__dict__.get('status'), previous_status)
+        if pool_change:
+            self.change_seq = TransactionId()
+        if self._state.adding or ('status' in self.__dict__ and self.status != previous_status):
             self.status_changed_at = timezone.now()
-        super(Order, self).save(*args, **kwargs)
+            # Смена статуса сохраняется вместе с записью в журнал
+            with transaction.atomic(using=kwargs.get('using')):
+                super(Order, self).save(*args, **kwargs)
+                OrderStatusEvent.for_change(self, previous_status, previous_changed_at).save()
+        else:
+            super(Order, self).save(*args, **kwargs)
+        if pool_change:
+            # Значение знает только база: поле перечитается при обращении
+            del self.__dict__['change_seq']
+        self.remember_saved_state()
+
+
+class OrderStatusEvent(models.Model):
+    """
+    Журнал смен статуса заказа. Записи только добавляются: каждая хранит
+    новый и прежний статус и время, проведенное заказом в прежнем статусе,
+    поэтому длительности считаются без обращения к заказам (см. orders/history.py).
+    В PostgreSQL таблицу можно секционировать по месяцам командой
+    partition_status_events.
+    """
+    # Без ограничения в базе: при переносе заказа в архив (orders/archive.py) журнал остается
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events', db_index=False, db_constraint=False)  # Покрыт индексом order_event_timeline_idx
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES)
+    previous_status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES, blank=True, null=True)
+    courier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False)
+    dwell = models.DurationField(blank=True, null=True)  # Время в прежнем статусе
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Смена статуса заказа'
+        verbose_name_plural = 'История статусов заказов'
+        indexes = [
+            # История одного заказа
+            models.Index(fields=['order', 'created_at', 'id'], name='order_event_timeline_idx'),
+            # Выборки за период: журнал пишется по времени, BRIN почти ничего не занимает
+            BrinIndex(fields=['created_at'], name='order_event_created_brin'),
+        ]
+
+    def __str__(self):
+        return f'{self.order_id}: {self.previous_status} -> {self.status} ({self.created_at:%Y-%m-%d %H:%M:%S})'
+
+    @classmethod
+    def for_change(cls, order, previous_status, previous_changed_at):
+        """
+        Событие перехода заказа в его текущий статус в момент order.status_changed_at.
+        """
+        return cls(
+            order=order,
+            status=order.status,
+            previous_status=previous_status,
+            courier_id=order.courier_id,
+            dwell=order.status_changed_at - previous_changed_at if previous_status else None,
+            created_at=order.status_changed_at,
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order status events are append-only.")
+        super().save(*args, **kwargs)
+
+
+class ArchivedOrder(models.Model):
+    """
+    Архив завершенных, отмененных и возвращенных заказов. Записи переносятся
+    из Order командой archive_orders с прежними id и не меняются; списки
+    истории заказов читают архив только для страниц старше оперативных данных.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='archived_orders')
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders_as_customer', db_index=False)  # Покрыт индексом archived_order_customer_idx
+    city = models.CharField(max_length=100)
+    street = models.CharField(max_length=255)
+    building_num = models.CharField(max_length=50, blank=True, null=True)
+    building = models.CharField(max_length=50, blank=True, null=True)
+    floor = models.CharField(max_length=50, blank=True, null=True)
+    apartment = models.CharField(max_length=50, blank=True, null=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, blank=True, null=True)
+    courier = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_orders_as_courier', db_index=False)  # Покрыт индексом archived_order_courier_idx
+    status = models.CharField(max_length=50, choices=Order.STATUS_CHOICES)
+    status_changed_at = models.DateTimeField()
+    created_at = models.DateTimeField()
+    comment = models.TextField(blank=True, null=True)
+    image = models.ImageField(upload_to='orders/images/%Y/%m/%d/', blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Архивный заказ'
+        verbose_name_plural = 'Архив заказов'
+        indexes = [
+            models.Index(fields=['customer', 'created_at', 'id'], name='archived_order_customer_idx'),
+            models.Index(fields=['courier', 'status', 'created_at'], name='archived_order_courier_idx'),
+            # Граница архива: самый новый перенесенный заказ
+            models.Index(fields=['created_at'], name='archived_order_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'Архивный заказ {self.id} ({self.status})'
+
+
+class CourierDailyStats(models.Model):
+    """
+    Суточная сводка по заказам курьера. День определяется датой создания заказа.
+    Обновляется инкрементально при смене статуса (см. orders/stats.py)
+    и пересобирается командой rebuild_courier_stats.
+    """
+    courier = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    total_orders = models.IntegerField(default=0)
+    completed_orders = models.IntegerField(default=0)
+    cancelled_orders = models.IntegerField(default=0)
+    earnings = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Статистика курьера за день'
+        verbose_name_plural = 'Статистика курьеров по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['courier', 'date'], name='unique_courier_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f'{self.courier.email} - {self.date}: {self.completed_orders}/{self.total_orders}'
+
+
+class CourierLocation(models.Model):
+    """
+    Последнее известное местоположение курьера, которое присылает приложение.
+    По нему распределитель заказов (orders/dispatch.py) выбирает курьеров рядом с заказами.
+    """
+    courier = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='location')
+    latitude = models.DecimalField(max_digits=9, decimal_places=6)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Местоположение курьера'
+        verbose_name_plural = 'Местоположения курьеров'
+
+    def __str__(self):
+        return f'{self.courier_id}: {self.latitude}, {self.longitude} ({self.updated_at:%Y-%m-%d %H:%M:%S})'
+
+
+class DeletedPendingOrder(models.Model):
+    """
+    Отметка об удалении заказа из пула: удаленную строку синхронизация
+    пула (orders/sync.py) уже не увидит, поэтому удаление записывается сюда.
+    Отметки старше ORDER_SYNC_RETENTION_DAYS удаляет archive_orders.
+    """
+    order_id = models.BigIntegerField()
+    change_seq = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Удаленный ожидающий заказ'
+        verbose_name_plural = 'Удаленные ожидающие заказы'
+
+    def __str__(self):
+        return f'{self.order_id} ({self.deleted_at:%Y-%m-%d %H:%M:%S})'
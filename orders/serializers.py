@@ -1,9 +1,16 @@
+from decimal import ROUND_HALF_UP, Decimal
+from urllib.parse import urljoin
+
 from rest_framework import serializers
-from .models import Order
+from .models import CourierLocation, Order, OrderStatusEvent
 from service.models import Service
 from authentication.models import User
 
 
+# Точность хранения координат (DecimalField с 6 знаками после запятой)
+COORDINATE_PRECISION = Decimal('0.000001')
+
+
 class OrderSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Order.
@@ -16,13 +23,15 @@ class OrderSerializer(serializers.ModelSerializer):
         allow_null=True,
     )
     service_details = serializers.SerializerMethodField()
+    # Расстояние до курьера в км, присутствует только при поиске по координатам
+    distance = serializers.FloatField(read_only=True)
 
     class Meta:
         model = Order
         fields = [
             'id', 'service', 'service_details', 'customer', 'city', 'street', 'building_num',
             'building', 'floor', 'apartment', 'latitude', 'longitude', 'courier',
-            'status', 'status_changed_at', 'created_at', 'comment', 'image', 'price'
+            'status', 'status_changed_at', 'created_at', 'comment', 'image', 'price', 'distance'
         ]
         extra_kwargs = {
             'image': {'required': False},
@@ -32,6 +41,18 @@ class OrderSerializer(serializers.ModelSerializer):
             'price': {'read_only': True},   # Цена вычисляется на основе услуги
         }
 
+    @classmethod
+    def setup_queryset(cls, queryset):
+        """
+        Подгружает услугу одним JOIN и ограничивает выборку полями,
+        которые читает сериализатор.
+        """
+        model_fields = {field.name for field in Order._meta.concrete_fields}
+        fields = [name for name in cls.Meta.fields if name in model_fields]
+        return queryset.select_related('service').only(
+            *fields, 'service__name', 'service__description', 'service__price',
+        )
+
     def get_service_details(self, obj):
         """
         Возвращает детализированную информацию об услуге.
@@ -57,3 +78,131 @@ class OrderSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Only clients can create orders.")
         validated_data['customer'] = user
         return super().create(validated_data)
+
+
+class OrderStatusEventSerializer(serializers.ModelSerializer):
+    """
+    Запись истории статусов заказа. dwell - время в прежнем статусе.
+    """
+
+    class Meta:
+        model = OrderStatusEvent
+        fields = ['status', 'previous_status', 'courier', 'dwell', 'created_at']
+
+
+class StatusChangeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.CharField()
+
+
+class BulkStatusUpdateSerializer(serializers.Serializer):
+    """
+    Пакет смен статуса: {"orders": [{"id": 1, "status": "..."}, ...]}.
+    """
+    MAX_ORDERS = 100
+
+    orders = StatusChangeSerializer(many=True, allow_empty=False)
+
+    def validate_orders(self, value):
+        if len(value) > self.MAX_ORDERS:
+            raise serializers.ValidationError(f"No more than {self.MAX_ORDERS} orders per request.")
+        ids = [item['id'] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each order may appear only once.")
+        return value
+
+
+class CourierLocationSerializer(serializers.ModelSerializer):
+    """
+    Местоположение курьера. Координаты округляются до 6 знаков, как в заказах.
+    """
+    latitude = serializers.DecimalField(max_digits=None, decimal_places=None, min_value=-90, max_value=90)
+    longitude = serializers.DecimalField(max_digits=None, decimal_places=None, min_value=-180, max_value=180)
+
+    class Meta:
+        model = CourierLocation
+        fields = ['latitude', 'longitude', 'updated_at']
+        read_only_fields = ['updated_at']
+
+    def validate(self, attrs):
+        return {
+            field: value.quantize(COORDINATE_PRECISION, rounding=ROUND_HALF_UP)
+            for field, value in attrs.items()
+        }
+
+
+# Поля values()-выборки для быстрой сериализации списков заказов
+ORDER_ROW_FIELDS = (
+    'id', 'service_id', 'service__name', 'service__description', 'service__price', 'customer_id',
+    'city', 'street', 'building_num', 'building', 'floor', 'apartment', 'latitude', 'longitude',
+    'courier_id', 'status', 'status_changed_at', 'created_at', 'comment', 'image', 'price',
+)
+
+_datetime_field = serializers.DateTimeField()
+_coordinate_field = serializers.DecimalField(max_digits=9, decimal_places=6)
+_price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+def order_rows(queryset):
+    """
+    Превращает queryset заказов в values()-выборку для serialize_order_rows.
+    """
+    fields = ORDER_ROW_FIELDS
+    if 'distance' in queryset.query.annotations:
+        fields += ('distance',)
+    return queryset.values(*fields)
+
+
+def _decimal(field, value):
+    return None if value is None else field.to_representation(value)
+
+
+def serialize_order_rows(rows, request=None, base_url=None):
+    """
+    Быстрый путь сериализации списка заказов: строит словари напрямую из
+    строк values(), без экземпляров моделей и обхода полей DRF на каждую строку.
+    Результат совпадает с OrderSerializer(many=True).data.
+
+    Ссылки на изображения абсолютные по адресу запроса, а без запроса
+    (сообщения потока пула) - по base_url.
+    """
+    storage = Order._meta.get_field('image').storage
+    data = []
+    for row in rows:
+        image = None
+        if row['image']:
+            image = storage.url(row['image'])
+            if request is not None:
+                image = request.build_absolute_uri(image)
+            elif base_url:
+                image = urljoin(base_url, image)
+
+        item = {
+            'id': row['id'],
+            'service': row['service_id'],
+            'service_details': {
+                'name': row['service__name'],
+                'description': row['service__description'],
+                'price': row['service__price'],
+            },
+            'customer': row['customer_id'],
+            'city': row['city'],
+            'street': row['street'],
+            'building_num': row['building_num'],
+            'building': row['building'],
+            'floor': row['floor'],
+            'apartment': row['apartment'],
+            'latitude': _decimal(_coordinate_field, row['latitude']),
+            'longitude': _decimal(_coordinate_field, row['longitude']),
+            'courier': row['courier_id'],
+            'status': row['status'],
+            'status_changed_at': _datetime_field.to_representation(row['status_changed_at']),
+            'created_at': _datetime_field.to_representation(row['created_at']),
+            'comment': row['comment'],
+            'image': image,
+            'price': _decimal(_price_field, row['price']),
+        }
+        if 'distance' in row:
+            item['distance'] = row['distance']
+        data.append(item)
+    return data
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shoe_service.cache import PENDING_ORDERS_SCOPE, bump_generation_on_commit, invalidate_user_cache_on_commit
+from .models import DeletedPendingOrder, Order, TransactionId
+from .sync import publish_pool_change_on_commit
+
+
+@receiver(post_save, sender=Order)
+def invalidate_cache_on_order_save(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш клиента, курьера и прежнего курьера заказа,
+    а также версию пула, если заказ в него входит или входил;
+    изменение пула рассылается подписанным курьерам.
+    """
+    invalidate_user_cache_on_commit(
+        instance.customer_id,
+        instance.courier_id,
+        getattr(instance, '_saved_courier_id', None),
+    )
+    previous_status = getattr(instance, '_saved_status', None)
+    if 'pending' in (instance.status, previous_status):
+        bump_generation_on_commit(PENDING_ORDERS_SCOPE)
+        publish_pool_change_on_commit(instance, previous_status, getattr(instance, '_saved_courier_id', None))
+
+
+@receiver(post_delete, sender=Order)
+def invalidate_cache_on_order_delete(sender, instance, **kwargs):
+    invalidate_user_cache_on_commit(instance.customer_id, instance.courier_id)
+    if instance.status == 'pending':
+        # Удаленный заказ синхронизация пула узнает по отметке (см. orders/sync.py)
+        DeletedPendingOrder.objects.create(order_id=instance.pk, change_seq=TransactionId())
+        bump_generation_on_commit(PENDING_ORDERS_SCOPE)
+        publish_pool_change_on_commit(instance, instance.status, instance.courier_id, deleted=True)
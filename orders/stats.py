@@ -0,0 +1,144 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from shoe_service.bulk_load import copy_rows
+from .models import ArchivedOrder, CourierDailyStats, Order
+
+
+def _contribution(courier_id, status, price):
+    """
+    Вклад одного заказа в суточную сводку курьера.
+    """
+    if courier_id is None:
+        return None
+    completed = status == 'completed'
+    return {
+        'total_orders': 1,
+        'completed_orders': 1 if completed else 0,
+        'cancelled_orders': 1 if status == 'cancelled' else 0,
+        'earnings': price if completed else Decimal('0'),
+    }
+
+
+def _apply(courier_id, day, values, sign):
+    CourierDailyStats.objects.bulk_create(
+        [CourierDailyStats(courier_id=courier_id, date=day)],
+        ignore_conflicts=True,
+    )
+    CourierDailyStats.objects.filter(courier_id=courier_id, date=day).update(**{
+        field: F(field) + sign * value for field, value in values.items()
+    })
+
+
+def record_order_change(order, previous_courier_id, previous_status):
+    """
+    Переносит изменение курьера или статуса заказа в суточную сводку:
+    вычитает прежний вклад заказа и добавляет новый.
+    """
+    record_order_changes([(order, previous_courier_id, previous_status)])
+
+
+def record_order_changes(changes):
+    """
+    То же для нескольких заказов сразу: changes - последовательность
+    (order, previous_courier_id, previous_status). Изменения суммируются
+    по курьеру и дню, поэтому на каждую пару приходится одно обновление.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for order, previous_courier_id, previous_status in changes:
+        if previous_courier_id == order.courier_id and previous_status == order.status:
+            continue
+        day = timezone.localdate(order.created_at)
+        for courier_id, status, sign in (
+            (previous_courier_id, previous_status, -1),
+            (order.courier_id, order.status, 1),
+        ):
+            contribution = _contribution(courier_id, status, order.price)
+            if contribution:
+                for field, value in contribution.items():
+                    deltas[courier_id, day][field] += sign * value
+
+    with transaction.atomic():
+        for (courier_id, day), delta in deltas.items():
+            if any(delta.values()):
+                _apply(courier_id, day, delta, 1)
+
+
+def rebuild_courier_stats(courier_ids=None):
+    """
+    Пересобирает суточную сводку по текущему состоянию заказов, включая архив.
+    Возвращает количество созданных строк.
+    """
+    stats = CourierDailyStats.objects.all()
+    if courier_ids is not None:
+        stats = stats.filter(courier_id__in=courier_ids)
+
+    totals = defaultdict(lambda: defaultdict(int))
+    for model in (Order, ArchivedOrder):
+        orders = model.objects.filter(courier__isnull=False)
+        if courier_ids is not None:
+            orders = orders.filter(courier_id__in=courier_ids)
+        rows = (
+            orders
+            .annotate(day=TruncDate('created_at'))
+            .values('courier_id', 'day')
+            .annotate(
+                total=Count('id'),
+                completed=Count('id', filter=Q(status='completed')),
+                cancelled=Count('id', filter=Q(status='cancelled')),
+                earned=Sum('price', filter=Q(status='completed')),
+            )
+            .order_by()
+        )
+        for row in rows.iterator(chunk_size=2000):
+            day = totals[row['courier_id'], row['day']]
+            day['total'] += row['total']
+            day['completed'] += row['completed']
+            day['cancelled'] += row['cancelled']
+            day['earned'] += row['earned'] or Decimal('0')
+
+    with transaction.atomic():
+        stats.delete()
+        # Строк может быть сотни тысяч: пишутся через COPY без объектов модели
+        copy_rows(
+            CourierDailyStats,
+            ('courier_id', 'date', 'total_orders', 'completed_orders', 'cancelled_orders', 'earnings'),
+            (
+                (courier_id, day, row['total'], row['completed'], row['cancelled'], row['earned'])
+                for (courier_id, day), row in totals.items()
+            ),
+        )
+    return len(totals)
+
+
+def get_courier_statistics(courier, date_from, date_to):
+    """
+    Собирает статистику курьера за период [date_from, date_to]
+    из суточной сводки: не более одной строки на каждый день.
+    """
+    rows = {
+        row.date: row
+        for row in CourierDailyStats.objects.filter(courier=courier, date__range=(date_from, date_to))
+    }
+
+    orders_by_day = []
+    day = date_from
+    while day <= date_to:
+        row = rows.get(day)
+        orders_by_day.append({'date': day.isoformat(), 'count': row.total_orders if row else 0})
+        day += timedelta(days=1)
+
+    return {
+        'totalOrders': sum(row.total_orders for row in rows.values()),
+        'completedOrders': sum(row.completed_orders for row in rows.values()),
+        'cancelledOrders': sum(row.cancelled_orders for row in rows.values()),
+        'rating': None,  # Рейтинги курьеров пока не хранятся
+        'earnings': sum((row.earnings for row in rows.values()), Decimal('0')),
+        'ordersByDay': orders_by_day,
+    }
@@ -0,0 +1,176 @@
+"""
+Инкрементальная синхронизация пула ожидающих заказов.
+
+Каждая запись, после которой заказ вошел в пул, вышел из него или
+изменился в нем, сохраняет в Order.change_seq номер своей транзакции.
+Номера растут монотонно, но транзакции фиксируются не по порядку номеров,
+поэтому маркер синхронизации - это xmin снимка базы: все транзакции
+с меньшим номером уже завершены. Изменения с маркера выбираются условием
+change_seq >= маркер по индексу order_change_seq_idx. Транзакция, которая
+не успела завершиться к прошлому запросу, попадет в следующий ответ,
+а заказ, измененный ею, может прийти дважды - клиент применяет изменения
+повторно без вреда.
+
+Отсюда ограничение: маркер не обгоняет незавершенную транзакцию, которая
+уже что-то записала. Импорт bulk_import и генератор generate_dataset пишут
+все одной транзакцией, и пока они работают, каждый запрос changes
+перечитывает изменения с их начала, а набрав больше ORDER_SYNC_MAX_CHANGES,
+отвечает reset - курьеры заново загружают весь список. Такие команды
+запускаются вне пиковой нагрузки.
+
+Курьеры, подключенные к ws/orders/pool/, получают те же изменения сразу:
+переходы статусов и сохранение заказов публикуют событие после фиксации
+транзакции (publish_pool_change_on_commit).
+
+Удаленные из пула заказы отмечаются в DeletedPendingOrder. Отметки
+хранятся ORDER_SYNC_RETENTION_DAYS дней (prune_deleted_pending_orders),
+поэтому маркер хранит время выдачи и действует столько же: по более
+старому маркеру клиент получает reset.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from notifications.utils import send_pool_change
+from .models import DeletedPendingOrder, Order
+from .serializers import order_rows, serialize_order_rows
+
+
+def current_sync_position():
+    """
+    Наименьший номер транзакции, которая еще может зафиксироваться.
+    Берется до выборки изменений, поэтому выборка видит все транзакции
+    с меньшими номерами.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def current_transaction_id():
+    """
+    Номер текущей транзакции - значение TransactionId для записей,
+    которые пишутся в обход ORM (импорт, генератор данных).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_current_xact_id()::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def encode_sync_token(position, issued_at=None):
+    issued_at = issued_at or timezone.now()
+    return base64.urlsafe_b64encode(f'v2|{position}|{int(issued_at.timestamp())}'.encode()).decode()
+
+
+def decode_sync_token(token):
+    """
+    Позиция и время выдачи из маркера encode_sync_token. У маркеров
+    первой версии времени выдачи нет (None). Для испорченного маркера -
+    ValueError.
+    """
+    try:
+        version, position, *issued_at = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(token)
+    if (version, len(issued_at)) not in (('v1', 0), ('v2', 1)):
+        raise ValueError(token)
+    if issued_at:
+        return int(position), datetime.fromtimestamp(int(issued_at[0]), dt_timezone.utc)
+    return int(position), None
+
+
+def sync_retention_cutoff(now=None):
+    return (now or timezone.now()) - timedelta(days=settings.ORDER_SYNC_RETENTION_DAYS)
+
+
+def sync_token_expired(issued_at, now=None):
+    """
+    Отметки удалений для маркера могли быть уже удалены: маркер старше срока
+    хранения или выдан до его введения.
+    """
+    return issued_at is None or issued_at < sync_retention_cutoff(now)
+
+
+def prune_deleted_pending_orders(now=None):
+    """
+    Удаляет отметки удаленных заказов старше срока хранения и возвращает
+    их число. Запас в сутки покрывает транзакции, которые записали отметку
+    раньше, чем был выдан маркер, а зафиксировались позже.
+    """
+    cutoff = sync_retention_cutoff(now) - timedelta(days=1)
+    deleted, _ = DeletedPendingOrder.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
+
+
+def pool_changes(since, limit=None):
+    """
+    Изменения пула с позиции since: (заказы, которые сейчас в пуле,
+    id заказов, вышедших из пула или удаленных). Заказы возвращаются
+    queryset'ом для order_rows.
+
+    Если изменений больше limit (по умолчанию ORDER_SYNC_MAX_CHANGES),
+    возвращает None: клиенту дешевле заново загрузить весь список.
+    """
+    limit = limit or settings.ORDER_SYNC_MAX_CHANGES
+    changed = list(
+        Order.objects
+        .filter(change_seq__gte=since)
+        .values_list('id', 'status', 'courier_id')[:limit + 1]
+    )
+    deleted = list(
+        DeletedPendingOrder.objects
+        .filter(change_seq__gte=since)
+        .values_list('order_id', flat=True)[:limit + 1]
+    )
+    if len(changed) + len(deleted) > limit:
+        return None
+
+    pending = [pk for pk, status, courier_id in changed if status == 'pending' and courier_id is None]
+    removed = {pk for pk, status, courier_id in changed if status != 'pending' or courier_id is not None}
+    removed.update(deleted)
+    return Order.objects.filter(pk__in=pending).order_by('created_at', 'id'), sorted(removed)
+
+
+def pool_event(previous_status, previous_courier_id, status, courier_id, deleted=False):
+    """
+    Событие потока пула для изменения заказа или None, если пул не изменился:
+    added - заказ появился в пуле, updated - изменился в нем, taken - его
+    принял курьер, cancelled - заказ отменен или удален.
+    """
+    was_in_pool = previous_status == 'pending' and previous_courier_id is None
+    in_pool = not deleted and status == 'pending' and courier_id is None
+    if in_pool:
+        return 'updated' if was_in_pool else 'added'
+    if was_in_pool:
+        return 'taken' if not deleted and courier_id is not None else 'cancelled'
+    return None
+
+
+def publish_pool_change_on_commit(order, previous_status, previous_courier_id, deleted=False):
+    """
+    После фиксации транзакции рассылает курьерам событие пула для заказа.
+    Для added и updated событие содержит заказ в формате списка; запроса
+    нет, поэтому ссылки на изображения строятся по PUBLIC_BASE_URL.
+    """
+    event = pool_event(previous_status, previous_courier_id, order.status, order.courier_id, deleted)
+    if event is None:
+        return
+    order_id = order.pk
+
+    def publish():
+        message = {'event': event, 'order_id': order_id}
+        if event in ('added', 'updated'):
+            rows = serialize_order_rows(order_rows(
+                Order.objects.filter(pk=order_id, status='pending', courier__isnull=True)
+            ), base_url=settings.PUBLIC_BASE_URL)
+            if not rows:
+                # Заказ уже покинул пул, об этом будет свое событие
+                return
+            message['order'] = rows[0]
+        send_pool_change(message)
+
+    transaction.on_commit(publish)
@@ -0,0 +1,327 @@
+"""
+Генератор синтетических данных для замеров производительности
+(команда generate_dataset).
+
+Все случайные значения берутся из random.Random(seed), поэтому при
+одинаковых параметрах получается одинаковый набор данных; от запуска
+к запуску меняются только первичные ключи и даты, которые отсчитываются
+от начала текущего часа. Заказы и связанные с ними записи пишутся
+строками через COPY (shoe_service.bulk_load.copy_rows) без создания
+объектов моделей, вычисляемые поля адресов (geohash, street_search)
+считаются один раз на адрес из пула. Нужен PostgreSQL: ключи строк
+выделяются из последовательностей заранее (allocate_ids). Набор пишется
+одной транзакцией, и пока она открыта, маркер синхронизации пула
+не сдвигается (см. orders/sync.py).
+"""
+import random
+from bisect import bisect
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from authentication.models import User
+from notifications.broadcasts import create_read_states
+from notifications.models import Notification
+from service.models import Attribute, Option, Service, ServiceAttribute, ServiceOption
+from shoe_service.bulk_load import allocate_ids, chunked, copy_rows
+from shoe_service.cache import (
+    CATALOG_SCOPE, PENDING_ORDERS_SCOPE, bump_generation_on_commit, change_unread_counts_on_commit,
+)
+from .addresses import street_search_texts
+from .geo import encode_geohash
+from .models import Order, OrderStatusEvent
+from .stats import rebuild_courier_stats
+from .sync import current_transaction_id
+from .transitions import STATUS_FLOW
+
+
+# Заказов в одной пачке записи
+DATASET_CHUNK_SIZE = 50_000
+
+# Центр и разброс координат заказов: большая часть внутри МКАД
+MOSCOW_CENTER = (55.7558, 37.6173)
+MOSCOW_SPREAD = (0.07, 0.12)
+MOSCOW_BOUNDS = ((55.57, 55.91), (37.37, 37.84))
+
+MOSCOW_STREETS = (
+    'ул. Тверская', 'ул. Арбат', 'Ленинский пр-т', 'пр-т Мира', 'ул. Профсоюзная',
+    'Ленинградский пр-т', 'ул. Новый Арбат', 'Кутузовский пр-т', 'ул. Большая Якиманка',
+    'ул. Пятницкая', 'ул. Мясницкая', 'ул. Покровка', 'ул. Маросейка', 'ул. Сретенка',
+    'Варшавское ш.', 'Каширское ш.', 'Дмитровское ш.', 'Волоколамское ш.', 'ул. Бутырская',
+    'ул. Люблинская', 'ул. Братиславская', 'ул. Митинская', 'ул. Академика Янгеля',
+    'Рязанский пр-т', 'ул. Вавилова', 'Мичуринский пр-т', 'ул. Удальцова', 'ул. Остоженка',
+    'ул. Пречистенка', 'Комсомольский пр-т', 'ул. Садовая-Кудринская', 'ул. Земляной Вал',
+    'ул. Большая Дмитровка', 'ул. Петровка', 'ул. Неглинная', 'ул. Краснопрудная',
+    'ул. Бауманская', 'ул. Первомайская', 'Щелковское ш.', 'ул. Академика Королёва',
+)
+
+# Пользователи: поля строк и значения
+USER_FIELDS = (
+    'id', 'email', 'first_name', 'last_name', 'phone', 'user_type', 'is_active', 'is_staff', 'is_superuser',
+    'password', 'image',
+)
+FIRST_NAMES = ('Анна', 'Мария', 'Елена', 'Ольга', 'Иван', 'Алексей', 'Дмитрий', 'Сергей', 'Наталья', 'Павел')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Михайлов')
+
+# Услуги каталога: (название, базовая цена)
+SERVICE_NAMES = (
+    ('Чистка обуви', 700), ('Химчистка кроссовок', 1500), ('Замена набоек', 600),
+    ('Ремонт подошвы', 1800), ('Замена молнии', 1200), ('Покраска обуви', 2500),
+    ('Растяжка обуви', 800), ('Прошивка', 1000), ('Реставрация каблука', 1600),
+    ('Профилактика подошвы', 900), ('Чистка сумки', 2000), ('Замена супинатора', 1400),
+)
+SERVICE_ATTRIBUTES = {
+    'Материал': ('Кожа', 'Замша', 'Нубук', 'Текстиль', 'Лак'),
+    'Тип обуви': ('Кроссовки', 'Туфли', 'Ботинки', 'Сапоги', 'Сандалии'),
+}
+SERVICE_OPTIONS = {
+    'Срочность': ('Обычно', 'За 24 часа', 'За 3 часа'),
+    'Размер': ('До 38', '38-42', 'Больше 42'),
+}
+
+# Заказы моложе ACTIVE_AGE еще выполняются, старше - завершены
+ACTIVE_AGE = timedelta(hours=6)
+# Доли статусов выполняемых и завершенных заказов
+ACTIVE_STATUS_WEIGHTS = (
+    ('pending', 30), ('courier_assigned', 20), ('courier_on_the_way', 12), ('at_location', 8),
+    ('courier_on_the_way_to_master', 10), ('in_progress', 20),
+)
+FINISHED_STATUS_WEIGHTS = (('completed', 86), ('cancelled', 11), ('return', 3))
+
+# Цепочка статусов заказа до завершения
+STATUS_CHAIN = ('pending', *STATUS_FLOW, 'completed')
+
+# Статусы, о которых клиент получает уведомление того же типа
+STATUS_NOTIFICATION_TYPES = Notification.CLIENT_NOTIFICATION_TYPES & set(dict(Order.STATUS_CHOICES))
+
+ORDER_FIELDS = (
+    'id', 'service_id', 'customer_id', 'city', 'street', 'street_search', 'building_num', 'building',
+    'floor', 'apartment', 'latitude', 'longitude', 'geohash', 'courier_id', 'status',
+    'status_changed_at', 'created_at', 'comment', 'image', 'price', 'change_seq',
+)
+EVENT_FIELDS = ('order_id', 'status', 'previous_status', 'courier_id', 'dwell', 'created_at')
+NOTIFICATION_FIELDS = ('recipient_id', 'order_id', 'type', 'title', 'message', 'created_at', 'is_read')
+NOTIFICATION_TITLES = dict(Notification.NOTIFICATION_TYPES)
+
+
+def _weighted(weights):
+    """
+    Функция выбора значения с весами по случайному числу из [0, 1).
+    """
+    values = [value for value, _ in weights]
+    bounds = list(accumulate(weight for _, weight in weights))
+    total = bounds[-1]
+    return lambda r: values[bisect(bounds, r * total)]
+
+
+class DatasetGenerator:
+    """
+    Создает users пользователей (доля курьеров courier_ratio), services
+    услуг с атрибутами и опциями, orders заказов за последние days дней
+    и в среднем notifications_per_order уведомлений на заказ. С history
+    у заказа пишется вся цепочка смен статуса, без нее - одна запись
+    о текущем статусе, как при импорте.
+    """
+
+    def __init__(self, seed=0, users=10_000, courier_ratio=0.1, services=12, orders=100_000, days=365,
+                 notifications_per_order=1.0, history=False, prefix='synthetic', password='synthetic-password',
+                 chunk_size=DATASET_CHUNK_SIZE):
+        self.rng = random.Random(seed)
+        self.users = users
+        self.courier_ratio = courier_ratio
+        self.services = services
+        self.orders = orders
+        self.days = days
+        self.notifications_per_order = notifications_per_order
+        self.history = history
+        self.prefix = prefix
+        self.password = password
+        self.chunk_size = chunk_size
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        self.active_status = _weighted(ACTIVE_STATUS_WEIGHTS)
+        self.finished_status = _weighted(FINISHED_STATUS_WEIGHTS)
+
+    def generate(self, progress=None):
+        """
+        Создает набор данных в одной транзакции и возвращает число
+        созданных строк по моделям. progress(count) вызывается после
+        каждой пачки заказов с числом уже записанных заказов.
+        """
+        counts = {}
+        with transaction.atomic():
+            self.change_seq = current_transaction_id()
+            self.clients, self.couriers = self.create_users()
+            counts['users'] = len(self.clients) + len(self.couriers)
+            self.catalog = self.create_services()
+            counts['services'] = len(self.catalog)
+            self.addresses = self.address_pool(min(max(self.orders // 20, 1), 100_000))
+
+            counts.update(orders=0, status_events=0, notifications=0)
+            unread = Counter()
+            for numbers in chunked(range(self.orders), self.chunk_size):
+                orders, events, notifications = self.order_chunk(numbers)
+                copy_rows(Order, ORDER_FIELDS, orders, self.chunk_size)
+                copy_rows(OrderStatusEvent, EVENT_FIELDS, events, self.chunk_size)
+                copy_rows(Notification, NOTIFICATION_FIELDS, notifications, self.chunk_size)
+                unread.update(row[0] for row in notifications if not row[-1])
+                counts['orders'] += len(orders)
+                counts['status_events'] += len(events)
+                counts['notifications'] += len(notifications)
+                if progress:
+                    progress(counts['orders'])
+
+            counts['courier_stats'] = rebuild_courier_stats(self.couriers)
+            # Каталог, пул и уведомления изменены в обход сигналов
+            bump_generation_on_commit(CATALOG_SCOPE, PENDING_ORDERS_SCOPE)
+            change_unread_counts_on_commit(unread)
+        return counts
+
+    def create_users(self):
+        """
+        Пользователи с общим паролем: хэш считается один раз.
+        Возвращает id клиентов и курьеров.
+        """
+        password = make_password(self.password)
+        couriers = round(self.users * self.courier_ratio)
+        rows = []
+        for number in range(self.users):
+            user_type = 'courier' if number < couriers else 'client'
+            rows.append((
+                f'{self.prefix}-{user_type}-{number}@example.com', self.rng.choice(FIRST_NAMES),
+                self.rng.choice(LAST_NAMES), f'+7916{self.rng.randrange(10 ** 7):07d}', user_type,
+                True, False, False, password, '',
+            ))
+        ids = allocate_ids(User, len(rows))
+        copy_rows(User, USER_FIELDS, [(pk, *row) for pk, row in zip(ids, rows)])
+        create_read_states(ids)
+        return ids[couriers:], ids[:couriers]
+
+    def create_services(self):
+        """
+        Услуги с атрибутами и опциями. Возвращает [(id, цена)].
+        """
+        attributes = [Attribute.objects.get_or_create(name=name)[0] for name in SERVICE_ATTRIBUTES]
+        options = [Option.objects.get_or_create(name=name)[0] for name in SERVICE_OPTIONS]
+        services = []
+        for number in range(self.services):
+            name, price = SERVICE_NAMES[number % len(SERVICE_NAMES)]
+            if number >= len(SERVICE_NAMES):
+                name = f'{name} {number // len(SERVICE_NAMES) + 1}'
+            services.append(Service(
+                name=name, slug=f'{self.prefix}-service-{number}', description=f'{name}: синтетическая услуга',
+                price=Decimal(price + 50 * self.rng.randrange(-4, 5)),
+            ))
+        services = Service.objects.bulk_create(services)
+        ServiceAttribute.objects.bulk_create([
+            ServiceAttribute(service=service, attribute=attribute, value=self.rng.choice(SERVICE_ATTRIBUTES[attribute.name]))
+            for service in services for attribute in attributes
+        ])
+        ServiceOption.objects.bulk_create([
+            ServiceOption(service=service, option=option, value=value)
+            for service in services for option in options for value in SERVICE_OPTIONS[option.name]
+        ])
+        return [(service.id, service.price) for service in services]
+
+    def address_pool(self, size):
+        """
+        Адреса заказов: улица, дом и координаты вокруг центра Москвы
+        с вычисленными geohash и street_search.
+        """
+        streets = [self.rng.choice(MOSCOW_STREETS) for _ in range(size)]
+        searches = street_search_texts(streets, 'Москва')
+        (lat_min, lat_max), (lon_min, lon_max) = MOSCOW_BOUNDS
+        pool = []
+        for street, search in zip(streets, searches):
+            latitude = min(max(self.rng.gauss(MOSCOW_CENTER[0], MOSCOW_SPREAD[0]), lat_min), lat_max)
+            longitude = min(max(self.rng.gauss(MOSCOW_CENTER[1], MOSCOW_SPREAD[1]), lon_min), lon_max)
+            latitude, longitude = Decimal(f'{latitude:.6f}'), Decimal(f'{longitude:.6f}')
+            pool.append((
+                street, search, str(self.rng.randint(1, 150)), str(self.rng.randint(1, 4)) if self.rng.random() < 0.3 else None,
+                latitude, longitude, encode_geohash(latitude, longitude),
+            ))
+        return pool
+
+    def order_chunk(self, numbers):
+        """
+        Строки заказов с номерами numbers (по возрастанию даты создания),
+        их журнала статусов и уведомлений.
+        """
+        rng = self.rng
+        ids = allocate_ids(Order, len(numbers))
+        span = timedelta(days=self.days)
+        step = span / max(self.orders, 1)
+        start = self.now - span
+        orders, events, notifications = [], [], []
+        for pk, number in zip(ids, numbers):
+            created_at = start + step * (number + rng.random())
+            age = self.now - created_at
+            if age < ACTIVE_AGE:
+                status = self.active_status(rng.random())
+                changed_at = created_at if status == 'pending' else created_at + age * rng.random()
+            else:
+                status = self.finished_status(rng.random())
+                changed_at = min(created_at + timedelta(minutes=rng.randint(30, 72 * 60)), self.now)
+
+            # Постоянные клиенты заказывают чаще: квадрат смещает выбор к началу списка
+            customer_id = self.clients[int(len(self.clients) * rng.random() ** 2)]
+            chain = self.status_chain(status)
+            courier_id = None
+            if 'courier_assigned' in chain:
+                if self.couriers:
+                    courier_id = rng.choice(self.couriers)
+                else:
+                    status, chain = 'cancelled', ('pending', 'cancelled')
+            service_id, price = self.catalog[rng.randrange(len(self.catalog))]
+            street, search, building_num, building, latitude, longitude, geohash = rng.choice(self.addresses)
+            orders.append((
+                pk, service_id, customer_id, 'Москва', street, search, building_num, building,
+                str(rng.randint(1, 25)), str(rng.randint(1, 400)), latitude, longitude, geohash, courier_id,
+                status, changed_at, created_at, 'Позвонить за час' if rng.random() < 0.1 else None, '', price,
+                self.change_seq if status == 'pending' else 0,
+            ))
+
+            if self.history:
+                times = sorted(created_at + (changed_at - created_at) * rng.random() for _ in chain[1:-1])
+                times = [created_at, *times, changed_at] if len(chain) > 1 else [changed_at]
+            else:
+                chain, times = chain[-1:], [changed_at]
+            previous = previous_at = None
+            for event_status, event_at in zip(chain, times):
+                events.append((
+                    pk, event_status, previous, None if event_status == 'pending' else courier_id,
+                    event_at - previous_at if previous else None, event_at,
+                ))
+                previous, previous_at = event_status, event_at
+
+            count = int(self.notifications_per_order) + (rng.random() < self.notifications_per_order % 1)
+            for _ in range(count):
+                notifications.append(self.notification(pk, customer_id, courier_id, status, changed_at))
+        return orders, events, notifications
+
+    def status_chain(self, status):
+        """
+        Статусы, через которые заказ прошел до status.
+        """
+        if status in STATUS_CHAIN:
+            return STATUS_CHAIN[:STATUS_CHAIN.index(status) + 1]
+        if status == 'return':
+            return (*STATUS_CHAIN[:-1], 'return')
+        # Отмена до или после назначения курьера
+        return (*STATUS_CHAIN[:self.rng.randint(1, 2)], 'cancelled')
+
+    def notification(self, order_id, customer_id, courier_id, status, changed_at):
+        rng = self.rng
+        if courier_id is not None and rng.random() < 0.3:
+            recipient_id, notification_type = courier_id, 'new_order'
+        else:
+            recipient_id = customer_id
+            notification_type = status if status in STATUS_NOTIFICATION_TYPES else 'system'
+        title = NOTIFICATION_TITLES[notification_type]
+        is_read = rng.random() < (0.95 if self.now - changed_at > timedelta(days=2) else 0.5)
+        return (recipient_id, order_id, notification_type, title, f'{title}: заказ №{order_id}', changed_at, is_read)
+
@@ -1,3 +1,1568 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import random
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import User
+from notifications.broadcasts import send_broadcast, visible_broadcasts
+from notifications.counters import get_unread_count
+from notifications.models import BroadcastNotification, Notification, NotificationOutbox
+from notifications.outbox import deliver_pending
+from service.models import Service
+from shoe_service.cache import NOTIFICATIONS_SCOPE, PENDING_ORDERS_SCOPE, bump_generation, get_generation
+from shoe_service.testing import QueryPlanMixin, asgi_get, postgresql_only
+from .geo import bounding_box, encode_geohash, geohash_cover, haversine_km, nearby_orders
+from . import transitions
+from .archive import archive_horizon
+from .benchmarks import ENDPOINTS, LATENCY_SLACK_MS, find_regressions, run_benchmarks
+from .dispatch import dispatch_pending_orders, plan_assignments
+from .addresses import clean_street_name, clean_street_names, street_search_text, street_search_texts
+from .history import dwell_time_percentiles, order_timeline
+from .models import ArchivedOrder, CourierDailyStats, CourierLocation, DeletedPendingOrder, Order, OrderStatusEvent
+from .serializers import OrderSerializer, order_rows, serialize_order_rows
+from .imports import COURIER_STATUSES
+from .sync import current_sync_position, decode_sync_token, encode_sync_token, pool_changes
+from .synthetic import DatasetGenerator
+
+
+# Красная площадь
+CENTER = (55.753930, 37.620795)
+
+
+class GeoTestCase(TestCase):
+    """
+    Тесты геохэширования и отбора кандидатов по области.
+    """
+
+    def test_encode_geohash(self):
+        self.assertEqual(encode_geohash(42.605, -5.603, 5), 'ezs42')
+        self.assertEqual(encode_geohash(42.605, -5.603), encode_geohash(42.605, -5.603, 12)[:9])
+
+    def test_cover_contains_points_inside_radius(self):
+        box = bounding_box(*CENTER, 3)
+        cells = geohash_cover(*box)
+        self.assertLessEqual(len(cells), 16)
+        for lat, lon in [(55.77, 37.62), (55.74, 37.60), (55.753930, 37.66)]:
+            self.assertLess(haversine_km(*CENTER, lat, lon), 3)
+            geohash = encode_geohash(lat, lon)
+            self.assertTrue(any(geohash.startswith(cell) for cell in cells))
+
+
+class CourierOrderFeedTestCase(TestCase):
+    """
+    Тесты фильтрации и сортировки доступных заказов по расстоянию.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', 'pass', user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.near = self.create_order(55.755, 37.622)     # ~0.1 км
+        self.middle = self.create_order(55.780, 37.620)   # ~2.9 км
+        self.far = self.create_order(55.900, 37.620)      # ~16 км
+        self.no_coords = self.create_order(None, None)
+        self.api = APIClient()
+        self.api.force_authenticate(self.courier)
+
+    def create_order(self, latitude, longitude):
+        return Order.objects.create(
+            service=self.service,
+            customer=self.client_user,
+            street='Тверская',
+            latitude=latitude,
+            longitude=longitude,
+        )
+
+    def get_ids(self, **params):
+        response = self.api.get('/api/orders/courier/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return [order['id'] for order in response.data['results']]
+
+    def test_geohash_is_maintained_on_save(self):
+        self.assertEqual(self.near.geohash, encode_geohash(55.755, 37.622))
+        self.assertIsNone(self.no_coords.geohash)
+        self.near.latitude = None
+        self.near.save()
+        self.assertIsNone(self.near.geohash)
+
+    def test_distance_filter(self):
+        ids = self.get_ids(latitude=CENTER[0], longitude=CENTER[1], distance=5, sort_by='distance_asc')
+        self.assertEqual(ids, [self.near.id, self.middle.id])
+
+    def test_distance_sort_without_radius(self):
+        ids = self.get_ids(latitude=CENTER[0], longitude=CENTER[1], sort_by='distance_desc')
+        self.assertEqual(ids, [self.far.id, self.middle.id, self.near.id, self.no_coords.id])
+
+    def test_distance_is_serialized(self):
+        response = self.api.get('/api/orders/courier/orders/', {
+            'latitude': CENTER[0], 'longitude': CENTER[1], 'distance': 1,
+        })
+        self.assertAlmostEqual(response.data['results'][0]['distance'], 0.14, places=1)
+        self.assertNotIn('distance', self.api.get('/api/orders/courier/orders/').data['results'][0])
+
+    def test_matches_python_haversine(self):
+        queryset = nearby_orders(Order.objects.all(), *CENTER, 20)
+        for order in queryset:
+            expected = haversine_km(*CENTER, order.latitude, order.longitude)
+            self.assertAlmostEqual(order.distance, expected, places=6)
+
+    def test_invalid_parameters(self):
+        url = '/api/orders/courier/orders/'
+        self.assertEqual(self.api.get(url, {'distance': 5}).status_code, 400)
+        self.assertEqual(self.api.get(url, {'sort_by': 'distance_asc'}).status_code, 400)
+        self.assertEqual(self.api.get(url, {'sort_by': 'price'}).status_code, 400)
+        self.assertEqual(self.api.get(url, {'latitude': 'abc', 'longitude': 37}).status_code, 400)
+        for distance in ('nan', 'inf', '-inf'):
+            params = {'latitude': CENTER[0], 'longitude': CENTER[1], 'distance': distance}
+            self.assertEqual(self.api.get(url, params).status_code, 400)
+
+    def test_search(self):
+        self.middle.street = 'ул. Покровка'
+        self.middle.save()
+        self.far.street = 'Ленинский Проспект'
+        self.far.save()
+        self.assertEqual(self.middle.street_search, 'покровка')
+
+        self.assertEqual(self.get_ids(search='ПОКРОВ'), [self.middle.id])
+        self.assertEqual(self.get_ids(search='  ленинский  '), [self.far.id])
+        self.assertEqual(
+            self.get_ids(search='тверская', latitude=CENTER[0], longitude=CENTER[1], distance=5),
+            [self.near.id],
+        )
+
+    def test_long_street_with_commas(self):
+        # Очистка расширяет запятые: 252 знака превращаются в 278
+        street = 'Тверская,' * 28
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        response = api.post('/api/orders/client/orders/', {'service': self.service.id, 'street': street})
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(len(order.street_search), 255)
+        self.assertEqual(street_search_texts([street], 'Москва'), [order.street_search])
+        self.assertIn(order.id, self.get_ids(search='тверская, тверская'))
+
+    def test_backfill_street_search(self):
+        Order.objects.update(street_search='')
+        call_command('backfill_street_search', batch_size=2, stdout=StringIO())
+        self.assertEqual(set(Order.objects.values_list('street_search', flat=True)), {'тверская'})
+
+    def test_backfill_all_recomputes_filled_rows(self):
+        Order.objects.filter(pk=self.near.pk).update(street_search='. тверская')
+        call_command('backfill_street_search', stdout=StringIO())
+        self.assertEqual(Order.objects.get(pk=self.near.pk).street_search, '. тверская')
+        call_command('backfill_street_search', all=True, stdout=StringIO())
+        self.assertEqual(Order.objects.get(pk=self.near.pk).street_search, 'тверская')
+
+
+class StreetNormalizerTestCase(SimpleTestCase):
+    """
+    Тесты нормализации названий улиц на эталонных адресах из testdata.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        path = Path(__file__).resolve().parent / 'testdata' / 'moscow_streets.tsv'
+        with path.open(encoding='utf-8') as file:
+            cls.rows = [
+                line.rstrip('\n').split('\t')
+                for line in file
+                if line.strip() and not line.startswith('#')
+            ]
+
+    def test_golden_file(self):
+        for city, street, expected in self.rows:
+            with self.subTest(street=street):
+                self.assertEqual(clean_street_name(street, city), expected)
+
+    @mock.patch('orders.addresses.CLEAN_CHUNK_SIZE', 7)
+    def test_batch_matches_single(self):
+        cities = {city for city, _, _ in self.rows}
+        for city in cities:
+            streets = [street for row_city, street, _ in self.rows if row_city == city]
+            # Повторы обрабатываются один раз, но возвращаются на своих местах
+            streets = streets + streets[::-1]
+            self.assertEqual(
+                clean_street_names(streets, city),
+                [clean_street_name(street, city) for street in streets],
+            )
+            self.assertEqual(
+                street_search_texts(streets, city),
+                [street_search_text(street, city) for street in streets],
+            )
+
+    def test_words_inside_names_are_kept(self):
+        self.assertEqual(clean_street_name('Пулковская ул.', 'Москва'), 'Пулковская')
+        self.assertEqual(clean_street_name('Московское ш.', 'Москва'), 'Московское')
+        self.assertEqual(clean_street_name('Садовая-Кудринская ул.', 'Москва'), 'Садовая-Кудринская')
+        self.assertEqual(clean_street_name('ул. Б. Ордынка', 'Москва'), 'Б. Ордынка')
+
+    def test_edge_cases(self):
+        self.assertEqual(clean_street_names([], 'Москва'), [])
+        self.assertEqual(clean_street_name('', 'Москва'), '')
+        self.assertEqual(clean_street_name('г Москва, ул.', 'Москва'), '')
+        # Перевод строки внутри адреса не сдвигает остальные адреса пачки
+        self.assertEqual(clean_street_names(['ул. Тверская\n5', 'Покровка'], 'Москва'), ['Тверская 5', 'Покровка'])
+        self.assertEqual(clean_street_name('Тверская\xa0ул.,,  д.\t5 ;', 'Москва'), 'Тверская, д. 5')
+
+
+class CourierStatisticsTestCase(TestCase):
+    """
+    Тесты суточной сводки курьера и эндпоинта статистики.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', 'pass', user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+        self.api.force_authenticate(self.courier)
+
+    def create_order(self, price='700.00'):
+        return Order.objects.create(
+            service=self.service, customer=self.client_user, street='Тверская', price=Decimal(price),
+        )
+
+    def complete(self, order):
+        self.api.patch(f'/api/orders/courier/orders/{order.id}/assign/')
+        for status in ['courier_on_the_way', 'at_location', 'courier_on_the_way_to_master',
+                       'in_progress', 'completed']:
+            response = self.api.patch(f'/api/orders/courier/orders/{order.id}/update_status/', {'status': status})
+            self.assertEqual(response.status_code, 200)
+
+    def snapshot(self):
+        return list(CourierDailyStats.objects.values_list(
+            'courier_id', 'date', 'total_orders', 'completed_orders', 'cancelled_orders', 'earnings',
+        ).order_by('courier_id', 'date'))
+
+    def test_transitions_update_rollup(self):
+        self.complete(self.create_order())
+        unassigned = self.create_order()
+        self.api.patch(f'/api/orders/courier/orders/{unassigned.id}/assign/')
+        self.api.patch(f'/api/orders/courier/orders/{unassigned.id}/unassign/')
+        self.api.patch(f'/api/orders/courier/orders/{self.create_order().id}/assign/')
+
+        stats = CourierDailyStats.objects.get(courier=self.courier)
+        self.assertEqual((stats.total_orders, stats.completed_orders), (2, 1))
+        self.assertEqual(stats.earnings, Decimal('700.00'))
+
+    def test_rebuild_matches_incremental(self):
+        self.complete(self.create_order())
+        self.api.patch(f'/api/orders/courier/orders/{self.create_order().id}/assign/')
+        incremental = self.snapshot()
+
+        CourierDailyStats.objects.all().delete()
+        call_command('rebuild_courier_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_endpoint_reads_rollup_only(self):
+        self.complete(self.create_order())
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            response = self.api.get('/api/orders/courier/statistics/', {'date_from': today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totalOrders'], 1)
+        self.assertEqual(response.data['completedOrders'], 1)
+        self.assertEqual(response.data['earnings'], Decimal('700.00'))
+        self.assertEqual(response.data['ordersByDay'], [{'date': today.isoformat(), 'count': 1}])
+
+    def test_completed_orders_are_paginated(self):
+        for _ in range(3):
+            self.complete(self.create_order())
+        response = self.api.get('/api/orders/courier/orders/completed_orders/', {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotIn('count', response.data)
+        response = self.api.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+        response = self.api.get('/api/orders/courier/orders/completed_orders/', {'page': 1})
+        self.assertEqual(response.data['count'], 3)
+
+    def test_endpoint_validation(self):
+        url = '/api/orders/courier/statistics/'
+        self.assertEqual(len(self.api.get(url).data['ordersByDay']), 30)
+        self.assertEqual(self.api.get(url, {'date_from': '2024-13-01'}).status_code, 400)
+        self.assertEqual(self.api.get(url, {'date_from': '2024-02-01', 'date_to': '2024-01-01'}).status_code, 400)
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(url).status_code, 403)
+
+
+class OrderTransitionsTestCase(TestCase):
+    """
+    Тесты машины состояний заказа.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', 'pass', user_type='courier')
+        self.other = User.objects.create_user('other@example.com', 'Other', 'pass', user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.order = Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+
+    def test_save_does_not_reload_order(self):
+        order = Order.objects.get(pk=self.order.pk)
+        changed_at = order.status_changed_at
+        order.comment = 'Позвонить заранее'
+        with self.assertNumQueries(1):
+            order.save()
+        self.assertEqual(order.status_changed_at, changed_at)
+
+        order.status = 'cancelled'
+        order.save()
+        self.assertGreater(order.status_changed_at, changed_at)
+
+    def test_stale_instance_is_rejected(self):
+        first = Order.objects.get(pk=self.order.pk)
+        second = Order.objects.get(pk=self.order.pk)
+        transitions.assign(first, self.courier)
+        with self.assertRaises(transitions.TransitionError):
+            transitions.assign(second, self.other)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.courier, self.courier)
+
+    def test_transition_is_single_update(self):
+        order = Order.objects.get(pk=self.order.pk)
+        with CaptureQueriesContext(connection) as context:
+            transitions.assign(order, self.courier)
+        order_queries = [query['sql'] for query in context.captured_queries if '"orders_order"' in query['sql']]
+        self.assertEqual(len(order_queries), 1)
+        self.assertTrue(order_queries[0].startswith('UPDATE'))
+        self.assertIn('"status_changed_at"', order_queries[0])
+        self.assertIn('"courier_id" IS NULL', order_queries[0])
+
+    def test_revert_window(self):
+        transitions.assign(self.order, self.courier)
+        transitions.change_status(self.order, self.courier, 'courier_on_the_way')
+        Order.objects.filter(pk=self.order.pk).update(status_changed_at=timezone.now() - timedelta(minutes=11))
+        order = Order.objects.get(pk=self.order.pk)
+        with self.assertRaisesMessage(transitions.TransitionError, 'Time to revert status has expired.'):
+            transitions.change_status(order, self.courier, 'courier_assigned')
+        with self.assertRaises(transitions.TransitionForbidden):
+            transitions.change_status(order, self.other, 'at_location')
+        with self.assertRaisesMessage(transitions.TransitionError, 'Invalid status transition.'):
+            transitions.change_status(order, self.courier, 'completed')
+
+
+class BulkStatusUpdateTestCase(TestCase):
+    """
+    Тесты пакетного обновления статусов курьером.
+    """
+    url = '/api/orders/courier/orders/bulk_update_status/'
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.other = User.objects.create_user('other@example.com', 'Other', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+        self.api.force_authenticate(self.courier)
+
+    def assigned_orders(self, count, courier=None):
+        orders = []
+        for _ in range(count):
+            order = Order.objects.create(
+                service=self.service, customer=self.client_user, street='Тверская', price=self.service.price,
+            )
+            transitions.assign(order, courier or self.courier)
+            orders.append(order)
+        return orders
+
+    def test_per_item_results(self):
+        first, second = self.assigned_orders(2)
+        foreign, = self.assigned_orders(1, courier=self.other)
+        response = self.api.patch(self.url, {'orders': [
+            {'id': first.id, 'status': 'courier_on_the_way'},
+            {'id': second.id, 'status': 'completed'},
+            {'id': foreign.id, 'status': 'courier_on_the_way'},
+            {'id': 0, 'status': 'courier_on_the_way'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['status_code'] for item in response.data['results']], [200, 400, 403, 404])
+        self.assertEqual(
+            dict(Order.objects.filter(pk__in=[first.id, second.id, foreign.id]).values_list('id', 'status')),
+            {first.id: 'courier_on_the_way', second.id: 'courier_assigned', foreign.id: 'courier_assigned'},
+        )
+        deliver_pending()
+        notifications = Notification.objects.filter(type='courier_on_the_way')
+        self.assertEqual([(n.recipient_id, n.order_id) for n in notifications], [(self.client_user.id, first.id)])
+
+    def test_queries_do_not_grow_with_batch(self):
+        def patch(orders):
+            payload = {'orders': [{'id': order.id, 'status': 'courier_on_the_way'} for order in orders]}
+            with CaptureQueriesContext(connection) as context:
+                response = self.api.patch(self.url, payload, format='json')
+            self.assertTrue(all(item['status_code'] == 200 for item in response.data['results']))
+            return len(context.captured_queries)
+
+        self.assertEqual(patch(self.assigned_orders(2)), patch(self.assigned_orders(8)))
+        deliver_pending()
+        self.assertEqual(Notification.objects.filter(type='courier_on_the_way').count(), 10)
+
+    def test_revert_and_stats(self):
+        orders = self.assigned_orders(3)
+        for status in ('courier_on_the_way', 'at_location', 'courier_on_the_way_to_master', 'in_progress'):
+            self.api.patch(self.url, {'orders': [{'id': order.id, 'status': status} for order in orders]}, format='json')
+        deliver_pending()
+        notified = Notification.objects.count()
+
+        response = self.api.patch(self.url, {'orders': [
+            {'id': orders[0].id, 'status': 'courier_on_the_way_to_master'},
+            {'id': orders[1].id, 'status': 'completed'},
+            {'id': orders[2].id, 'status': 'completed'},
+        ]}, format='json')
+        self.assertTrue(all(item['status_code'] == 200 for item in response.data['results']))
+        deliver_pending()
+        # Откат не порождает уведомления
+        self.assertEqual(Notification.objects.count(), notified + 2)
+
+        stats = CourierDailyStats.objects.get(courier=self.courier)
+        self.assertEqual((stats.total_orders, stats.completed_orders, stats.earnings), (3, 2, Decimal('1000.00')))
+
+    def test_invalid_payload(self):
+        order, = self.assigned_orders(1)
+        duplicate = {'orders': [{'id': order.id, 'status': 'courier_on_the_way'}] * 2}
+        self.assertEqual(self.api.patch(self.url, duplicate, format='json').status_code, 400)
+        self.assertEqual(self.api.patch(self.url, {'orders': []}, format='json').status_code, 400)
+
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.patch(self.url, {'orders': [{'id': order.id, 'status': 'completed'}]},
+                                        format='json').status_code, 403)
+
+
+class OrderStatusHistoryTestCase(TestCase):
+    """
+    Тесты журнала статусов заказов.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.order = Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+        self.api = APIClient()
+
+    def test_every_transition_is_logged(self):
+        transitions.assign(self.order, self.courier)
+        transitions.change_status(self.order, self.courier, 'courier_on_the_way')
+        transitions.change_status_bulk(self.courier, [(self.order.id, 'at_location')])
+        self.order.refresh_from_db()
+        self.order.status = 'cancelled'
+        self.order.save()
+
+        events = list(self.order.status_events.order_by('created_at', 'id'))
+        self.assertEqual(
+            [(event.previous_status, event.status) for event in events],
+            [(None, 'pending'), ('pending', 'courier_assigned'), ('courier_assigned', 'courier_on_the_way'),
+             ('courier_on_the_way', 'at_location'), ('at_location', 'cancelled')],
+        )
+        self.assertIsNone(events[0].dwell)
+        for previous, event in zip(events, events[1:]):
+            self.assertEqual(event.dwell, event.created_at - previous.created_at)
+        self.assertEqual(events[1].courier, self.courier)
+        self.assertEqual(events[-1].created_at, self.order.status_changed_at)
+
+        with self.assertRaises(ValueError):
+            events[0].save()
+
+    def test_history_endpoint(self):
+        transitions.assign(self.order, self.courier)
+        url = f'/api/orders/client/orders/{self.order.id}/history/'
+        self.api.force_authenticate(self.client_user)
+        response = self.api.get(url)
+        self.assertEqual([item['status'] for item in response.data], ['pending', 'courier_assigned'])
+
+        other = User.objects.create_user('other@example.com', 'Other', None, user_type='client')
+        self.api.force_authenticate(other)
+        self.assertEqual(self.api.get(url).status_code, 404)
+
+    def test_dwell_time_percentiles(self):
+        now = timezone.now()
+        OrderStatusEvent.objects.bulk_create([
+            OrderStatusEvent(order=self.order, previous_status='at_location', status='courier_on_the_way_to_master',
+                             dwell=timedelta(minutes=minutes), created_at=now)
+            for minutes in range(1, 101)
+        ] + [
+            # Вне периода
+            OrderStatusEvent(order=self.order, previous_status='at_location', status='courier_on_the_way_to_master',
+                             dwell=timedelta(hours=10), created_at=now - timedelta(days=40)),
+        ])
+        with CaptureQueriesContext(connection) as context:
+            rows = dwell_time_percentiles(now - timedelta(days=1), now + timedelta(days=1))
+        self.assertNotIn('"orders_order"', context.captured_queries[0]['sql'])
+
+        at_location, = [row for row in rows if row['status'] == 'at_location']
+        self.assertEqual(at_location['count'], 100)
+        self.assertAlmostEqual(at_location['p50'], 50.5 * 60)
+        self.assertAlmostEqual(at_location['p99'], 99.01 * 60)
+
+        url = '/api/orders/statistics/dwell-times/'
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(url).status_code, 403)
+        admin = User.objects.create_superuser('admin@example.com', 'pass')
+        self.api.force_authenticate(admin)
+        response = self.api.get(url, {'status': 'at_location'})
+        self.assertEqual([row['count'] for row in response.data['statuses']], [100])
+
+    @postgresql_only
+    def test_monthly_partitioning(self):
+        transitions.assign(self.order, self.courier)
+        old_event = OrderStatusEvent.objects.create(
+            order=self.order, status='pending', created_at=timezone.now() - timedelta(days=70),
+        )
+        call_command('partition_status_events', months_ahead=2, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_inherits WHERE inhparent = 'orders_orderstatusevent'::regclass"
+            )
+            partitions = cursor.fetchone()[0]
+        # Секция по умолчанию и месяцы от самого старого события до двух месяцев вперед
+        self.assertGreaterEqual(partitions, 6)
+
+        self.assertEqual(self.order.status_events.count(), 3)
+        transitions.change_status(self.order, self.courier, 'courier_on_the_way')
+        self.assertGreater(self.order.status_events.latest('id').id, old_event.id)
+        self.assertEqual([event.status for event in order_timeline(self.order.id)][-1], 'courier_on_the_way')
+
+        output = StringIO()
+        call_command('partition_status_events', months_ahead=2, stdout=output)
+        self.assertIn('Created 0 partition(s)', output.getvalue())
+
+
+class ConcurrentAssignTestCase(TransactionTestCase):
+    """
+    Параллельные попытки принять один заказ: выигрывает ровно один курьер.
+    """
+    ATTEMPTS = 200
+    WORKERS = 32
+
+    def test_parallel_assign(self):
+        client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        order = Order.objects.create(service=service, customer=client_user, street='Тверская')
+        couriers = User.objects.bulk_create([
+            User(email=f'courier{i}@example.com', first_name='Courier', user_type='courier')
+            for i in range(self.ATTEMPTS)
+        ])
+
+        def attempt(courier):
+            try:
+                api = APIClient()
+                api.force_authenticate(courier)
+                return api.patch(f'/api/orders/courier/orders/{order.id}/assign/').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+            codes = list(executor.map(attempt, couriers))
+
+        self.assertEqual(codes.count(200), 1)
+        self.assertEqual(codes.count(400), self.ATTEMPTS - 1)
+        order.refresh_from_db()
+        winner = couriers[codes.index(200)]
+        self.assertEqual((order.status, order.courier_id), ('courier_assigned', winner.id))
+        self.assertEqual(CourierDailyStats.objects.get().total_orders, 1)
+
+
+class OrderListQueriesTestCase(TestCase):
+    """
+    Списки заказов выполняются за постоянное число запросов и совпадают
+    с выводом OrderSerializer.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', 'pass', user_type='courier')
+        services = [Service.objects.create(name=f'Услуга {i}', price=Decimal('100.50')) for i in range(5)]
+        orders = Order.objects.bulk_create([
+            Order(
+                service=services[i % 5], customer=self.client_user, street='Тверская',
+                latitude=Decimal('55.75') if i % 2 else None, longitude=Decimal('37.62') if i % 2 else None,
+                image='orders/images/photo.jpg' if i % 3 else None, comment='Позвонить',
+            )
+            for i in range(60)
+        ])
+        Order.objects.filter(id__in=[order.id for order in orders[:30]]).update(courier=self.courier, status='completed')
+        self.api = APIClient()
+        # Граница архива кэшируется для всех запросов сразу
+        cache.clear()
+        archive_horizon()
+
+    def test_constant_query_count(self):
+        cases = [
+            (self.client_user, '/api/orders/client/orders/', 1),
+            (self.courier, '/api/orders/courier/orders/', 1),
+            (self.courier, '/api/orders/courier/orders/completed_orders/', 1),
+            (self.courier, '/api/orders/courier/orders/assigned_orders/', 1),
+            (self.client_user, '/api/orders/client/orders/?page=1', 2),
+        ]
+        for user, url, queries in cases:
+            self.api.force_authenticate(user)
+            for page_size in (5, 50):
+                with self.subTest(url=url, page_size=page_size), self.assertNumQueries(queries):
+                    separator = '&' if '?' in url else '?'
+                    self.assertEqual(self.api.get(f'{url}{separator}page_size={page_size}').status_code, 200)
+
+    def test_detail_uses_single_query(self):
+        self.api.force_authenticate(self.client_user)
+        order = Order.objects.filter(customer=self.client_user).first()
+        with self.assertNumQueries(1):
+            self.api.get(f'/api/orders/client/orders/{order.id}/')
+
+    def test_rows_match_serializer(self):
+        request = APIRequestFactory().get('/')
+        queryset = OrderSerializer.setup_queryset(Order.objects.order_by('id'))
+        expected = OrderSerializer(queryset, many=True, context={'request': request}).data
+        self.assertEqual(serialize_order_rows(order_rows(queryset), request), expected)
+
+        nearby = nearby_orders(queryset, *CENTER)
+        expected = OrderSerializer(nearby, many=True, context={'request': request}).data
+        self.assertEqual(serialize_order_rows(order_rows(nearby), request), expected)
+
+
+@postgresql_only
+class OrderArchiveTestCase(TestCase):
+    """
+    Тесты переноса старых заказов в архив и чтения истории вместе с архивом.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', 'pass', user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+        now = timezone.now()
+        # Заказы созданы по дню друг за другом, самый новый - первый
+        self.orders = []
+        for days, status, changed_days in [
+            (1, 'pending', 1),
+            (200, 'completed', 190),
+            (201, 'pending', 201),       # Старый, но не завершенный: остается в таблице
+            (202, 'cancelled', 195),
+            (203, 'completed', 10),      # Завершен недавно: остается в таблице
+            (204, 'return', 200),
+        ]:
+            order = Order.objects.create(
+                service=self.service, customer=self.client_user, courier=self.courier, street='Тверская', price=self.service.price,
+            )
+            Order.objects.filter(pk=order.pk).update(
+                status=status, created_at=now - timedelta(days=days), status_changed_at=now - timedelta(days=changed_days),
+            )
+            self.orders.append(order)
+        self.archived_ids = {self.orders[1].id, self.orders[3].id, self.orders[5].id}
+        self.notification = Notification.objects.create(
+            recipient=self.client_user, order=self.orders[1], type='completed', title='Готово', message='Заказ выполнен',
+        )
+
+    def archive(self, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_orders', stdout=StringIO(), **options)
+
+    def get_all_pages(self, url, **params):
+        ids = []
+        response = self.api.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [order['id'] for order in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.api.get(response.data['next'])
+
+    def test_archive_moves_old_finished_orders(self):
+        self.archive(batch_size=2)
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', flat=True)), self.archived_ids)
+        self.assertFalse(Order.objects.filter(id__in=self.archived_ids).exists())
+        self.assertEqual(Order.objects.count(), 3)
+
+        archived = ArchivedOrder.objects.get(pk=self.orders[1].id)
+        self.assertEqual((archived.status, archived.street, archived.price), ('completed', 'Тверская', Decimal('500.00')))
+        # Журнал статусов остается, уведомления отвязываются от заказа
+        self.assertTrue(OrderStatusEvent.objects.filter(order_id=self.orders[1].id).exists())
+        self.notification.refresh_from_db()
+        self.assertIsNone(self.notification.order_id)
+        self.assertEqual(archive_horizon(), archived.created_at)
+
+        # Повторный запуск продолжает с того же места и ничего не дублирует
+        self.archive()
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+
+    def test_archive_order_created_through_api(self):
+        # Заказ из API ставит в очередь new_order, воркер создает общее уведомление
+        self.api.force_authenticate(self.client_user)
+        response = self.api.post('/api/orders/client/orders/', {'service': self.service.id, 'street': 'Тверская'})
+        self.assertEqual(response.status_code, 201)
+        deliver_pending()
+        broadcast = BroadcastNotification.objects.get(order_id=response.data['id'])
+        Order.objects.filter(pk=response.data['id']).update(
+            status='completed', status_changed_at=timezone.now() - timedelta(days=190),
+        )
+
+        self.archive()
+        self.assertTrue(ArchivedOrder.objects.filter(pk=response.data['id']).exists())
+        broadcast.refresh_from_db()
+        self.assertIsNone(broadcast.order_id)
+        # Отложенные ограничения внешних ключей проверяются как при фиксации
+        connection.check_constraints()
+
+    def test_archive_removes_outbox_entries(self):
+        # Недоставленная запись и запись с исчерпанными попытками
+        NotificationOutbox.objects.create(order=self.orders[1], type='completed', title='Готово', message='Текст')
+        NotificationOutbox.objects.create(
+            order=self.orders[3], type='cancelled', title='Отмена', message='Текст', attempts=8, failed_at=timezone.now(),
+        )
+        self.archive()
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        connection.check_constraints()
+
+    def test_rebuild_stats_counts_archive(self):
+        self.archive()
+        call_command('rebuild_courier_stats', stdout=StringIO())
+        totals = CourierDailyStats.objects.aggregate(total=Sum('total_orders'), completed=Sum('completed_orders'))
+        self.assertEqual(totals, {'total': 6, 'completed': 2})
+
+    def test_client_list_merges_archive(self):
+        expected = [order.id for order in self.orders]
+        self.api.force_authenticate(self.client_user)
+        url = '/api/orders/client/orders/'
+        self.archive()
+        self.assertEqual(self.get_all_pages(url, page_size=2), expected)
+        self.assertEqual(self.get_all_pages(url, page_size=4), expected)
+
+        # Назад по ссылкам previous с последней страницы
+        response = self.api.get(url, {'page_size': 4})
+        response = self.api.get(response.data['next'])
+        response = self.api.get(response.data['previous'])
+        self.assertEqual([order['id'] for order in response.data['results']], expected[:4])
+        response = self.api.get(url, {'page': 2, 'page_size': 4})
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual([order['id'] for order in response.data['results']], expected[4:])
+
+    def test_recent_page_does_not_read_archive(self):
+        self.archive()
+        self.api.force_authenticate(self.client_user)
+        archive_horizon()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.get('/api/orders/client/orders/', {'page_size': 1})
+        self.assertEqual([order['id'] for order in response.data['results']], [self.orders[0].id])
+        self.assertNotIn(ArchivedOrder._meta.db_table, ' '.join(query['sql'] for query in queries))
+
+    def test_archived_order_detail_and_history(self):
+        self.archive()
+        order_id = self.orders[1].id
+        self.api.force_authenticate(self.client_user)
+        response = self.api.get(f'/api/orders/client/orders/{order_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['id'], response.data['status']), (order_id, 'completed'))
+        response = self.api.get(f'/api/orders/client/orders/{order_id}/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['status'], 'pending')
+
+        other = User.objects.create_user('other@example.com', 'Other', 'pass', user_type='client')
+        self.api.force_authenticate(other)
+        self.assertEqual(self.api.get(f'/api/orders/client/orders/{order_id}/').status_code, 404)
+        self.assertEqual(self.api.get(f'/api/orders/client/orders/{order_id}/history/').status_code, 404)
+        self.assertEqual(self.api.get('/api/orders/client/orders/abc/').status_code, 404)
+
+    def test_courier_completed_orders_include_archive(self):
+        self.archive()
+        self.api.force_authenticate(self.courier)
+        ids = self.get_all_pages('/api/orders/courier/orders/completed_orders/', page_size=1)
+        self.assertEqual(ids, [self.orders[1].id, self.orders[4].id])
+
+
+class OrderExportTestCase(TestCase):
+    """
+    Потоковая выгрузка заказов: фильтры, форматы, архивные заказы и команда.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        now = timezone.now()
+        self.orders = {}
+        for name, status, city, days in [
+            ('pending', 'pending', 'Москва', 0),
+            ('completed', 'completed', 'Москва', 10),
+            ('cancelled', 'cancelled', 'Казань', 5),
+            ('archived', 'completed', 'Москва', 300),
+        ]:
+            order = Order.objects.create(
+                service=service, customer=self.client_user, courier=None if status == 'pending' else self.courier,
+                city=city, street='Тверская', comment='Код "12", звонить', price=service.price,
+            )
+            Order.objects.filter(pk=order.pk).update(
+                status=status, created_at=now - timedelta(days=days), status_changed_at=now - timedelta(days=days),
+            )
+            self.orders[name] = order.id
+        call_command('archive_orders', stdout=StringIO())
+        self.assertTrue(ArchivedOrder.objects.filter(pk=self.orders['archived']).exists())
+
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_superuser('admin@example.com', 'pass'))
+
+    def export(self, **params):
+        response = self.api.get('/api/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        response, content = self.export(status='completed')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertRegex(response['Content-Disposition'], r'attachment; filename="orders-\d{8}\.csv"')
+        rows = list(csv.DictReader(StringIO(content)))
+        # Сначала оперативные заказы, затем архивные
+        self.assertEqual([int(row['id']) for row in rows], [self.orders['completed'], self.orders['archived']])
+        self.assertEqual(rows[0]['courier_email'], 'courier@example.com')
+        self.assertEqual(rows[0]['comment'], 'Код "12", звонить')
+        self.assertEqual(rows[0]['price'], '500.00')
+        self.assertRegex(rows[0]['created_at'], r'^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}Z$')
+
+    def test_ndjson_filters(self):
+        date_from = (timezone.localdate() - timedelta(days=30)).isoformat()
+        response, content = self.export(output='ndjson', courier=self.courier.id, date_from=date_from)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.orders['completed'], self.orders['cancelled']])
+        self.assertEqual(rows[0]['service'], 'Чистка')
+
+        _, content = self.export(output='ndjson', city='Казань', status=['cancelled', 'completed'])
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [self.orders['cancelled']])
+
+    def test_asgi_streams_without_buffering(self):
+        admin = User.objects.get(email='admin@example.com')
+        parts = []
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            status, headers = asgi_get(
+                '/api/orders/export/?status=completed',
+                [('authorization', f'Bearer {AccessToken.for_user(admin)}')], parts.append,
+            )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'text/csv; charset=utf-8')
+        # Синхронный итератор ASGIHandler собрал бы в список целиком, с предупреждением
+        self.assertFalse([warning for warning in caught if 'StreamingHttpResponse' in str(warning.message)])
+        self.assertEqual(b''.join(parts).decode(), self.export(status='completed')[1])
+
+    def test_invalid_parameters(self):
+        for params in ({'output': 'xml'}, {'date_from': '01.01.2024'}, {'status': 'lost'}, {'courier': 'me'},
+                       {'date_from': '2024-02-01', 'date_to': '2024-01-01'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.api.get('/api/orders/export/', params).status_code, 400)
+        self.api.force_authenticate(self.courier)
+        self.assertEqual(self.api.get('/api/orders/export/').status_code, 403)
+
+    def test_command(self):
+        output = StringIO()
+        call_command('export_orders', format='ndjson', status=['completed'], stdout=output)
+        ids = [json.loads(line)['id'] for line in output.getvalue().splitlines()]
+        self.assertEqual(ids, [self.orders['completed'], self.orders['archived']])
+
+        output = StringIO()
+        call_command('export_orders', stdout=output)
+        self.assertEqual(len(list(csv.DictReader(StringIO(output.getvalue())))), 4)
+        with self.assertRaises(CommandError):
+            call_command('export_orders', date_to='yesterday', stdout=StringIO())
+
+
+class OrderBulkImportTestCase(TestCase):
+    """
+    Массовый импорт: проверка строк, вычисляемые поля и команда bulk_import.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write_csv(self, name, rows):
+        path = self.directory / name
+        with path.open('w', encoding='utf-8', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return str(path)
+
+    def write_ndjson(self, name, records):
+        path = self.directory / name
+        path.write_text(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records), encoding='utf-8')
+        return str(path)
+
+    def bulk_import(self, *args, **options):
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('bulk_import', *args, stdout=output, stderr=output, **options)
+        return output.getvalue()
+
+    def test_users(self):
+        path = self.write_csv('users.csv', [
+            {'email': 'New@Example.COM', 'first_name': 'Анна', 'user_type': 'courier', 'password': 'secret-1'},
+            {'email': 'other@example.com', 'first_name': 'Иван', 'user_type': '', 'password': ''},
+        ])
+        self.assertIn('Imported 2 users', self.bulk_import('users', path, workers=2))
+
+        user = User.objects.get(email='New@example.com')
+        self.assertEqual(user.user_type, 'courier')
+        self.assertTrue(user.check_password('secret-1'))
+        other = User.objects.get(email='other@example.com')
+        self.assertEqual(other.user_type, 'client')
+        self.assertFalse(other.has_usable_password())
+
+    def test_imported_courier_does_not_see_old_broadcasts(self):
+        order = Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+        send_broadcast(order, 'new_order', 'Новый заказ', 'Тверская')
+        path = self.write_csv('users.csv', [
+            {'email': 'new@example.com', 'first_name': 'Анна', 'user_type': 'courier', 'password': ''},
+        ])
+        self.bulk_import('users', path, workers=0)
+
+        user = User.objects.get(email='new@example.com')
+        self.assertFalse(visible_broadcasts(user).exists())
+        self.assertEqual(get_unread_count(user), 0)
+        # Существующий курьер общее уведомление видит
+        self.assertEqual(get_unread_count(self.courier), 1)
+
+    def test_invalid_rows(self):
+        path = self.write_csv('users.csv', [
+            {'email': 'one@example.com', 'first_name': 'Анна', 'user_type': 'client'},
+            {'email': 'client@example.com', 'first_name': 'Дубль', 'user_type': 'client'},
+            {'email': 'not-an-email', 'first_name': '', 'user_type': 'boss'},
+            {'email': 'one@example.com', 'first_name': 'Анна', 'user_type': 'client'},
+        ])
+        output = StringIO()
+        with self.assertRaisesMessage(CommandError, '3 invalid rows'):
+            call_command('bulk_import', 'users', path, workers=0, chunk_size=2, stderr=output)
+        self.assertIn('line 3: email: client@example.com is already registered.', output.getvalue())
+        self.assertIn('line 4: email:', output.getvalue())
+        self.assertIn('line 5: email: one@example.com is already registered.', output.getvalue())
+        self.assertFalse(User.objects.filter(email='one@example.com').exists())
+
+        output = self.bulk_import('users', path, workers=0, skip_invalid=True)
+        self.assertIn('Imported 1 users, skipped 3 invalid rows.', output)
+        self.assertTrue(User.objects.filter(email='one@example.com').exists())
+
+    def test_orders(self):
+        path = self.write_ndjson('orders.ndjson', [
+            {'service_id': self.service.id, 'customer_id': self.client_user.id, 'street': 'ул. Тверская',
+             'latitude': 55.7558, 'longitude': 37.6173, 'comment': 'Код\t12\nзвонить \\ стучать'},
+            {'service_id': self.service.id, 'customer_id': self.client_user.id, 'courier_id': self.courier.id,
+             'street': 'Арбат', 'status': 'completed', 'price': '700.00'},
+        ])
+        since = current_sync_position()
+        self.assertIn('Imported 2 orders', self.bulk_import('orders', path))
+
+        pending = Order.objects.get(status='pending')
+        self.assertEqual(pending.street_search, 'тверская')
+        self.assertEqual(pending.geohash, encode_geohash(Decimal('55.7558'), Decimal('37.6173')))
+        self.assertEqual(pending.comment, 'Код\t12\nзвонить \\ стучать')
+        self.assertEqual(list(pool_changes(since)[0]), [pending])
+
+        completed = Order.objects.get(status='completed')
+        self.assertEqual(completed.change_seq, 0)
+        self.assertEqual(
+            list(OrderStatusEvent.objects.order_by('order_id').values_list('order_id', 'status', 'previous_status')),
+            [(pending.id, 'pending', None), (completed.id, 'completed', None)],
+        )
+        stats = CourierDailyStats.objects.get(courier=self.courier)
+        self.assertEqual((stats.completed_orders, stats.earnings), (1, Decimal('700.00')))
+
+    def test_long_street_with_commas(self):
+        path = self.write_csv('orders.csv', [
+            {'service_id': self.service.id, 'customer_id': self.client_user.id, 'street': 'Тверская,' * 28},
+        ])
+        self.assertIn('Imported 1 orders', self.bulk_import('orders', path))
+        self.assertEqual(len(Order.objects.get().street_search), 255)
+
+    def test_order_references(self):
+        path = self.write_csv('orders.csv', [
+            {'service_id': 0, 'customer_id': self.client_user.id, 'courier_id': '', 'street': 'Тверская', 'status': ''},
+            {'service_id': self.service.id, 'customer_id': self.client_user.id, 'courier_id': self.client_user.id,
+             'street': 'Тверская', 'status': 'courier_assigned'},
+            {'service_id': self.service.id, 'customer_id': self.client_user.id, 'courier_id': '',
+             'street': 'Тверская', 'status': 'in_progress'},
+        ])
+        output = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('bulk_import', 'orders', path, stderr=output)
+        self.assertIn('line 2: service_id: service 0 does not exist.', output.getvalue())
+        self.assertIn(f'line 3: courier_id: courier {self.client_user.id} does not exist.', output.getvalue())
+        self.assertIn('line 4: courier_id: required for status in_progress.', output.getvalue())
+        self.assertFalse(Order.objects.exists())
+
+    def test_notifications(self):
+        version = get_generation(NOTIFICATIONS_SCOPE.format(user_id=self.courier.id))
+        path = self.write_ndjson('notifications.ndjson', [
+            {'recipient_id': self.courier.id, 'type': 'new_order', 'title': 'Новый заказ', 'message': 'Тверская'},
+            {'recipient_id': self.client_user.id, 'type': 'new_order', 'title': 'Новый заказ', 'message': '-'},
+            ['not', 'an', 'object'],
+        ])
+        output = self.bulk_import('notifications', path, skip_invalid=True)
+        self.assertIn('line 2: type: new_order is not allowed for client.', output)
+        self.assertIn('line 3: Not a JSON object.', output)
+        self.assertEqual(list(Notification.objects.values_list('recipient_id', flat=True)), [self.courier.id])
+        self.assertNotEqual(get_generation(NOTIFICATIONS_SCOPE.format(user_id=self.courier.id)), version)
+
+    def test_notifications_update_unread_count(self):
+        self.assertEqual(get_unread_count(self.client_user), 0)
+        path = self.write_ndjson('notifications.ndjson', [
+            {'recipient_id': self.client_user.id, 'type': 'completed', 'title': 'Готово', 'message': '-'},
+            {'recipient_id': self.client_user.id, 'type': 'system', 'title': 'Система', 'message': '-'},
+            {'recipient_id': self.client_user.id, 'type': 'system', 'title': 'Система', 'message': '-', 'is_read': True},
+        ])
+        self.bulk_import('notifications', path)
+        self.assertEqual(get_unread_count(self.client_user), 2)
+
+
+class SyntheticDatasetTestCase(TestCase):
+    """
+    Генератор данных для замеров: воспроизводимость и согласованность данных.
+    """
+
+    def generate(self, prefix, **options):
+        options = {'seed': 7, 'users': 40, 'services': 3, 'orders': 400, 'days': 30, 'history': True, **options}
+        return DatasetGenerator(prefix=prefix, chunk_size=150, **options).generate()
+
+    def snapshot(self, prefix):
+        emails = dict(User.objects.filter(email__startswith=f'{prefix}-').values_list('id', 'email'))
+        orders = Order.objects.filter(customer__email__startswith=f'{prefix}-').order_by('id')
+        return [
+            (emails[customer_id].removeprefix(prefix), courier_id and emails[courier_id].removeprefix(prefix),
+             status, street, latitude, price, created_at)
+            for customer_id, courier_id, status, street, latitude, price, created_at in orders.values_list(
+                'customer_id', 'courier_id', 'status', 'street', 'latitude', 'price', 'created_at',
+            )
+        ]
+
+    def test_same_seed_same_data(self):
+        counts = self.generate('first')
+        self.assertEqual((counts['users'], counts['services'], counts['orders']), (40, 3, 400))
+        self.generate('second')
+        self.assertEqual(self.snapshot('first'), self.snapshot('second'))
+        self.generate('third', seed=8)
+        self.assertNotEqual(self.snapshot('first'), self.snapshot('third'))
+
+    def test_consistency(self):
+        self.generate('data', notifications_per_order=1.5)
+        orders = Order.objects.all()
+        self.assertFalse(orders.filter(courier__isnull=True, status__in=COURIER_STATUSES).exists())
+        self.assertFalse(orders.exclude(courier__isnull=True).exclude(courier__user_type='courier').exists())
+        self.assertEqual(
+            set(orders.values_list('status', flat=True)) & {'completed', 'cancelled'}, {'completed', 'cancelled'},
+        )
+        self.assertFalse(orders.exclude(latitude__range=(55.5, 56), longitude__range=(37.3, 37.9)).exists())
+        self.assertFalse(orders.filter(status='pending', change_seq=0).exists())
+        self.assertFalse(orders.exclude(status='pending').exclude(change_seq=0).exists())
+
+        # Последняя запись журнала совпадает с текущим статусом, длительности сходятся
+        for order in orders.prefetch_related('status_events')[:50]:
+            events = sorted(order.status_events.all(), key=lambda event: event.created_at)
+            self.assertEqual(events[-1].status, order.status)
+            self.assertEqual(events[-1].created_at, order.status_changed_at)
+            self.assertEqual(events[0].status, 'pending')
+
+        self.assertTrue(Service.objects.filter(slug='data-service-0', serviceattribute__isnull=False).exists())
+        self.assertAlmostEqual(Notification.objects.count() / orders.count(), 1.5, delta=0.1)
+        for notification in Notification.objects.select_related('recipient')[:200]:
+            self.assertIn(notification.type, Notification.get_allowed_types_for_user(notification.recipient))
+
+        stats = CourierDailyStats.objects.aggregate(total=Sum('total_orders'), earnings=Sum('earnings'))
+        self.assertEqual(stats['total'], orders.filter(courier__isnull=False).count())
+        self.assertEqual(stats['earnings'], orders.filter(status='completed').aggregate(total=Sum('price'))['total'])
+        self.assertTrue(User.objects.get(email='data-courier-0@example.com').check_password('synthetic-password'))
+        self.assertFalse(User.objects.filter(broadcast_state__isnull=True).exists())
+
+    def test_command(self):
+        output = StringIO()
+        call_command('generate_dataset', users=20, orders=50, prefix='cmd', stdout=output)
+        self.assertIn('orders: 50', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', users=20, orders=50, prefix='cmd', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', courier_ratio=1, prefix='other', stdout=StringIO())
+
+
+class EndpointBenchmarkTestCase(TestCase):
+    """
+    Замеры эндпоинтов: прогон на малом наборе данных и сравнение с базовой линией.
+    """
+
+    def test_run(self):
+        results = run_benchmarks({'users': 20, 'orders': 100}, warmup=0, repeat=2)
+        self.assertEqual(list(results), [name for name, *_ in ENDPOINTS])
+        for result in results.values():
+            self.assertGreaterEqual(result['queries'], 1)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        # Данные замера откатываются
+        self.assertFalse(User.objects.filter(email__startswith='benchmark-').exists())
+
+    def test_find_regressions(self):
+        base = {'p50_ms': 100.0, 'p95_ms': 200.0, 'p99_ms': 300.0, 'queries': 3}
+        baseline = {'dataset': {}, 'endpoints': {'list': base, 'fast': {**base, 'p50_ms': 1.0, 'p95_ms': 2.0}}}
+
+        self.assertEqual(find_regressions({'list': {**base, 'p50_ms': 120.0, 'p99_ms': 900.0}}, baseline), [])
+        self.assertEqual(len(find_regressions({'list': {**base, 'p95_ms': 260.0}}, baseline)), 1)
+        self.assertEqual(len(find_regressions({'list': {**base, 'queries': 4}}, baseline)), 1)
+        self.assertEqual(find_regressions({'list': {**base, 'queries': 2, 'p50_ms': 50.0}}, baseline), [])
+        # Небольшой абсолютный рост у быстрых эндпоинтов - шум
+        fast = {**base, 'p50_ms': 1.0 + LATENCY_SLACK_MS, 'p95_ms': 2.0}
+        self.assertEqual(find_regressions({'fast': fast}, baseline), [])
+        self.assertEqual(len(find_regressions({'fast': {**fast, 'p50_ms': 2.0 + LATENCY_SLACK_MS}}, baseline)), 1)
+        self.assertEqual(find_regressions({'new': {**base, 'queries': 50}}, baseline), [])
+
+
+class DispatchTestCase(TestCase):
+    """
+    Тесты пакетного распределения заказов между курьерами.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', 'pass', user_type='client')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.couriers = [
+            User.objects.create_user(f'courier{i}@example.com', 'Courier', 'pass', user_type='courier')
+            for i in range(3)
+        ]
+        self.api = APIClient()
+
+    def create_order(self, latitude, longitude, **kwargs):
+        return Order.objects.create(
+            service=self.service, customer=self.client_user, street='Тверская',
+            latitude=latitude, longitude=longitude, **kwargs,
+        )
+
+    def locate(self, courier, latitude, longitude, age=timedelta(0)):
+        CourierLocation.objects.update_or_create(
+            courier=courier,
+            defaults={'latitude': latitude, 'longitude': longitude, 'updated_at': timezone.now() - age},
+        )
+
+    def test_matches_brute_force_greedy(self):
+        rng = random.Random(7)
+        orders = [(i, rng.uniform(55.70, 55.80), rng.uniform(37.50, 37.70)) for i in range(80)]
+        couriers = [(i, rng.uniform(55.70, 55.80), rng.uniform(37.50, 37.70)) for i in range(60)]
+        pairs = sorted(
+            (haversine_km(c_lat, c_lon, o_lat, o_lon), courier_id, order_id)
+            for courier_id, c_lat, c_lon in couriers
+            for order_id, o_lat, o_lon in orders
+        )
+        expected, busy, taken = [], set(), set()
+        for distance, courier_id, order_id in pairs:
+            if distance <= 3 and courier_id not in busy and order_id not in taken:
+                busy.add(courier_id)
+                taken.add(order_id)
+                expected.append((courier_id, order_id))
+
+        plan = plan_assignments(orders, couriers, 3)
+        self.assertEqual([(courier_id, order_id) for courier_id, order_id, _ in plan], expected)
+        self.assertTrue(all(distance <= 3 for _, _, distance in plan))
+
+    def test_nearest_courier_gets_the_offer(self):
+        near, far, busy = self.couriers
+        order = self.create_order(55.7558, 37.6173)
+        self.create_order(None, None)
+        self.locate(near, 55.7600, 37.6200)
+        self.locate(far, 55.7800, 37.6500)
+        self.locate(busy, 55.7558, 37.6173)
+        self.create_order(55.70, 37.50, courier=busy, status='courier_assigned')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            plan = dispatch_pending_orders()
+        self.assertEqual([(courier_id, order_id) for courier_id, order_id, _ in plan], [(near.id, order.id)])
+        offer = Notification.objects.get(type='order_offer')
+        self.assertEqual((offer.recipient_id, offer.order_id), (near.id, order.id))
+
+        # Пока предложение действует, заказ повторно не предлагается
+        self.assertEqual(dispatch_pending_orders(), [])
+        later = timezone.now() + timedelta(seconds=settings.DISPATCH_OFFER_TTL + 1)
+        self.assertEqual(len(dispatch_pending_orders(now=later)), 1)
+
+    def test_stale_and_distant_couriers_are_skipped(self):
+        stale, distant, _ = self.couriers
+        self.create_order(55.7558, 37.6173)
+        self.locate(stale, 55.7558, 37.6173, age=timedelta(seconds=settings.DISPATCH_LOCATION_TTL + 1))
+        self.locate(distant, 55.95, 37.90)
+        self.assertEqual(dispatch_pending_orders(), [])
+
+    def test_location_endpoint(self):
+        courier = self.couriers[0]
+        self.api.force_authenticate(courier)
+        url = '/api/orders/courier/orders/location/'
+        response = self.api.put(url, {'latitude': '55.75583912', 'longitude': 37.6173}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['latitude'], '55.755839')
+        self.assertEqual(CourierLocation.objects.get(courier=courier).longitude, Decimal('37.617300'))
+
+        self.assertEqual(self.api.put(url, {'latitude': 91, 'longitude': 0}, format='json').status_code, 400)
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.put(url, {'latitude': 55, 'longitude': 37}, format='json').status_code, 403)
+
+
+class OrderSyncTestCase(TransactionTestCase):
+    """
+    Синхронизация пула: ответ содержит только заказы, которые вошли в пул
+    или вышли из него после маркера. Каждый запрос к API идет в своей
+    транзакции, как в работе, поэтому тест не оборачивается в транзакцию.
+    """
+    url = '/api/orders/courier/orders/changes/'
+
+    def setUp(self):
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+        self.api.force_authenticate(self.courier)
+
+    def create_order(self):
+        return Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+
+    def sync(self, token=None):
+        response = self.api.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_since_token(self):
+        old = self.create_order()
+        unchanged = self.create_order()
+        data = self.sync()
+        self.assertTrue(data['reset'])
+
+        new = self.create_order()
+        transitions.assign(old, self.courier)
+        deleted_id = self.create_order().id
+        Order.objects.get(pk=deleted_id).delete()
+        data = self.sync(data['token'])
+        self.assertFalse(data['reset'])
+        self.assertEqual([order['id'] for order in data['orders']], [new.id])
+        self.assertEqual(data['orders'][0]['street'], 'Тверская')
+        self.assertEqual(data['removed'], sorted([old.id, deleted_id]))
+        self.assertNotIn(unchanged.id, data['removed'])
+
+        data = self.sync(data['token'])
+        self.assertEqual((data['orders'], data['removed']), ([], []))
+
+        transitions.unassign(old, self.courier)
+        transitions.assign(new, self.courier)
+        transitions.change_status(new, self.courier, 'courier_on_the_way')
+        data = self.sync(data['token'])
+        self.assertEqual([order['id'] for order in data['orders']], [old.id])
+        self.assertEqual(data['removed'], [new.id])
+
+        # Смена статуса вне пула не попадает в синхронизацию
+        transitions.change_status(new, self.courier, 'at_location')
+        data = self.sync(data['token'])
+        self.assertEqual((data['orders'], data['removed']), ([], []))
+
+    def test_reset_when_too_many_changes(self):
+        token = self.sync()['token']
+        for _ in range(3):
+            self.create_order()
+        with self.settings(ORDER_SYNC_MAX_CHANGES=2):
+            data = self.sync(token)
+        self.assertTrue(data['reset'])
+        self.assertEqual(data['orders'], [])
+        self.assertEqual(len(self.sync(token)['orders']), 3)
+
+    def test_long_transaction_holds_token(self):
+        started, release = threading.Event(), threading.Event()
+
+        def long_import():
+            # Как bulk_import: запись в одной долгой транзакции
+            try:
+                with transaction.atomic():
+                    self.create_order()
+                    started.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        worker = threading.Thread(target=long_import)
+        worker.start()
+        try:
+            self.assertTrue(started.wait(10))
+            token = self.sync()['token']
+            for _ in range(3):
+                self.create_order()
+            # Маркер не сдвигается, пока транзакция открыта, и изменения копятся до reset
+            with self.settings(ORDER_SYNC_MAX_CHANGES=2):
+                data = self.sync(token)
+                self.assertTrue(data['reset'])
+                self.assertEqual(decode_sync_token(self.sync(data['token'])['token'])[0], decode_sync_token(token)[0])
+                self.assertTrue(self.sync(data['token'])['reset'])
+        finally:
+            release.set()
+            worker.join()
+
+        # После фиксации маркер идет дальше
+        data = self.sync()
+        self.assertEqual(len(self.sync(data['token'])['orders']), 0)
+        self.assertGreater(decode_sync_token(data['token'])[0], decode_sync_token(token)[0])
+
+    def test_expired_token_and_pruning(self):
+        position = current_sync_position()
+        old_id = self.create_order().id
+        Order.objects.get(pk=old_id).delete()
+        DeletedPendingOrder.objects.filter(order_id=old_id).update(deleted_at=timezone.now() - timedelta(days=9))
+        recent_id = self.create_order().id
+        Order.objects.get(pk=recent_id).delete()
+
+        # Маркер в пределах срока хранения видит удаления
+        token = encode_sync_token(position, timezone.now() - timedelta(days=6))
+        self.assertEqual(self.sync(token)['removed'], [old_id, recent_id])
+        # Старый маркер и маркер первой версии получают reset
+        self.assertTrue(self.sync(encode_sync_token(position, timezone.now() - timedelta(days=8)))['reset'])
+        v1 = base64.urlsafe_b64encode(f'v1|{position}'.encode()).decode()
+        self.assertTrue(self.sync(v1)['reset'])
+
+        output = StringIO()
+        call_command('archive_orders', stdout=output)
+        self.assertIn('Pruned 1 deleted pending order mark(s).', output.getvalue())
+        self.assertEqual(list(DeletedPendingOrder.objects.values_list('order_id', flat=True)), [recent_id])
+
+    def test_invalid_token_and_access(self):
+        self.assertEqual(self.api.get(self.url, {'since': 'garbage'}).status_code, 400)
+        self.api.force_authenticate(self.client_user)
+        self.assertEqual(self.api.get(self.url).status_code, 403)
+
+
+class OrderQueryPlanTestCase(QueryPlanMixin, TestCase):
+    """
+    Горячие запросы к заказам не должны деградировать до последовательного сканирования.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        cls.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        statuses = ['pending', 'courier_assigned', 'in_progress', 'completed', 'completed', 'cancelled']
+        Order.objects.bulk_create([
+            Order(
+                service=service, customer=cls.client_user, street='Тверская',
+                status=statuses[i % len(statuses)],
+                courier=None if i % len(statuses) == 0 else cls.courier,
+                latitude=Decimal('55.75') + Decimal(i % 100) / 1000, longitude=Decimal('37.62'),
+                geohash=encode_geohash(Decimal('55.75') + Decimal(i % 100) / 1000, Decimal('37.62')),
+            )
+            for i in range(3000)
+        ])
+        now = timezone.now()
+        OrderStatusEvent.objects.bulk_create([
+            OrderStatusEvent(order=order, status=order.status, created_at=now - timedelta(minutes=i))
+            for i, order in enumerate(Order.objects.all())
+        ])
+        Order.objects.filter(id__in=Order.objects.order_by('id').values('id')[:30]).update(street_search='покровка')
+        cls.analyze('orders_order', 'orders_courierdailystats', 'orders_orderstatusevent')
+
+    def test_pending_pool(self):
+        pending = Order.objects.filter(status='pending', courier__isnull=True)
+        plan = self.assertUsesIndex(pending.order_by('-created_at', '-id')[:11], 'orders_order')
+        self.assertIn('order_pending_pool_idx', plan)
+        self.assertUsesIndex(nearby_orders(pending, *CENTER, 3).order_by('distance')[:11], 'orders_order')
+
+    def test_street_search(self):
+        plan = self.assertUsesIndex(Order.objects.filter(street_search__contains='покров'), 'orders_order')
+        self.assertIn('order_street_search_trgm', plan)
+
+    def test_courier_lists(self):
+        assigned = Order.objects.filter(courier=self.courier).exclude(status='completed')
+        self.assertUsesIndex(assigned.order_by('-created_at', '-id')[:11], 'orders_order')
+        completed = Order.objects.filter(courier=self.courier, status='completed')
+        plan = self.assertUsesIndex(completed.order_by('-created_at', '-id')[:11], 'orders_order')
+        self.assertIn('order_courier_status_idx', plan)
+
+    def test_client_list(self):
+        orders = Order.objects.filter(customer=self.client_user).order_by('-created_at', '-id')
+        plan = self.assertUsesIndex(orders[:11], 'orders_order')
+        self.assertIn('order_customer_created_idx', plan)
+
+    def test_courier_statistics(self):
+        today = timezone.localdate()
+        stats = CourierDailyStats.objects.filter(courier=self.courier, date__range=(today - timedelta(days=29), today))
+        self.assertUsesIndex(stats, 'orders_courierdailystats')
+
+    def test_status_history(self):
+        order = Order.objects.first()
+        plan = self.assertUsesIndex(order_timeline(order.id), 'orders_orderstatusevent')
+        self.assertIn('order_event_timeline_idx', plan)
+        now = timezone.now()
+        events = OrderStatusEvent.objects.filter(created_at__gte=now - timedelta(hours=1), created_at__lt=now)
+        plan = self.assertUsesIndex(events, 'orders_orderstatusevent')
+        self.assertIn('order_event_created_brin', plan)
+
+    def test_pool_changes(self):
+        plan = self.assertUsesIndex(Order.objects.filter(change_seq__gte=10 ** 9), 'orders_order')
+        self.assertIn('order_change_seq_idx', plan)
+
+
+class OrderResponseCacheTestCase(TestCase):
+    """
+    Кэш списков заказов сбрасывается при изменении заказов пользователя.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+
+    def create_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+
+    def test_client_list_is_cached_and_invalidated(self):
+        self.create_order()
+        self.api.force_authenticate(self.client_user)
+        url = '/api/orders/client/orders/'
+        self.assertEqual(len(self.api.get(url).data['results']), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.api.get(url).data['results']), 1)
+
+        self.create_order()
+        self.assertEqual(len(self.api.get(url).data['results']), 2)
+
+    def test_transition_invalidates_courier_lists(self):
+        order = self.create_order()
+        self.api.force_authenticate(self.courier)
+        url = '/api/orders/courier/orders/assigned_orders/'
+        self.assertEqual(self.api.get(url).data['results'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.patch(f'/api/orders/courier/orders/{order.id}/assign/')
+        self.assertEqual([item['id'] for item in self.api.get(url).data['results']], [order.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.patch(f'/api/orders/courier/orders/{order.id}/unassign/')
+        self.assertEqual(self.api.get(url).data['results'], [])
+
+    def test_users_do_not_share_entries(self):
+        self.create_order()
+        other = User.objects.create_user('other@example.com', 'Other', None, user_type='client')
+        self.api.force_authenticate(self.client_user)
+        self.api.get('/api/orders/client/orders/')
+        self.api.force_authenticate(other)
+        self.assertEqual(self.api.get('/api/orders/client/orders/').data['results'], [])
+
+
+class OrderConditionalGetTestCase(TestCase):
+    """
+    Повторный запрос с ETag получает 304, пока данные не изменились.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.client_user = User.objects.create_user('client@example.com', 'Client', None, user_type='client')
+        self.courier = User.objects.create_user('courier@example.com', 'Courier', None, user_type='courier')
+        self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+
+    def create_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Order.objects.create(service=self.service, customer=self.client_user, street='Тверская')
+
+    def test_client_list_not_modified_until_change(self):
+        self.create_order()
+        self.api.force_authenticate(self.client_user)
+        url = '/api/orders/client/orders/'
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        self.create_order()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_etag_depends_on_query(self):
+        self.create_order()
+        self.api.force_authenticate(self.client_user)
+        etag = self.api.get('/api/orders/client/orders/')['ETag']
+        response = self.api.get('/api/orders/client/orders/', {'page': 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        order = self.create_order()
+        self.api.force_authenticate(self.client_user)
+        url = f'/api/orders/client/orders/{order.id}/'
+        last_modified = self.api.get(url)['Last-Modified']
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_pending_pool_version_follows_transitions(self):
+        order = self.create_order()
+        self.api.force_authenticate(self.courier)
+        url = '/api/orders/courier/orders/'
+        etag = self.api.get(url)['ETag']
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        other = User.objects.create_user('other@example.com', 'Other', None, user_type='courier')
+        with self.captureOnCommitCallbacks(execute=True):
+            transitions.assign(order, other)
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_users_do_not_share_etags(self):
+        self.create_order()
+        other = User.objects.create_user('other@example.com', 'Other', None, user_type='client')
+        self.api.force_authenticate(self.client_user)
+        etag = self.api.get('/api/orders/client/orders/')['ETag']
+        self.api.force_authenticate(other)
+        self.assertEqual(self.api.get('/api/orders/client/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_generation_never_goes_back(self):
+        get_generation(PENDING_ORDERS_SCOPE)
+        set_many = cache.set_many
+        seen = []
+
+        def concurrent_bump():
+            bump_generation(PENDING_ORDERS_SCOPE)
+            seen.append(get_generation(PENDING_ORDERS_SCOPE))
+
+        def delayed_set_many(*args, **kwargs):
+            # Вторая смена поколения начинается, когда первая уже взяла время
+            if threading.current_thread() is threading.main_thread() and other.ident is None:
+                other.start()
+                other.join(0.5)
+            return set_many(*args, **kwargs)
+
+        other = threading.Thread(target=concurrent_bump)
+        with mock.patch.object(cache, 'set_many', delayed_set_many):
+            bump_generation(PENDING_ORDERS_SCOPE)
+            other.join()
+        self.assertGreaterEqual(get_generation(PENDING_ORDERS_SCOPE), seen[0])
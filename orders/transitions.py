@@ -0,0 +1,210 @@
+"""
+Машина состояний заказа.
+
+Каждый переход применяется одним условным UPDATE по статусу и курьеру,
+с которыми заказ был прочитан. Если UPDATE не затронул ни одной строки,
+значит заказ уже изменил другой запрос, и переход отклоняется.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from shoe_service.cache import PENDING_ORDERS_SCOPE, bump_generation_on_commit, invalidate_user_cache_on_commit
+from .models import Order, OrderStatusEvent, TransactionId
+from .stats import record_order_change, record_order_changes
+from .sync import publish_pool_change_on_commit
+
+
+# Допустимые переходы статусов
+STATUS_FLOW = {
+    'courier_assigned': 'courier_on_the_way',
+    'courier_on_the_way': 'at_location',
+    'at_location': 'courier_on_the_way_to_master',
+    'courier_on_the_way_to_master': 'in_progress',
+    'in_progress': 'completed',
+}
+
+# Допустимые обратные переходы (откаты)
+ALLOWED_PREVIOUS_STATUS = {
+    'courier_on_the_way': 'courier_assigned',
+    'at_location': 'courier_on_the_way',
+    'courier_on_the_way_to_master': 'at_location',
+    'in_progress': 'courier_on_the_way_to_master',
+}
+
+# Время, в течение которого можно откатить статус
+STATUS_REVERT_WINDOW = timedelta(minutes=10)
+
+
+class TransitionError(Exception):
+    """
+    Переход недопустим в текущем состоянии заказа.
+    """
+    status_code = 400
+
+    def __init__(self, detail):
+        super().__init__(detail)
+        self.detail = detail
+
+
+class TransitionForbidden(TransitionError):
+    """
+    Пользователь не может менять этот заказ.
+    """
+    status_code = 403
+
+
+def _compare_and_swap(order, status, courier, conflict_detail, **conditions):
+    """
+    Переводит заказ в status с курьером courier, если в базе он всё ещё
+    в том состоянии, в котором был прочитан. Обновляет order на месте.
+    """
+    previous_status = order.status
+    previous_courier_id = order.courier_id
+    previous_changed_at = order.status_changed_at
+    now = timezone.now()
+
+    filters = {'pk': order.pk, 'status': previous_status, **conditions}
+    if previous_courier_id is None:
+        filters['courier__isnull'] = True
+    else:
+        filters['courier_id'] = previous_courier_id
+
+    values = {'status': status, 'courier': courier, 'status_changed_at': now}
+    if 'pending' in (previous_status, status):
+        values['change_seq'] = TransactionId()
+
+    with transaction.atomic():
+        updated = Order.objects.filter(**filters).update(**values)
+        if not updated:
+            raise TransitionError(conflict_detail)
+
+        # Номер транзакции знает только база: поле перечитается при обращении
+        order.__dict__.pop('change_seq', None)
+        order.status = status
+        order.courier = courier
+        order.status_changed_at = now
+        order.remember_saved_state()
+        OrderStatusEvent.for_change(order, previous_status, previous_changed_at).save()
+        record_order_change(order, previous_courier_id, previous_status)
+        # UPDATE не вызывает сигналов модели, поэтому кэш сбрасываем явно
+        invalidate_user_cache_on_commit(order.customer_id, previous_courier_id, order.courier_id)
+        if 'pending' in (previous_status, status):
+            bump_generation_on_commit(PENDING_ORDERS_SCOPE)
+            # Остальные курьеры сразу узнают, что заказ принят или вернулся в пул
+            publish_pool_change_on_commit(order, previous_status, previous_courier_id)
+    return order
+
+
+def assign(order, courier):
+    """
+    Назначает курьера на ожидающий заказ.
+    """
+    if order.courier_id:
+        raise TransitionError("Order is already assigned to a courier.")
+    if order.status != 'pending':
+        raise TransitionError("Order is not available for assignment.")
+    return _compare_and_swap(order, 'courier_assigned', courier, "Order is already assigned to a courier.")
+
+
+def unassign(order, courier):
+    """
+    Возвращает назначенный заказ в общий пул.
+    """
+    if order.courier_id != courier.id:
+        raise TransitionError("You can only unassign orders assigned to you.")
+    if order.status != 'courier_assigned':
+        raise TransitionError("Order cannot be unassigned in its current status.")
+    return _compare_and_swap(order, 'pending', None, "Order cannot be unassigned in its current status.")
+
+
+def is_revert(current_status, new_status):
+    return ALLOWED_PREVIOUS_STATUS.get(current_status) == new_status
+
+
+def _status_change_conditions(order, courier, new_status):
+    """
+    Проверяет переход по правилам машины состояний и возвращает
+    дополнительные условия UPDATE для него.
+    """
+    if order.courier_id != courier.id:
+        raise TransitionForbidden("You do not have permission to update this order.")
+
+    if is_revert(order.status, new_status):
+        cutoff = timezone.now() - STATUS_REVERT_WINDOW
+        if order.status_changed_at < cutoff:
+            raise TransitionError("Time to revert status has expired.")
+        return {'status_changed_at__gte': cutoff}
+
+    if STATUS_FLOW.get(order.status) == new_status:
+        return {}
+
+    raise TransitionError("Invalid status transition.")
+
+
+def change_status(order, courier, new_status):
+    """
+    Переводит заказ курьера на следующий статус или откатывает на предыдущий.
+    """
+    conditions = _status_change_conditions(order, courier, new_status)
+    return _compare_and_swap(
+        order, new_status, courier, "Order status was changed by another request.", **conditions,
+    )
+
+
+def change_status_bulk(courier, changes):
+    """
+    Применяет несколько смен статуса курьера в одной транзакции.
+
+    changes - последовательность (order_id, new_status). Строки заказов
+    блокируются одним SELECT ... FOR UPDATE, поэтому проверка идет по
+    актуальному состоянию, а заказы с одинаковым переходом обновляются
+    одним UPDATE. Возвращает (results, changed): результат по каждому
+    элементу в исходном порядке и пары (заказ, прежний статус)
+    для измененных заказов.
+    """
+    now = timezone.now()
+    results = []
+    groups = defaultdict(list)
+
+    with transaction.atomic():
+        orders = (
+            Order.objects
+            .select_related('customer', 'courier')
+            .select_for_update(of=('self',))
+            .in_bulk([order_id for order_id, _ in changes])
+        )
+        for order_id, new_status in changes:
+            order = orders.get(order_id)
+            if order is None:
+                results.append({'id': order_id, 'status_code': 404, 'detail': "Order not found."})
+                continue
+            try:
+                _status_change_conditions(order, courier, new_status)
+            except TransitionError as e:
+                results.append({'id': order_id, 'status_code': e.status_code, 'detail': e.detail})
+                continue
+            groups[order.status, new_status].append(order)
+            results.append({'id': order_id, 'status_code': 200, 'status': new_status})
+
+        changed = []
+        events = []
+        for (previous_status, new_status), group in groups.items():
+            Order.objects.filter(pk__in=[order.pk for order in group]).update(
+                status=new_status,
+                status_changed_at=now,
+            )
+            for order in group:
+                previous_changed_at = order.status_changed_at
+                order.status = new_status
+                order.status_changed_at = now
+                order.remember_saved_state()
+                events.append(OrderStatusEvent.for_change(order, previous_status, previous_changed_at))
+                changed.append((order, courier.id, previous_status))
+
+        OrderStatusEvent.objects.bulk_create(events)
+        record_order_changes(changed)
+        invalidate_user_cache_on_commit(courier.id, *(order.customer_id for order, _, _ in changed))
+    return results, [(order, previous_status) for order, _, previous_status in changed]
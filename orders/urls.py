@@ -1,11 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ClientOrderViewSet, CourierOrderViewSet
+from .views import ClientOrderViewSet, CourierOrderViewSet, CourierStatisticsView, OrderDwellTimeView, OrderExportView
 
 router = DefaultRouter()
 router.register(r'client/orders', ClientOrderViewSet, basename='client-orders')
 router.register(r'courier/orders', CourierOrderViewSet, basename='courier-orders')
 
 urlpatterns = [
+    path('courier/statistics/', CourierStatisticsView.as_view(), name='courier-statistics'),
+    path('statistics/dwell-times/', OrderDwellTimeView.as_view(), name='order-dwell-times'),
+    path('export/', OrderExportView.as_view(), name='order-export'),
     path('', include(router.urls)),
 ]
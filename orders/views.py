@@ -1,65 +1,188 @@
+import math
+
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import ParseError, PermissionDenied
 from rest_framework.parsers import MultiPartParser, FormParser
-from .models import Order
-from .serializers import OrderSerializer
-from datetime import timedelta
+from rest_framework.views import APIView
+from .addresses import street_search_text
+from .archive import archive_horizon
+from .models import ArchivedOrder, CourierLocation, Order
+from .serializers import (
+    BulkStatusUpdateSerializer, CourierLocationSerializer, OrderSerializer, OrderStatusEventSerializer, order_rows, serialize_order_rows,
+)
+from .geo import nearby_orders
+from .history import dwell_time_percentiles, order_timeline
+from .stats import get_courier_statistics
+from . import export, sync, transitions
+from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
 from django.utils import timezone
-from notifications.utils import send_order_notification
+from notifications.outbox import enqueue_order_notification, enqueue_order_notifications
+from shoe_service.cache import PENDING_ORDERS_SCOPE, cache_user_response, get_generation, get_user_generation
+from shoe_service.conditional import conditional_get, generation_timestamp, user_version
+from shoe_service.pagination import KeysetPagination
+
+
+# Сообщения клиенту о смене статуса заказа курьером
+STATUS_MESSAGES = {
+    'courier_on_the_way': 'Курьер выехал к вам',
+    'at_location': 'Курьер прибыл на место',
+    'courier_on_the_way_to_master': 'Курьер везет обувь мастеру',
+    'in_progress': 'Ваш заказ в работе',
+    'completed': 'Заказ выполнен'
+}
+
+
+def pending_pool_version(view, request, *args, **kwargs):
+    """
+    Версия пула ожидающих заказов, общего для всех курьеров.
+    """
+    generation = get_generation(PENDING_ORDERS_SCOPE)
+    return generation, generation_timestamp(generation)
+
+
+def courier_order_version(view, request, *args, **kwargs):
+    """
+    Курьеру доступны заказы из пула и свои заказы, поэтому версия
+    складывается из поколений пула и самого курьера.
+    """
+    generations = (get_generation(PENDING_ORDERS_SCOPE), get_user_generation(request.user.id))
+    return generations, generation_timestamp(max(generations))
 
 
-class ClientOrderViewSet(viewsets.ModelViewSet):
+class OrderListMixin:
+    """
+    Списки заказов сериализуются быстрым путем из values()-выборки,
+    детальные ответы - через OrderSerializer.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.order_list_response(self.filter_queryset(self.get_queryset()), self.get_archived_queryset())
+
+    def get_archived_queryset(self):
+        """
+        Архивные заказы, которые дополняют список (см. orders/archive.py), или None.
+        """
+        return None
+
+    def order_list_response(self, queryset, archived=None):
+        if archived is None:
+            page = self.paginate_queryset(order_rows(queryset))
+        else:
+            page = self.paginator.paginate_querysets(
+                [order_rows(queryset), order_rows(archived)],
+                self.request, view=self, horizon=archive_horizon(),
+            )
+        return self.get_paginated_response(serialize_order_rows(page, self.request))
+
+
+class ClientOrderViewSet(OrderListMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления заказами клиентов.
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.user_type != 'client':
             raise PermissionDenied("Only clients can access this endpoint.")
-        return Order.objects.filter(customer=user)
+        return OrderSerializer.setup_queryset(Order.objects.filter(customer=user))
 
-    def perform_create(self, serializer):
-        order = serializer.save(customer=self.request.user)
-        # Отправляем уведомление о новом заказе
-        send_order_notification(
-            order,
-            'new_order',
-            'Новый заказ',
-            f'Появился новый заказ на услугу {order.service.name}'
-        )
+    def get_archived_queryset(self):
+        return ArchivedOrder.objects.filter(customer=self.request.user)
 
+    def get_archived_row(self):
+        """
+        Заказ клиента, перенесенный в архив, для запросов к отдельному заказу.
+        """
+        try:
+            row = order_rows(self.get_archived_queryset().filter(pk=self.kwargs['pk'])).first()
+        except ValueError:
+            row = None
+        if row is None:
+            raise Http404
+        return row
+
+    @conditional_get(user_version)
+    @cache_user_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        # Уведомление о новом заказе ставится в очередь в той же транзакции
+        with transaction.atomic():
+            order = serializer.save(customer=self.request.user)
+            enqueue_order_notification(
+                order,
+                'new_order',
+                'Новый заказ',
+                f'Появился новый заказ на услугу {order.service.name}'
+            )
+
+    @conditional_get(user_version)
     def retrieve(self, request, *args, **kwargs):
-        order = self.get_object()
-        if order.customer != request.user:
+        try:
+            order = self.get_object()
+        except Http404:
+            return Response(serialize_order_rows([self.get_archived_row()], request)[0])
+        if order.customer_id != request.user.id:
             raise PermissionDenied("You do not have permission to view this order.")
-        return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_serializer(order)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """
+        Возвращает историю статусов заказа, в том числе архивного.
+        """
+        try:
+            order = self.get_object()
+        except Http404:
+            order_id = self.get_archived_row()['id']
+        else:
+            if order.customer_id != request.user.id:
+                raise PermissionDenied("You do not have permission to view this order.")
+            order_id = order.id
+        return Response(OrderStatusEventSerializer(order_timeline(order_id), many=True).data)
 
     def update(self, request, *args, **kwargs):
         order = self.get_object()
-        if order.customer != request.user:
+        if order.customer_id != request.user.id:
             raise PermissionDenied("You do not have permission to update this order.")
         return super().update(request, *args, **kwargs)
 
     def destroy(self, request, *args, **kwargs):
         order = self.get_object()
-        if order.customer != request.user:
+        if order.customer_id != request.user.id:
             raise PermissionDenied("You do not have permission to delete this order.")
         return super().destroy(request, *args, **kwargs)
 
 
-class CourierOrderViewSet(viewsets.ReadOnlyModelViewSet):
+class CourierOrderViewSet(OrderListMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для курьеров для просмотра и управления заказами.
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    # Допустимые значения параметра sort_by и соответствующая сортировка
+    SORT_OPTIONS = {
+        'date_asc': ('created_at', 'id'),
+        'date_desc': ('-created_at', '-id'),
+        # Заказы без координат показываем в конце списка
+        'distance_asc': (F('distance').asc(nulls_last=True), 'id'),
+        'distance_desc': (F('distance').desc(nulls_last=True), '-id'),
+    }
 
     def get_queryset(self):
         user = self.request.user
@@ -68,44 +191,131 @@ class CourierOrderViewSet(viewsets.ReadOnlyModelViewSet):
 
         if self.action == 'list':
             # Возвращаем заказы, которые досту��ны для принятия
-            return Order.objects.filter(status='pending', courier__isnull=True)
+            queryset = Order.objects.filter(status='pending', courier__isnull=True)
+            return self.filter_available_orders(queryset)
         else:
             # Для остальных действий возвращаем все заказы (при необходимости можно ограничить)
-            return Order.objects.all()
+            return OrderSerializer.setup_queryset(Order.objects.all())
 
+    def filter_available_orders(self, queryset):
+        """
+        Применяет параметры search, latitude, longitude, distance и sort_by к списку доступных заказов.
+        """
+        params = self.request.query_params
+
+        # Запрос нормализуется так же, как адреса заказов; поиск по подстроке
+        # обслуживается триграммным индексом order_street_search_trgm
+        search = street_search_text(params.get('search', ''), Order._meta.get_field('city').default)
+        if search:
+            queryset = queryset.filter(street_search__contains=search)
+
+        sort_by = params.get('sort_by')
+        if sort_by and sort_by not in self.SORT_OPTIONS:
+            raise ParseError("Invalid sort_by value.")
+
+        latitude = params.get('latitude')
+        longitude = params.get('longitude')
+        distance = params.get('distance')
+
+        if latitude is not None or longitude is not None:
+            try:
+                latitude = float(latitude)
+                longitude = float(longitude)
+            except (TypeError, ValueError):
+                raise ParseError("Both latitude and longitude must be valid numbers.")
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ParseError("Coordinates are out of range.")
+
+            if distance is not None:
+                try:
+                    distance = float(distance)
+                except ValueError:
+                    raise ParseError("Distance must be a number.")
+                if not math.isfinite(distance):
+                    raise ParseError("Distance must be a finite number.")
+                if distance <= 0:
+                    raise ParseError("Distance must be positive.")
+
+            queryset = nearby_orders(queryset, latitude, longitude, distance)
+        elif distance is not None or (sort_by and sort_by.startswith('distance')):
+            raise ParseError("Latitude and longitude are required for distance filtering.")
+
+        if sort_by:
+            queryset = queryset.order_by(*self.SORT_OPTIONS[sort_by])
+        return queryset
+
+    @conditional_get(pending_pool_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(courier_order_version)
     def retrieve(self, request, *args, **kwargs):
         order = self.get_object()
         user = request.user
 
         # Проверяем права доступа
-        if order.status == 'pending' and order.courier is None:
+        if order.status == 'pending' and order.courier_id is None:
             pass  # Доступно для всех курьеров
-        elif order.courier == user:
+        elif order.courier_id == user.id:
             pass  # Заказ назначен текущему курьеру
         else:
             raise PermissionDenied("You do not have permission to view this order.")
 
-        return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_serializer(order)
+        return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @conditional_get(user_version)
+    @cache_user_response
     def assigned_orders(self, request):
         """
         Возвращает заказы, назначенные текущему курьеру и не завершенные.
         """
         user = request.user
         orders = Order.objects.filter(courier=user).exclude(status='completed')
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        return self.order_list_response(orders)
 
     @action(detail=False, methods=['get'])
+    @conditional_get(user_version)
+    @cache_user_response
     def completed_orders(self, request):
         """
-        Возвращает завершённые заказы текущего курьера.
+        Возвращает завершённые заказы текущего курьера, включая архивные.
         """
         user = request.user
         orders = Order.objects.filter(courier=user, status='completed')
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        archived = ArchivedOrder.objects.filter(courier=user, status='completed')
+        return self.order_list_response(orders, archived)
+
+    @action(detail=False, methods=['get'])
+    @conditional_get(pending_pool_version)
+    def changes(self, request):
+        """
+        Изменения пула ожидающих заказов с маркера since (см. orders/sync.py):
+        заказы, которые вошли в пул или изменились в нем, id вышедших из пула
+        и новый маркер. Без since, по просроченному маркеру или при слишком
+        большом числе изменений возвращает reset: клиент загружает список
+        заново и продолжает с token.
+        """
+        if request.user.user_type != 'courier':
+            raise PermissionDenied("Only couriers can access this endpoint.")
+
+        position = sync.current_sync_position()
+        changes = None
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since, issued_at = sync.decode_sync_token(since)
+            except ValueError:
+                raise ParseError("Invalid sync token.")
+            if not sync.sync_token_expired(issued_at):
+                changes = sync.pool_changes(since)
+
+        data = {'token': sync.encode_sync_token(position), 'reset': changes is None, 'orders': [], 'removed': []}
+        if changes is not None:
+            orders, data['removed'] = changes
+            data['orders'] = serialize_order_rows(order_rows(orders), request)
+        return Response(data)
 
     @action(detail=True, methods=['patch'])
     def assign(self, request, pk=None):
@@ -117,23 +327,18 @@ class CourierOrderViewSet(viewsets.ReadOnlyModelViewSet):
             raise PermissionDenied("Only couriers can accept orders.")
 
         order = self.get_object()
-        if order.courier:
-            return Response({"detail": "Order is already assigned to a courier."}, status=400)
-
-        if order.status != 'pending':
-            return Response({"detail": "Order is not available for assignment."}, status=400)
-
-        order.courier = user
-        order.status = 'courier_assigned'
-        order.save()
-
-        # Отправляем уведомление клиенту
-        send_order_notification(
-            order,
-            'order_update',
-            'Курьер назначен',
-            f'Курьер {request.user.first_name} принял ваш заказ'
-        )
+        try:
+            with transaction.atomic():
+                transitions.assign(order, user)
+                # Уведомление клиенту
+                enqueue_order_notification(
+                    order,
+                    'courier_assigned',
+                    'Курьер назначен',
+                    f'Курьер {request.user.first_name} принял ваш заказ'
+                )
+        except transitions.TransitionError as e:
+            return Response({"detail": e.detail}, status=e.status_code)
 
         serializer = self.get_serializer(order)
         return Response(serializer.data)
@@ -148,15 +353,10 @@ class CourierOrderViewSet(viewsets.ReadOnlyModelViewSet):
             raise PermissionDenied("Only couriers can unassign orders.")
 
         order = self.get_object()
-        if order.courier != user:
-            return Response({"detail": "You can only unassign orders assigned to you."}, status=400)
-
-        if order.status != 'courier_assigned':
-            return Response({"detail": "Order cannot be unassigned in its current status."}, status=400)
-
-        order.courier = None
-        order.status = 'pending'
-        order.save()
+        try:
+            transitions.unassign(order, user)
+        except transitions.TransitionError as e:
+            return Response({"detail": e.detail}, status=e.status_code)
 
         serializer = self.get_serializer(order)
         return Response(serializer.data)
@@ -172,68 +372,159 @@ class CourierOrderViewSet(viewsets.ReadOnlyModelViewSet):
         if user.user_type != 'courier':
             raise PermissionDenied("Only couriers can update the order status.")
 
-        if order.courier != user:
+        if order.courier_id != user.id:
             raise PermissionDenied("You do not have permission to update this order.")
 
         new_status = request.data.get('status')
         if not new_status:
             return Response({"detail": "Status not provided."}, status=400)
 
-        current_status = order.status
-
-        # Определяем допустимые переходы статусов
-        status_flow = {
-            'courier_assigned': 'courier_on_the_way',
-            'courier_on_the_way': 'at_location',
-            'at_location': 'courier_on_the_way_to_master',
-            'courier_on_the_way_to_master': 'in_progress',
-            'in_progress': 'completed',
-        }
-
-        # Определяем допустимые обратные переходы (откаты)
-        allowed_previous_status = {
-            'courier_on_the_way': 'courier_assigned',
-            'at_location': 'courier_on_the_way',
-            'courier_on_the_way_to_master': 'at_location',
-            'in_progress': 'courier_on_the_way_to_master',
-        }
-
-        # Проверя��м, разрешен ли откат статуса
-        time_since_change = timezone.now() - order.status_changed_at
-        allowed_time = timedelta(minutes=10)
-
-        if new_status == allowed_previous_status.get(current_status):
-            if time_since_change <= allowed_time:
-                # Разрешаем возврат статуса
-                order.status = new_status
-                order.save()
-                serializer = self.get_serializer(order)
-                return Response(serializer.data)
-            else:
-                return Response({"detail": "Time to revert status has expired."}, status=400)
-        elif status_flow.get(current_status) == new_status:
-            old_status = order.status
-            order.status = new_status
-            order.save()
-
-            # Отправляем уведомление о смене статуса
-            status_messages = {
-                'courier_on_the_way': 'Курьер выехал к вам',
-                'at_location': 'Курьер прибыл на место',
-                'courier_on_the_way_to_master': 'Курьер везет обувь мастеру',
-                'in_progress': 'Ваш заказ в работе',
-                'completed': 'Заказ выполнен'
-            }
-
-            if new_status in status_messages:
-                send_order_notification(
-                    order,
-                    'order_update',
-                    'Статус заказа изменен',
-                    status_messages[new_status]
-                )
+        reverting = transitions.is_revert(order.status, new_status)
+        try:
+            with transaction.atomic():
+                transitions.change_status(order, user, new_status)
+                # Уведомление о смене статуса; тип - новый статус, как в send_status_update_notification
+                if not reverting and new_status in STATUS_MESSAGES:
+                    enqueue_order_notification(
+                        order,
+                        new_status,
+                        'Статус заказа изменен',
+                        STATUS_MESSAGES[new_status]
+                    )
+        except transitions.TransitionError as e:
+            return Response({"detail": e.detail}, status=e.status_code)
 
-            serializer = self.get_serializer(order)
-            return Response(serializer.data)
-        else:
-            return Response({"detail": "Invalid status transition."}, status=400)
+        serializer = self.get_serializer(order)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['put'])
+    def location(self, request):
+        """
+        Обновляет текущее местоположение курьера для распределения заказов.
+        """
+        if request.user.user_type != 'courier':
+            raise PermissionDenied("Only couriers can report their location.")
+        serializer = CourierLocationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        location, _ = CourierLocation.objects.update_or_create(
+            courier=request.user,
+            defaults={**serializer.validated_data, 'updated_at': timezone.now()},
+        )
+        return Response(CourierLocationSerializer(location).data)
+
+    @action(detail=False, methods=['patch'])
+    def bulk_update_status(self, request):
+        """
+        Курьер обновляет статусы нескольких своих заказов одним запросом.
+        Каждый элемент проверяется по тем же правилам, что и в update_status;
+        ответ содержит результат по каждому заказу.
+        """
+        user = request.user
+        if user.user_type != 'courier':
+            raise PermissionDenied("Only couriers can update the order status.")
+
+        serializer = BulkStatusUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = [(item['id'], item['status']) for item in serializer.validated_data['orders']]
+
+        with transaction.atomic():
+            results, changed = transitions.change_status_bulk(user, changes)
+
+            # Все уведомления пакета ставятся в очередь одним INSERT; тип уведомления -
+            # новый статус, как в send_status_update_notification
+            enqueue_order_notifications([
+                (order, order.status, 'Статус заказа изменен', STATUS_MESSAGES[order.status])
+                for order, previous_status in changed
+                if order.status in STATUS_MESSAGES and not transitions.is_revert(previous_status, order.status)
+            ])
+        return Response({'results': results})
+
+
+class PeriodQueryMixin:
+    """
+    Разбор периода из параметров date_from и date_to (YYYY-MM-DD).
+    По умолчанию - последние 30 дней.
+    """
+    # Максимальная длина запрашиваемого периода в днях
+    MAX_PERIOD_DAYS = 366
+
+    def get_period(self, request):
+        try:
+            date_to = date.fromisoformat(request.query_params.get('date_to', timezone.localdate().isoformat()))
+            date_from = date.fromisoformat(
+                request.query_params.get('date_from', (date_to - timedelta(days=29)).isoformat())
+            )
+        except ValueError:
+            raise ParseError("Dates must be in YYYY-MM-DD format.")
+
+        if date_from > date_to:
+            raise ParseError("date_from must not be later than date_to.")
+        if (date_to - date_from).days >= self.MAX_PERIOD_DAYS:
+            raise ParseError(f"Period must not exceed {self.MAX_PERIOD_DAYS} days.")
+        return date_from, date_to
+
+
+class CourierStatisticsView(PeriodQueryMixin, APIView):
+    """
+    Статистика курьера за период. Читается из суточной сводки CourierDailyStats.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.user_type != 'courier':
+            raise PermissionDenied("Only couriers can access this endpoint.")
+
+        date_from, date_to = self.get_period(request)
+        return Response(get_courier_statistics(user, date_from, date_to))
+
+
+class OrderDwellTimeView(PeriodQueryMixin, APIView):
+    """
+    Перцентили времени, проведенного заказами в каждом статусе, за период.
+    Читается только из журнала статусов OrderStatusEvent.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        date_from, date_to = self.get_period(request)
+        start = timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+        statuses = request.query_params.getlist('status')
+        return Response({
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'statuses': dwell_time_percentiles(start, end, statuses),
+        })
+
+
+class OrderExportView(APIView):
+    """
+    Потоковая выгрузка заказов, включая архивные, в CSV или NDJSON
+    (см. orders/export.py). Параметры: output (csv или ndjson), date_from
+    и date_to (YYYY-MM-DD, по дате создания), status (можно повторять),
+    courier и city.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        output = params.get('output', 'csv')
+        if output not in export.EXPORT_FORMATS:
+            raise ParseError(f"output must be one of: {', '.join(export.EXPORT_FORMATS)}.")
+        try:
+            filters = export.export_filters(
+                params.get('date_from'), params.get('date_to'), params.getlist('status'),
+                params.get('courier'), params.get('city'),
+            )
+        except ValueError as e:
+            raise ParseError(str(e))
+
+        write, content_type, extension = export.EXPORT_FORMATS[output]
+        content = write(export.export_rows(filters))
+        if isinstance(request._request, ASGIRequest):
+            content = export.async_chunks(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f'orders-{timezone.localdate():%Y%m%d}.{extension}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -5,3 +5,6 @@ class ServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'service'
     verbose_name = 'Услуги'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shoe_service.cache import CATALOG_SCOPE, bump_generation_on_commit
+from .models import Attribute, Option, Service, ServiceAttribute, ServiceOption
+
+
+CATALOG_MODELS = (Service, Attribute, Option, ServiceAttribute, ServiceOption)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_catalog_version(sender, **kwargs):
+    """
+    Любое изменение каталога меняет его версию, а с ней и ETag ответов.
+    """
+    if sender in CATALOG_MODELS:
+        bump_generation_on_commit(CATALOG_SCOPE)
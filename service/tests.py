@@ -1,3 +1,33 @@
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from .models import Service
+
+
+class CatalogConditionalGetTestCase(TestCase):
+    """
+    Ответы каталога отдаются как 304, пока каталог не изменился.
+    """
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service = Service.objects.create(name='Чистка', price=Decimal('500.00'))
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user('client@example.com', 'Client', None))
+
+    def test_not_modified_until_catalog_changes(self):
+        url = '/api/services/services/'
+        etag = self.api.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = Decimal('600.00')
+            self.service.save()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
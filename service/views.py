@@ -1,8 +1,31 @@
 from rest_framework import viewsets
 from .models import Service, Attribute, Option
 from .serializers import ServiceSerializer, AttributeSerializer, OptionSerializer
+from shoe_service.cache import CATALOG_SCOPE, get_generation
+from shoe_service.conditional import conditional_get, generation_timestamp
 
-class ServiceViewSet(viewsets.ModelViewSet):
+
+def catalog_version(view, request, *args, **kwargs):
+    generation = get_generation(CATALOG_SCOPE)
+    return generation, generation_timestamp(generation)
+
+
+class CatalogConditionalMixin:
+    """
+    Каталог меняется редко, поэтому повторные запросы с ETag
+    получают 304 без обращения к базе.
+    """
+
+    @conditional_get(catalog_version)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get(catalog_version)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class ServiceViewSet(CatalogConditionalMixin, viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
     lookup_field = 'slug'
@@ -13,10 +36,10 @@ class ServiceViewSet(viewsets.ModelViewSet):
 
     
 
-class AttributeViewSet(viewsets.ModelViewSet):
+class AttributeViewSet(CatalogConditionalMixin, viewsets.ModelViewSet):
     queryset = Attribute.objects.all()
     serializer_class = AttributeSerializer
 
-class OptionViewSet(viewsets.ModelViewSet):
+class OptionViewSet(CatalogConditionalMixin, viewsets.ModelViewSet):
     queryset = Option.objects.all()
     serializer_class = OptionSerializer
\ No newline at end of file
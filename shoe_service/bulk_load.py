@@ -0,0 +1,158 @@
+"""
+Быстрая запись большого числа строк в таблицу модели.
+
+В PostgreSQL строки передаются потоком в команду COPY ... FROM STDIN
+в текстовом формате, в остальных базах - через bulk_create. Как и bulk_create,
+запись не вызывает save() и сигналы: вычисляемые поля, журналы и сброс
+кэша - забота вызывающего кода.
+"""
+import csv
+import json
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+
+# Форматы входных файлов по расширению
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+# Сколько символов copy_expert читает и отправляет за раз
+COPY_READ_SIZE = 256 * 1024
+
+# Экранирование текстового формата COPY
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\n': '\\n', '\r': '\\r', '\t': '\\t'})
+
+
+def read_records(path):
+    """
+    Записи входного файла по одной: (номер строки, словарь). Поддерживаются
+    CSV с заголовком и NDJSON (.ndjson, .jsonl). Файл читается потоково.
+    Строка NDJSON, которая не разбирается в объект, возвращается как None.
+    """
+    path = Path(path)
+    with path.open(encoding='utf-8', newline='') as source:
+        if path.suffix in NDJSON_SUFFIXES:
+            for line_number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_number, record if isinstance(record, dict) else None
+        else:
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+
+
+def chunked(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def allocate_ids(model, count):
+    """
+    count значений первичного ключа из последовательности таблицы, чтобы
+    ссылаться на строки до их записи. Вне PostgreSQL возвращает None:
+    ключи тогда заполняет bulk_create.
+    """
+    if connection.vendor != 'postgresql' or not count:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _copy_text(value):
+    if value.__class__ is str:
+        # Экранирование нужно редко: isprintable() ложно для \t, \n и \r
+        return value if value.isprintable() and '\\' not in value else value.translate(_COPY_ESCAPES)
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, timedelta):
+        return f'{value.days} days {value.seconds} seconds {value.microseconds} microseconds'
+    if isinstance(value, (list, tuple)):
+        # Массивы чисел (ArrayField); строки в массивах не поддерживаются
+        return '{' + ','.join(map(str, value)) + '}'
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class _CopySource:
+    """
+    Файл для copy_expert, который кодирует строки по мере чтения: память
+    не зависит от числа строк, а база разбирает уже отправленные данные,
+    пока Python готовит следующие.
+    """
+
+    def __init__(self, rows):
+        self.lines = ('\t'.join(map(_copy_text, row)) + '\n' for row in rows)
+        self.rest = ''
+
+    def read(self, size=-1):
+        parts, length = [self.rest], len(self.rest)
+        for line in self.lines:
+            parts.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = ''.join(parts)
+        if size < 0:
+            self.rest = ''
+            return data
+        self.rest = data[size:]
+        return data[:size]
+
+
+def copy_rows(model, fields, rows, batch_size=5000):
+    """
+    Записывает строки - кортежи значений полей fields, уже приведенных
+    для базы (datetime, Decimal, str, int, bool, None), одной командой COPY.
+    Подходит для генераторов данных: объекты моделей не создаются.
+    Вне PostgreSQL строки записываются через bulk_create пачками
+    по batch_size, и поля auto_now_add получают текущее время вместо
+    переданного.
+    """
+    meta = model._meta
+    if connection.vendor != 'postgresql':
+        for batch in chunked(rows, batch_size):
+            model.objects.bulk_create([model(**dict(zip(fields, row))) for row in batch])
+        return
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        sql = f'COPY {quote(meta.db_table)} ({columns}) FROM STDIN'
+        cursor.copy_expert(sql, _CopySource(rows), COPY_READ_SIZE)
+
+
+def load_objects(model, objs, batch_size=5000):
+    """
+    Записывает несохраненные объекты model (вне PostgreSQL - пачками
+    по batch_size). Первичные ключи либо заданы у всех объектов
+    (см. allocate_ids), либо ни у одного.
+    """
+    if not objs:
+        return
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create(objs, batch_size=batch_size)
+        return
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not (field.primary_key and objs[0].pk is None)
+    ]
+    # Само соединение, а не прокси connection: к нему обращаются на каждое значение
+    wrapper = connections[DEFAULT_DB_ALIAS]
+    rows = (
+        [field.get_db_prep_save(field.pre_save(obj, True), wrapper) for field in fields]
+        for obj in objs
+    )
+    copy_rows(model, [field.attname for field in fields], rows, batch_size)
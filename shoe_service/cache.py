@@ -0,0 +1,184 @@
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+# Ключ счетчика поколений области кэша
+GENERATION_KEY = 'generation:{scope}'
+# Области: данные и уведомления пользователя, общие уведомления роли, пул ожидающих
+# заказов, каталог услуг
+USER_SCOPE = 'user:{user_id}'
+NOTIFICATIONS_SCOPE = 'notifications:{user_id}'
+BROADCAST_SCOPE = 'notifications:broadcast:{audience}'
+PENDING_ORDERS_SCOPE = 'orders:pending'
+CATALOG_SCOPE = 'catalog'
+# Ключ закэшированного ответа в рамках поколения
+RESPONSE_KEY = 'user-response:{user_id}:{generation}:{digest}'
+# Счетчик личных непрочитанных уведомлений пользователя, см. notifications/counters.py
+UNREAD_COUNT_KEY = 'notifications:unread:{user_id}'
+# Номер последнего общего уведомления роли и область, которую сбрасывает
+# их удаление, см. notifications/counters.py
+BROADCAST_SEQUENCE_KEY = 'notifications:broadcast-seq:{audience}'
+BROADCAST_REMOVAL_SCOPE = 'notifications:broadcast-removal:{audience}'
+
+
+def get_generation(scope):
+    """
+    Возвращает текущее поколение области кэша.
+
+    Поколение - время последнего изменения в наносекундах, поэтому оно же
+    служит и для заголовка Last-Modified. Если счетчик вытеснен из кэша,
+    он начинается с текущего времени и не совпадет со старыми поколениями.
+    """
+    key = GENERATION_KEY.format(scope=scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+# Смена поколений в кэше процесса (не Redis), см. bump_generation
+_generation_lock = threading.Lock()
+
+
+def _redis_client():
+    # django_redis отдает клиент redis-py; у остальных бэкендов его нет
+    get_client = getattr(getattr(cache, 'client', None), 'get_client', None)
+    return get_client(write=True) if get_client else None
+
+
+def bump_generation(*scopes):
+    """
+    Переводит области кэша на новое поколение. Старые записи не удаляются,
+    а просто перестают читаться и истекают по таймауту.
+
+    Новое поколение - текущее время, но не меньше прежнего плюс один, и
+    замена атомарна: иначе параллельные смены могли бы записать поколения
+    в обратном порядке, и Last-Modified ушел бы назад. В Redis это
+    сравнение с заменой (WATCH/MULTI), в кэше процесса - блокировка.
+    """
+    keys = sorted({GENERATION_KEY.format(scope=scope) for scope in scopes})
+    if not keys:
+        return
+    client = _redis_client()
+    if client is None:
+        with _generation_lock:
+            current = cache.get_many(keys)
+            now = time.time_ns()
+            cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None)
+        return
+
+    redis_keys = [cache.make_key(key) for key in keys]
+
+    def replace(pipe):
+        # Одно чтение и одна запись на все области; при параллельной смене повтор
+        current = pipe.mget(redis_keys)
+        now = time.time_ns()
+        pipe.multi()
+        pipe.mset({key: max(now, int(value or 0) + 1) for key, value in zip(redis_keys, current)})
+
+    client.transaction(replace, *redis_keys)
+
+
+def bump_generation_on_commit(*scopes):
+    transaction.on_commit(lambda: bump_generation(*scopes))
+
+
+def change_unread_counts(deltas):
+    """
+    Атомарно меняет счетчики непрочитанных уведомлений, которые есть в кэше.
+    Отсутствующие счетчики не создаются: они пересчитываются по базе при чтении.
+
+    Args:
+        deltas: Словарь {id пользователя: изменение}.
+    """
+    for user_id, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(UNREAD_COUNT_KEY.format(user_id=user_id), delta)
+        except ValueError:
+            pass
+
+
+def change_unread_counts_on_commit(deltas):
+    transaction.on_commit(lambda: change_unread_counts(deltas))
+
+
+def reset_unread_count(user_id):
+    cache.delete(UNREAD_COUNT_KEY.format(user_id=user_id))
+
+
+def get_broadcast_sequence(audience):
+    """
+    Номер последнего общего уведомления роли. Важна только разность номеров:
+    вытесненный счетчик начинается заново с текущего времени в наносекундах,
+    и разность со старыми номерами становится заведомо слишком большой.
+    """
+    key = BROADCAST_SEQUENCE_KEY.format(audience=audience)
+    sequence = cache.get(key)
+    if sequence is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        sequence = cache.get(key)
+    return sequence
+
+
+def count_broadcast(audience):
+    try:
+        cache.incr(BROADCAST_SEQUENCE_KEY.format(audience=audience))
+    except ValueError:
+        pass
+
+
+def count_broadcast_on_commit(audience):
+    transaction.on_commit(lambda: count_broadcast(audience))
+
+
+def get_user_generation(user_id):
+    return get_generation(USER_SCOPE.format(user_id=user_id))
+
+
+def invalidate_user_cache(*user_ids):
+    """
+    Сбрасывает закэшированные ответы пользователей.
+    """
+    bump_generation(*(USER_SCOPE.format(user_id=user_id) for user_id in user_ids if user_id is not None))
+
+
+def invalidate_user_cache_on_commit(*user_ids):
+    """
+    Сбрасывает кэш после фиксации транзакции, чтобы параллельный запрос
+    не закэшировал незафиксированное состояние под новым поколением.
+    """
+    transaction.on_commit(lambda: invalidate_user_cache(*user_ids))
+
+
+def cache_user_response(view_method):
+    """
+    Кэширует успешные ответы метода представления отдельно для каждого
+    пользователя и URL запроса с учетом параметров.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        user_id = request.user.id
+        digest = hashlib.sha1(
+            f'{view_method.__qualname__}:{request.build_absolute_uri()}'.encode()
+        ).hexdigest()
+        key = RESPONSE_KEY.format(user_id=user_id, generation=get_user_generation(user_id), digest=digest)
+
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.USER_RESPONSE_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,57 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import get_user_generation
+
+
+def generation_timestamp(generation):
+    """
+    Время изменения в секундах по поколению кэша (см. get_generation).
+    """
+    return generation // 10 ** 9 if generation else None
+
+
+def user_version(view, request, *args, **kwargs):
+    """
+    Версия данных, видимых пользователю: поколение его кэша.
+    """
+    generation = get_user_generation(request.user.id)
+    return generation, generation_timestamp(generation)
+
+
+def conditional_get(version_func):
+    """
+    Поддержка условных GET-запросов (If-None-Match, If-Modified-Since).
+
+    version_func(view, request, *args, **kwargs) дешево вычисляет версию
+    данных и время их изменения (или None). ETag строится из версии,
+    пользователя и URL запроса, поэтому неизменившийся ответ отдается
+    как 304 без выборки и сериализации данных.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            version, last_modified = version_func(self, request, *args, **kwargs)
+            digest = hashlib.sha1(
+                f'{view_method.__qualname__}:{request.user.id}:{request.build_absolute_uri()}:{version}'.encode()
+            ).hexdigest()
+            etag = f'"{digest}"'
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            # Ответ зависит от пользователя: общим кэшам его хранить нельзя
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ('Authorization',))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,170 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PageNumberModePagination(PageNumberPagination):
+    """
+    Постраничная пагинация для режима обратной совместимости.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по ключу (created_at, id).
+
+    Следующая страница выбирается условием по ключу последней записи
+    предыдущей страницы, поэтому не нужны ни COUNT(*), ни OFFSET.
+    Постраничный режим остается доступен через ?page=N или ?pagination=page,
+    а также используется, если список отсортирован не по дате создания.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    default_ordering = ('-created_at', '-id')
+    keyset_orderings = {('-created_at', '-id'), ('created_at', 'id')}
+    page_number_class = PageNumberModePagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None, horizon=None):
+        """
+        Одна лента из нескольких источников с одинаковыми полями, например
+        оперативной таблицы и архива. Первый источник читается всегда,
+        остальные - только если страница доходит до записей, созданных
+        не позже horizon: более новых записей в них нет. horizon=None
+        означает, что дополнительные источники пусты.
+        """
+        self.request = request
+        self.page_number_pagination = None
+        queryset, *extra = querysets
+        if horizon is None:
+            extra = []
+
+        ordering = tuple(queryset.query.order_by) or self.default_ordering
+        if self.use_page_numbers(request) or ordering not in self.keyset_orderings:
+            self.page_number_pagination = self.page_number_class()
+            if extra:
+                queryset = queryset.order_by().union(*(other.order_by() for other in extra), all=True)
+            return self.page_number_pagination.paginate_queryset(queryset.order_by(*ordering), request, view)
+
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        descending = ordering[0].startswith('-')
+        reverse = cursor is not None and cursor[0]
+        if reverse:
+            ordering = tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+        # Направление обхода: к более старым записям или к более новым
+        backwards = descending != reverse
+
+        results = self.fetch(queryset, cursor, ordering, backwards, page_size)
+        if extra:
+            if backwards:
+                reaches = len(results) <= page_size or self.get_key(results[page_size - 1])[0] <= horizon
+            else:
+                reaches = cursor is None or cursor[1] <= horizon
+            if reaches:
+                for other in extra:
+                    results += self.fetch(other, cursor, ordering, backwards, page_size)
+                results.sort(key=self.get_key, reverse=backwards)
+                results = results[:page_size + 1]
+
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def fetch(self, queryset, cursor, ordering, backwards, page_size):
+        """
+        Первые page_size + 1 записей после курсора в направлении обхода.
+        """
+        if cursor is not None:
+            _, created_at, pk = cursor
+            lookup = 'lt' if backwards else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'created_at__{lookup}': created_at})
+                | Q(created_at=created_at, **{f'id__{lookup}': pk})
+            )
+        return list(queryset.order_by(*ordering)[:page_size + 1])
+
+    def get_key(self, instance):
+        # Страница может состоять из моделей или из строк values()
+        if isinstance(instance, dict):
+            return instance['created_at'], instance['id']
+        return instance.created_at, instance.pk
+
+    def use_page_numbers(self, request):
+        params = request.query_params
+        return 'page' in params or params.get('pagination') == 'page'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, instance, reverse):
+        created_at, pk = self.get_key(instance)
+        raw = f"{'p' if reverse else 'n'}|{created_at.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        """
+        Возвращает (reverse, created_at, id) или None, если курсор не передан.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            direction, created_at, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction == 'p', datetime.fromisoformat(created_at), int(pk)
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            raise NotFound("Invalid cursor.")
+
+    def get_link(self, instance, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(instance, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.page_number_pagination is not None:
+            return self.page_number_pagination.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
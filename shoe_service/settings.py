@@ -191,6 +191,11 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Адрес API для абсолютных ссылок в сообщениях, которые строятся без запроса
+# (поток пула ожидающих заказов); должен совпадать с адресом, по которому
+# клиенты обращаются к API
+PUBLIC_BASE_URL = 'http://localhost:8000'
+
 # File Upload Settings
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
@@ -241,3 +246,37 @@ CACHES = {
         }
     }
 }
+
+# Время жизни закэшированных ответов пользователя (сек), см. shoe_service/cache.py
+USER_RESPONSE_CACHE_TIMEOUT = 300
+
+# Завершенные, отмененные и возвращенные заказы старше этого срока (дней)
+# переносятся в архив командой archive_orders, см. orders/archive.py
+ORDER_ARCHIVE_AFTER_DAYS = 180
+
+# Распределение заказов между курьерами, см. orders/dispatch.py:
+# радиус поиска курьера (км), срок актуальности местоположения и предложения (сек)
+DISPATCH_MAX_DISTANCE_KM = 5
+DISPATCH_LOCATION_TTL = 300
+DISPATCH_OFFER_TTL = 120
+
+# Наибольшее число изменений пула в ответе синхронизации, см. orders/sync.py;
+# при большем числе клиент заново загружает список
+ORDER_SYNC_MAX_CHANGES = 500
+# Срок действия маркера синхронизации (дней): по более старому клиент заново
+# загружает список, а отметки удаленных заказов старше срока удаляет archive_orders
+ORDER_SYNC_RETENTION_DAYS = 7
+
+# Доставка уведомлений через outbox, см. notifications/outbox.py: записей за проход
+# воркера deliver_notifications, число попыток, задержка перед повтором (сек,
+# удваивается с каждой попыткой) и ее предел
+NOTIFICATION_OUTBOX_BATCH_SIZE = 100
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = 8
+NOTIFICATION_OUTBOX_RETRY_DELAY = 1
+NOTIFICATION_OUTBOX_MAX_RETRY_DELAY = 300
+# new_order хранится одним общим уведомлением для всех курьеров (notifications/broadcasts.py);
+# False - копия каждому активному курьеру
+NOTIFICATION_NEW_ORDER_BROADCAST = True
+# Время жизни счетчика непрочитанных уведомлений (сек), после которого он
+# пересчитывается по базе, см. notifications/counters.py
+NOTIFICATION_UNREAD_COUNT_TIMEOUT = 600
@@ -0,0 +1,71 @@
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection
+
+
+# Планы запросов проверяются только на PostgreSQL, как в рабочем окружении
+postgresql_only = skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL only')
+
+
+class QueryPlanMixin:
+    """
+    Проверки планов выполнения горячих запросов.
+
+    Последовательное сканирование отключается через enable_seqscan, поэтому
+    Seq Scan в плане означает, что для запроса нет подходящего индекса,
+    независимо от объема тестовых данных.
+    """
+
+    @classmethod
+    def analyze(cls, *tables):
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'ANALYZE {table}')
+
+    def assertUsesIndex(self, queryset, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {table}', plan, msg=f'\n{queryset.query}\n{plan}')
+        return plan
+
+
+def asgi_get(url, headers=(), on_body=None):
+    """
+    GET-запрос через ASGIHandler Django, как под daphne, а не через тестовый
+    WSGI-клиент. Вызывается из синхронного кода: синхронные части обработчика
+    выполняются в том же потоке и видят его транзакцию. Куски тела ответа
+    передаются в on_body по мере отправки. Возвращает статус и заголовки.
+    """
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost'), *((name.encode(), value.encode()) for name, value in headers)],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    response = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response.update(status=message['status'], headers={
+                name.decode().lower(): value.decode('latin1') for name, value in message['headers']
+            })
+        elif message.get('body') and on_body:
+            on_body(message['body'])
+
+    # Как тестовый клиент Django: иначе соединение с открытой транзакцией будет закрыто
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        async_to_sync(ASGIHandler())(scope, receive, send)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+    return response['status'], response['headers']